@@ -0,0 +1,139 @@
+"""
+Handler latency under load: simulated users walking through the order
+conversation at the same time, against the in-memory fake with --latency
+seconds per API call.
+
+Each user picks a date (available KODs), a KOD (manzil, existing order) and
+saves the order (Sheet1 row, Sheet2 transport info), sending each update
+--think-ms after the bot answered the previous one. The latency of an update
+is the time from its arrival until its handler finished. Reported for the
+handlers calling GoogleSheetsHelper on the event loop (as before the async
+facade) and through AsyncGoogleSheetsHelper's thread pool. Saves write
+through to the API (one at a time per month); --write-behind queues the
+Sheet2 updates the way the bot does by default (new Sheet1 rows are always
+written through):
+
+    python bench_handlers.py
+    python bench_handlers.py --users 50 --latency 0.1 --workers 8 16 --write-behind
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import statistics
+import time
+from typing import List
+
+from bench_sheets import DATE, make_helper
+from google_sheets import AsyncGoogleSheetsHelper
+
+
+class BlockingSheetsHelper:
+    """The handlers before the facade: every Sheets call runs on the event loop."""
+
+    def __init__(self, helper):
+        self.helper = helper
+
+    def __getattr__(self, name):
+        method = getattr(self.helper, name)
+
+        async def call(*args, **kwargs):
+            return method(*args, **kwargs)
+
+        return call
+
+    def shutdown(self, wait: bool = True):
+        self.helper.close()
+
+
+def conversation(sheets, user: int):
+    """The Sheets calls of each handler of one user's conversation."""
+    kod = f"K{user * 2 + 1:06d}"  # Odd KODs have no order yet
+    order = {
+        "Sana": DATE, "Manzil": f"Manzil {user}", "KOD": kod, "Viloyat": "Toshkent",
+        "Transport_raqami": f"01A{user:03d}AA", "Haydovchi_telefon": f"+99890{user:07d}",
+        "Karta_raqami": "8600000000000000", "To'lov_summasi": "100 000",
+    }
+
+    async def select_date():
+        await sheets.get_available_kods(DATE, only_empty=True)
+
+    async def select_kod():
+        await sheets.get_sheet2_manzil(kod, DATE)
+        await sheets.get_existing_order(kod, DATE)
+
+    async def save_order():
+        await sheets.add_order_to_sheet1(order)
+        await sheets.update_sheet2_transport_info(kod, order["Transport_raqami"], order["Haydovchi_telefon"], DATE)
+
+    return [select_date, select_kod, save_order]
+
+
+async def simulate_user(sheets, user: int, think_seconds: float, latencies: List[float]):
+    # Arrival times are scheduled, not taken when the coroutine gets to run:
+    # a blocked event loop delays the handler, and that delay is latency
+    arrival = time.perf_counter() + random.uniform(0, think_seconds)
+    for handler in conversation(sheets, user):
+        await asyncio.sleep(max(0.0, arrival - time.perf_counter()))
+        await handler()
+        finished = time.perf_counter()
+        latencies.append(finished - arrival)
+        arrival = finished + think_seconds
+
+
+async def run(mode: str, users: int, size: int, latency: float, think_seconds: float, workers: int):
+    """Handler latencies (seconds) of one run and its wall time."""
+    helper, _ = make_helper(size, latency)
+    if mode == "blocking":
+        sheets = BlockingSheetsHelper(helper)
+    else:
+        sheets = AsyncGoogleSheetsHelper(helper, max_workers=workers)
+
+    latencies: List[float] = []
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(simulate_user(sheets, user, think_seconds, latencies) for user in range(users)))
+    finally:
+        sheets.shutdown(wait=True)
+    return latencies, time.perf_counter() - started
+
+
+def percentile(values: List[float], p: float) -> float:
+    return statistics.quantiles(values, n=100, method="inclusive")[p - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=50, help="concurrent simulated users")
+    parser.add_argument("--size", type=int, default=1000, help="rows per worksheet")
+    parser.add_argument("--latency", type=float, default=0.05, help="simulated seconds per API call")
+    parser.add_argument("--think-ms", type=float, default=500.0, help="user time between updates")
+    parser.add_argument("--workers", type=int, nargs="+", default=[8], help="thread pool sizes to run")
+    parser.add_argument("--write-behind", action="store_true", help="queue Sheet2 updates")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.size <= args.users * 2 + 1:
+        parser.error("--size must be more than twice --users (every user needs its own free KOD)")
+
+    # Read when the helper is created
+    os.environ["SHEETS_WRITE_BEHIND"] = "1" if args.write_behind else "0"
+    # The helper's per-call logs (and "No order found" for every new KOD) would drown the table
+    logging.getLogger().setLevel(logging.ERROR)
+
+    print(f"{'handlers':<22} {'users':>6} {'updates':>8} {'p50 ms':>9} {'p99 ms':>9} {'max ms':>9} {'seconds':>8}")
+    runs = [("blocking", "on the event loop", 0)] + [
+        ("pool", f"thread pool ({workers})", workers) for workers in args.workers
+    ]
+    for mode, label, workers in runs:
+        random.seed(args.seed)
+        latencies, elapsed = asyncio.run(
+            run(mode, args.users, args.size, args.latency, args.think_ms / 1000, workers)
+        )
+        print(f"{label:<22} {args.users:>6} {len(latencies):>8} {percentile(latencies, 50) * 1000:>9.1f} "
+              f"{percentile(latencies, 99) * 1000:>9.1f} {max(latencies) * 1000:>9.1f} {elapsed:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+"""
+Micro-benchmarks for GoogleSheetsHelper against the in-memory fake backend.
+
+Reports wall time and simulated API calls per helper method, cold (empty
+caches) and warm, for worksheets of several sizes:
+
+    python bench_sheets.py
+    python bench_sheets.py --sizes 100 1000 50000 --latency 0.05 --repeat 5
+
+With --logging, it instead reports the logging overhead per update (the
+warm lookups of one conversation step) for each logging setup; with
+--memory, the bytes per row of a cached worksheet as decoded lists and in
+the ColumnStore the caches hold.
+"""
+import argparse
+import json
+import logging
+import os
+import time
+import tracemalloc
+from typing import Callable, Dict, List
+
+# Keep the benchmark in memory and unthrottled; must be set before the helper is created
+os.environ.setdefault("SHEETS_WRITE_BEHIND", "0")
+os.environ.setdefault("SHEETS_REPLICA", "0")
+os.environ.setdefault("SHEETS_QUOTA_PER_MINUTE", "1000000000")
+os.environ.setdefault("SHEETS_QUOTA_BURST", "1000000")
+
+from fake_sheets import FakeClient
+from google_sheets import ColumnStore, GoogleSheetsHelper, SHEET1_HEADERS
+from log_setup import LOG_FORMAT, setup_logging, stop_logging
+
+DATE = "2026-10-17"
+SHEET2_DATE = "17.10.2026"
+MONTH = "Oktabr 2026"
+
+
+def build_sheet2_rows(size: int) -> List[List[str]]:
+    """A Sheet2 date worksheet: C = MANZIL, D/E = KOD, O/P = transport/phone (every other row filled)."""
+    rows = [["#", "Sana", "MANZIL", "KOD", "KOD"] + [""] * 9 + ["Transport", "Telefon"]]
+    for i in range(1, size):
+        filled = i % 2 == 0
+        rows.append([
+            str(i), SHEET2_DATE, f"Manzil {i}", f"K{i:06d}", f"K{i:06d}", "", "", "", "", "", "", "", "", "",
+            f"01A{i:03d}AA" if filled else "", f"+99890{i:07d}" if filled else ""
+        ])
+    return rows
+
+
+def build_sheet1_rows(size: int) -> List[List[str]]:
+    """A Sheet1 monthly worksheet with an order for every other KOD."""
+    rows = [list(SHEET1_HEADERS)]
+    for i in range(1, size):
+        rows.append([
+            str(i), SHEET2_DATE, f"Manzil {i}", f"K{i * 2:06d}", "Toshkent", f"01A{i:03d}AA",
+            f"+99890{i:07d}", "8600000000000000", "100000", "", "", "", ""
+        ])
+    return rows
+
+
+def make_helper(size: int, latency: float):
+    client = FakeClient(latency=latency)
+    client.create("sheet1").load(MONTH, build_sheet1_rows(size))
+    client.create("sheet2").load(SHEET2_DATE, build_sheet2_rows(size))
+    helper = GoogleSheetsHelper(client=client, sheet1_id="sheet1", sheet2_id="sheet2")
+    helper.connect()
+    return helper, client
+
+
+def cases(size: int) -> Dict[str, Callable]:
+    last_kod = f"K{size - 1:06d}"
+    ordered_kod = f"K{(size - 1) // 2 * 2:06d}"  # Has an order in Sheet1
+    order = {
+        "Sana": DATE, "Manzil": "Manzil", "KOD": "KNEW", "Viloyat": "Toshkent", "Transport_raqami": "01A000AA",
+        "Haydovchi_telefon": "+998900000000", "Karta_raqami": "8600000000000000", "To'lov_summasi": "100000"
+    }
+    return {
+        # Yesterday and tomorrow have no worksheets in the fake: covers the missing-worksheet path
+        "warm_dates (3 days)": lambda h: h.warm_dates(["2026-10-16", DATE, "2026-10-18"]),
+        "get_available_kods": lambda h: h.get_available_kods(DATE),
+        "get_sheet2_manzil": lambda h: h.get_sheet2_manzil(last_kod, DATE),
+        "get_sheet2_order_info": lambda h: h.get_sheet2_order_info(last_kod, DATE),
+        "get_existing_order": lambda h: h.get_existing_order(ordered_kod, DATE),
+        # Warm: only the rows added since the last download (plus the ID-column probe)
+        "refresh Sheet1 month": lambda h: h.get_sheet1_snapshot(MONTH, fresh=True),
+        "add_order_to_sheet1": lambda h: h.add_order_to_sheet1(order),
+        "update_order_in_sheet1": lambda h: h.update_order_in_sheet1(ordered_kod, {**order, "KOD": ordered_kod}),
+        "update_sheet2_transport_info": lambda h: h.update_sheet2_transport_info(last_kod, "01A111AA", "+998901111111", DATE),
+    }
+
+
+def measure(helper, client: FakeClient, func: Callable, repeat: int, cold: bool):
+    """Best wall time, and API calls and cells read per run of func (averaged over the runs)."""
+    best = float("inf")
+    calls_before = sum(client.calls.values())
+    cells_before = client.cells_read
+    for _ in range(repeat):
+        if cold:
+            # Everything the helper learns from reads, including the row allocators seeded from column A
+            helper.sheet1_cache.invalidate()
+            helper.sheet2_cache.invalidate()
+            with helper._row_allocators_lock:
+                helper._row_allocators.clear()
+        started = time.perf_counter()
+        func(helper)
+        best = min(best, time.perf_counter() - started)
+    calls = (sum(client.calls.values()) - calls_before) / repeat
+    cells = (client.cells_read - cells_before) / repeat
+    return best, calls, cells
+
+
+def use_sync_logging(level: str, stream):
+    """The old setup: a StreamHandler writing on the caller's thread."""
+    stop_logging()
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    root.addHandler(handler)
+    root.setLevel(level)
+
+
+def bench_logging(size: int, repeat: int):
+    """Microseconds of logging per update, over a baseline with logging off."""
+    helper, client = make_helper(size, 0.0)
+    kod = f"K{size - 1:06d}"
+    updates = 200
+
+    def run_updates() -> float:
+        started = time.perf_counter()
+        for _ in range(updates):
+            helper.get_available_kods(DATE)
+            helper.get_sheet2_manzil(kod, DATE)
+            helper.get_existing_order(f"K{(size - 1) // 2 * 2:06d}", DATE)
+        return (time.perf_counter() - started) / updates
+
+    setups = {
+        "off": lambda stream: use_sync_logging("WARNING", stream),
+        "sync, DEBUG (full payloads)": lambda stream: use_sync_logging("DEBUG", stream),
+        "sync, INFO": lambda stream: use_sync_logging("INFO", stream),
+        "queue, INFO": lambda stream: setup_logging("INFO", stream=stream),
+    }
+
+    with open(os.devnull, "w") as devnull:
+        results = {}
+        for name, configure in setups.items():
+            configure(devnull)
+            run_updates()  # Warm the caches and indexes
+            results[name] = min(run_updates() for _ in range(repeat))
+        stop_logging()
+        use_sync_logging("WARNING", None)
+
+    for name, per_update in results.items():
+        overhead = (per_update - results["off"]) * 1_000_000
+        print(f"{name:<30} {size:>7} {per_update * 1_000_000:>12.1f} {overhead:>12.1f}")
+    helper.close()
+
+
+def bench_memory(size: int):
+    """Bytes per row: rows as the API response decodes them vs. the same rows in a ColumnStore."""
+    for name, build_rows in (("Sheet2 date", build_sheet2_rows), ("Sheet1 month", build_sheet1_rows)):
+        encoded = json.dumps(build_rows(size))
+
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        rows = json.loads(encoded)
+        list_bytes = tracemalloc.get_traced_memory()[0] - before
+        del rows
+
+        before = tracemalloc.get_traced_memory()[0]
+        store = ColumnStore(json.loads(encoded))
+        store_bytes = tracemalloc.get_traced_memory()[0] - before
+        tracemalloc.stop()
+        del store
+
+        print(f"{name:<30} {size:>7} {list_bytes / size:>12.1f} {store_bytes / size:>12.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000, 50000])
+    parser.add_argument("--latency", type=float, default=0.0, help="simulated seconds per API call")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--logging", action="store_true", help="measure logging overhead per update")
+    parser.add_argument("--memory", action="store_true", help="measure cached bytes per row")
+    args = parser.parse_args()
+
+    # The helper's per-call INFO logs would drown the table
+    logging.getLogger().setLevel(logging.WARNING)
+
+    if args.memory:
+        print(f"{'worksheet':<30} {'rows':>7} {'list B/row':>12} {'store B/row':>12}")
+        for size in args.sizes:
+            bench_memory(size)
+        return
+
+    if args.logging:
+        print(f"{'logging':<30} {'rows':>7} {'us/update':>12} {'overhead us':>12}")
+        for size in args.sizes:
+            bench_logging(size, args.repeat)
+        return
+
+    print(f"{'method':<30} {'rows':>7} {'cold ms':>10} {'calls':>6} {'cells':>9} {'warm ms':>10} {'calls':>6}")
+    for size in args.sizes:
+        for name, func in cases(size).items():
+            helper, client = make_helper(size, args.latency)
+            cold_time, cold_calls, cold_cells = measure(helper, client, func, args.repeat, cold=True)
+            warm_time, warm_calls, _ = measure(helper, client, func, args.repeat, cold=False)
+            print(f"{name:<30} {size:>7} {cold_time * 1000:>10.2f} {cold_calls:>6.1f} {cold_cells:>9.0f} "
+                  f"{warm_time * 1000:>10.2f} {warm_calls:>6.1f}")
+            helper.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Startup benchmark: time from bot start to the answer of the first update
+that needs Google Sheets, with and without the post_init warm-up.
+
+The bot is started against the in-memory fake (--latency seconds per API
+call). After --first-update-ms (polling delivering the first update) the
+user taps "today" on the date keyboard, which needs the date's available
+KODs. Also reports how long importing bot.py takes in a fresh interpreter,
+which must not touch the network:
+
+    python bench_startup.py
+    python bench_startup.py --latency 0.3 --first-update-ms 0 500 2000
+"""
+import argparse
+import asyncio
+import logging
+import os
+import subprocess
+import sys
+import time
+import warnings
+
+# In memory and without databases; must be set before bot.py is imported
+os.environ.setdefault("BOT_PERSISTENCE", "0")
+os.environ.setdefault("SUBMISSIONS_DB_PATH", "")
+
+from telegram.warnings import PTBUserWarning
+
+import bot
+from bench_sheets import build_sheet1_rows, build_sheet2_rows
+from fake_sheets import FakeClient
+from google_sheets import AsyncGoogleSheetsHelper, GoogleSheetsHelper
+
+IMPORT_BOT = "import time; started = time.perf_counter(); import bot; print(time.perf_counter() - started)"
+
+
+def import_seconds() -> float:
+    """Seconds to import bot.py in a fresh interpreter, with no Sheets credentials at all."""
+    env = {key: value for key, value in os.environ.items() if key not in ("SHEET1_ID", "SHEET2_ID", "GOOGLE_CREDENTIALS_BASE64")}
+    output = subprocess.run([sys.executable, "-c", IMPORT_BOT], env=env, capture_output=True, text=True, check=True)
+    return float(output.stdout.strip().splitlines()[-1])
+
+
+def make_sheets(size: int, latency: float):
+    """A fresh, unconnected helper whose fake holds the worksheets of the date keyboard."""
+    client = FakeClient(latency=latency)
+    sheet1 = client.create("sheet1")
+    sheet2 = client.create("sheet2")
+    helper = GoogleSheetsHelper(client=client, sheet1_id="sheet1", sheet2_id="sheet2")
+    for date_str in bot.get_date_options().values():
+        sheet2.load(helper.convert_date_format(date_str), build_sheet2_rows(size))
+        sheet1.load(helper.get_uzbek_month_worksheet(date_str), build_sheet1_rows(size))
+    return AsyncGoogleSheetsHelper(helper), client
+
+
+async def first_update(warm_up: bool, first_update_seconds: float, size: int, latency: float):
+    """(seconds to the first answer, seconds in its handler, API calls of the handler)."""
+    os.environ["SHEETS_WARM_UP"] = "1" if warm_up else "0"
+    sheets, client = make_sheets(size, latency)
+    bot.sheets_helper = sheets  # What the handlers and warm_up_sheets use
+
+    telegram_bot = bot.TelegramBot("123456:BENCHMARK")
+    started = time.perf_counter()
+    await telegram_bot.post_init(telegram_bot.application)
+    await asyncio.sleep(first_update_seconds)
+
+    handler_started = time.perf_counter()
+    calls_before = sum(client.calls.values())
+    await sheets.get_available_kods(bot.get_date_options()["today"], only_empty=True)
+    finished = time.perf_counter()
+    calls = sum(client.calls.values()) - calls_before
+
+    if warm_up:
+        await telegram_bot.warm_up_task
+    sheets.shutdown(wait=True)
+    return finished - started, finished - handler_started, calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=1000, help="rows per worksheet")
+    parser.add_argument("--latency", type=float, default=0.1, help="simulated seconds per API call")
+    parser.add_argument("--first-update-ms", type=float, nargs="+", default=[0.0, 500.0, 2000.0],
+                        help="time from start until the first update arrives")
+    args = parser.parse_args()
+
+    # The helper's per-call INFO logs would drown the table
+    logging.getLogger().setLevel(logging.WARNING)
+    # The conversation's per_message notice, once per bot built
+    warnings.filterwarnings("ignore", category=PTBUserWarning)
+
+    print(f"import bot.py: {import_seconds() * 1000:.1f} ms (no Sheets connection)")
+    print(f"{'warm-up':<8} {'first update ms':>16} {'answered ms':>12} {'handler ms':>11} {'calls':>6}")
+    for first_update_ms in args.first_update_ms:
+        for warm_up in (False, True):
+            answered, handler, calls = asyncio.run(
+                first_update(warm_up, first_update_ms / 1000, args.size, args.latency)
+            )
+            print(f"{'on' if warm_up else 'off':<8} {first_update_ms:>16.0f} {answered * 1000:>12.1f} "
+                  f"{handler * 1000:>11.1f} {calls:>6}")
+
+
+if __name__ == "__main__":
+    main()
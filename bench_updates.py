@@ -0,0 +1,70 @@
+"""
+Throughput of ChatOrderedUpdateProcessor as the number of active dispatchers grows.
+
+Each dispatcher (one chat) sends --updates updates whose handler takes
+--handler-ms (a Sheets round trip); updates of all dispatchers arrive
+interleaved, the way the Application hands them to the processor. Every run
+checks that each chat's updates were handled one at a time and in order:
+
+    python bench_updates.py
+    python bench_updates.py --dispatchers 1 4 16 64 --cap 32 --handler-ms 100
+"""
+import argparse
+import asyncio
+import time
+from types import SimpleNamespace
+from typing import Dict, List
+
+from update_processor import ChatOrderedUpdateProcessor
+
+
+async def run(dispatchers: int, updates: int, handler_seconds: float, cap: int):
+    """Seconds to handle every update, and whether each chat's updates stayed in order."""
+    processor = ChatOrderedUpdateProcessor(cap)
+    handled: Dict[int, List[int]] = {chat_id: [] for chat_id in range(dispatchers)}
+    in_handler = set()
+    overlapped = False
+
+    async def handler(chat_id: int, sequence: int):
+        nonlocal overlapped
+        if chat_id in in_handler:
+            overlapped = True
+        in_handler.add(chat_id)
+        await asyncio.sleep(handler_seconds)
+        handled[chat_id].append(sequence)
+        in_handler.discard(chat_id)
+
+    started = time.perf_counter()
+    tasks = []
+    for sequence in range(updates):
+        for chat_id in range(dispatchers):
+            update = SimpleNamespace(effective_chat=SimpleNamespace(id=chat_id), effective_user=None)
+            tasks.append(asyncio.create_task(processor.process_update(update, handler(chat_id, sequence))))
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+
+    ordered = not overlapped and all(sequences == list(range(updates)) for sequences in handled.values())
+    return elapsed, ordered
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dispatchers", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--updates", type=int, default=5, help="updates per dispatcher")
+    parser.add_argument("--handler-ms", type=float, default=50.0, help="simulated handler time")
+    parser.add_argument("--cap", type=int, default=32, help="max_concurrent_updates")
+    args = parser.parse_args()
+
+    handler_seconds = args.handler_ms / 1000
+    print(f"{'dispatchers':>11} {'cap':>5} {'seconds':>9} {'updates/s':>10} {'speedup':>8} {'ordered':>8}")
+    for dispatchers in args.dispatchers:
+        # cap 1 is the sequential processing the bot used before
+        sequential, _ = asyncio.run(run(dispatchers, args.updates, handler_seconds, 1))
+        elapsed, ordered = asyncio.run(run(dispatchers, args.updates, handler_seconds, args.cap))
+        total = dispatchers * args.updates
+        print(f"{dispatchers:>11} {args.cap:>5} {elapsed:>9.3f} {total / elapsed:>10.1f} "
+              f"{sequential / elapsed:>7.1f}x {'yes' if ordered else 'NO':>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,18 @@
 import os
+import asyncio
+import csv
+import io
+import tempfile
+import hashlib
+import uuid
 import logging
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 from telegram import Update, ReplyKeyboardMarkup, ReplyKeyboardRemove, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import BadRequest
 from telegram.ext import (
     Application, 
+    PersistenceInput,
     CommandHandler, 
     ContextTypes, 
     ConversationHandler, 
@@ -12,17 +20,24 @@ from telegram.ext import (
     filters, 
     CallbackQueryHandler
 )
-from google_sheets import GoogleSheetsHelper
+from google_sheets import GoogleSheetsHelper, AsyncGoogleSheetsHelper
+from prefetch import Prefetcher
+from persistence import SQLitePersistence
+from metrics import metrics, start_metrics_server
+from log_setup import setup_logging
+from order_import import read_rows, parse_orders, parse_date, parse_amount, format_amount, phone_digits
+from report import export_report
+from scheduler import BACKGROUND
+from dedup import DedupStore
+from update_processor import ChatOrderedUpdateProcessor
 from datetime import datetime, timedelta
 import pytz
 
 # Load environment variables
 load_dotenv()
 
-# Enable logging
-logging.basicConfig(
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO
-)
+# Enable logging (records are written by a background listener thread)
+setup_logging()
 logger = logging.getLogger(__name__)
 
 # Define conversation states (add SELECTING_REGION)
@@ -30,14 +45,86 @@ SELECTING_ACTION, SELECTING_DATE, SELECTING_KOD, SELECTING_REGION, ENTERING_ADDR
 ENTERING_CARD, ENTERING_AMOUNT, CONFIRMING_OVERWRITE, EDITING_FIELD, \
 REVIEW_SUMMARY = range(12)  # Now 12 states total
 
-# Initialize Google Sheets helper
-sheets_helper = GoogleSheetsHelper()
+# Initialize Google Sheets helper (calls run on a thread pool, not on the event loop).
+# Nothing is fetched here: the helper connects on first use or in the warm-up below.
+sheets_helper = AsyncGoogleSheetsHelper(GoogleSheetsHelper())
+
+# Warms the caches for the data the user's next choice will need
+prefetcher = Prefetcher(sheets_helper)
+
+# Scheduler queue depth and wait times, exported with the latency metrics
+metrics.add_gauges(lambda: {
+    f"sheets_scheduler_{key}{{lane=\"{lane}\"}}": value
+    for lane, lane_stats in sheets_helper.helper.scheduler.stats()["lanes"].items()
+    for key, value in lane_stats.items()
+})
+
+# Worksheet metadata fetches made, and saved by the worksheet handle cache
+metrics.add_gauges(lambda: {
+    "sheets_metadata_calls": sheets_helper.helper.metadata_calls,
+    "sheets_metadata_calls_saved": sheets_helper.helper.metadata_calls_saved,
+})
+
+# Lookups answered by joining an identical one already running
+metrics.add_gauges(lambda: {"sheets_lookups_shared": sheets_helper.lookups.shared})
+
+# Telegram user IDs allowed to use /stats
+ADMIN_IDS = {int(user_id) for user_id in os.getenv("ADMIN_IDS", "").split(",") if user_id.strip()}
+
+
+def get_date_options():
+    """Dates offered on the date keyboard (Uzbekistan time), as YYYY-MM-DD by callback data."""
+    uzb_timezone = pytz.timezone('Asia/Tashkent')
+    today = datetime.now(uzb_timezone).date()
+    return {
+        "yesterday": (today - timedelta(days=1)).strftime("%Y-%m-%d"),
+        "today": today.strftime("%Y-%m-%d"),
+        "tomorrow": (today + timedelta(days=1)).strftime("%Y-%m-%d"),
+    }
 
 class TelegramBot:
     def __init__(self, token):
         """Initialize the Telegram bot."""
         self.token = token
-        self.application = Application.builder().token(token).build()
+        builder = (
+            Application.builder()
+            .token(token)
+            .post_init(self.post_init)
+            .post_shutdown(self.post_shutdown)
+        )
+        
+        # Updates of different chats run concurrently (up to MAX_CONCURRENT_UPDATES
+        # handlers at once); each chat's updates still run one at a time, in order
+        self.update_processor = ChatOrderedUpdateProcessor(int(os.getenv("MAX_CONCURRENT_UPDATES", "32")))
+        builder = builder.concurrent_updates(self.update_processor)
+        metrics.add_gauges(lambda: {
+            f"bot_updates_{key}": value for key, value in self.update_processor.stats().items()
+        })
+        
+        # Results of submitted orders by idempotency key, so a double-tapped "confirm"
+        # saves the order once and the repeat is answered with the same result.
+        # Opened in post_init: building the bot must not create the database
+        self.submissions = None
+        metrics.add_gauges(lambda: {
+            "bot_submissions_duplicates": self.submissions.duplicates if self.submissions else 0
+        })
+        
+        # Keep conversation state and user_data across restarts (and, with
+        # PERSISTENCE_SHARED=1, across workers sharing the database)
+        if os.getenv("BOT_PERSISTENCE", "1") == "1":
+            builder = builder.persistence(SQLitePersistence(
+                os.getenv("PERSISTENCE_PATH", "bot_state.db"),
+                store_data=PersistenceInput(bot_data=False, chat_data=False, callback_data=False),
+                update_interval=float(os.getenv("PERSISTENCE_UPDATE_INTERVAL", "5")),
+                shared=os.getenv("PERSISTENCE_SHARED", "0") == "1"
+            ))
+        
+        # Point the bot at another Bot API server (e.g. a local stand-in for tests)
+        api_base_url = os.getenv("TELEGRAM_API_BASE_URL")
+        if api_base_url:
+            builder = builder.base_url(api_base_url)
+        
+        self.application = builder.build()
         
         # Add conversation handler
         conv_handler = ConversationHandler(
@@ -74,7 +161,7 @@ class TelegramBot:
                     CallbackQueryHandler(self.back_to_card, pattern="^back_to_card$")
                 ],
                 REVIEW_SUMMARY: [
-                    CallbackQueryHandler(self.process_summary_action, pattern="^(confirm_submit|edit_field:.+)$"),
+                    CallbackQueryHandler(self.process_summary_action, pattern=r"^(confirm_submit(:\w+)?|edit_field:.+)$"),
                     CallbackQueryHandler(self.back_to_amount, pattern="^back_to_amount$")
                 ],
                 CONFIRMING_OVERWRITE: [
@@ -87,15 +174,32 @@ class TelegramBot:
                 ]
             },
             fallbacks=[CommandHandler("cancel", self.cancel)],
-            allow_reentry=True
+            allow_reentry=True,
+            name="order_conversation",
+            # Only with BOT_PERSISTENCE on: PTB refuses a persistent handler without persistence
+            persistent=self.application.persistence is not None
         )
         
+        # Record the latency of every step of the conversation
+        metrics.instrument_conversation(conv_handler)
+        
         self.application.add_handler(conv_handler)
         
+        # A repeated "confirm" tap after the conversation ended gets the stored result
+        self.application.add_handler(CallbackQueryHandler(self.repeat_submit, pattern=r"^confirm_submit:\w+$"))
+        
         # Add a separate handler for /start command that can interrupt any conversation
         #1 self.application.add_handler(CommandHandler("start", self.start))
         self.application.add_handler(CommandHandler("change", self.change_action))
         self.application.add_handler(CommandHandler("help", self.help_command))
+        self.application.add_handler(CommandHandler("stats", self.stats_command))
+        self.application.add_handler(CommandHandler("report", self.report_command))
+        
+        # Bulk import: an .xlsx/.csv file of orders instead of one conversation per order
+        self.application.add_handler(MessageHandler(
+            filters.Document.FileExtension("xlsx") | filters.Document.FileExtension("csv"),
+            self.import_orders
+        ))
         self.application.add_handler(CommandHandler("start", self.force_start))
 
     async def start(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
@@ -105,6 +209,7 @@ class TelegramBot:
         
         # Clear all user data thoroughly
         context.user_data.clear()
+        prefetcher.cancel(user.id)
         
         # Initialize fresh navigation stack
         context.user_data["navigation_stack"] = [SELECTING_ACTION]
@@ -158,6 +263,8 @@ class TelegramBot:
             if key in context.user_data:
                 del context.user_data[key]
         
+        prefetcher.cancel(update.effective_user.id)
+        
         # Create keyboard with options
         reply_keyboard = [["Yangi Buyurtma", "Eski Buyurtma"]]
         
@@ -218,6 +325,9 @@ class TelegramBot:
             reply_markup=reply_markup
         )
         
+        # Load the three dates while the user is choosing
+        prefetcher.prefetch_dates(update.effective_user.id, list(get_date_options().values()))
+        
         # Update navigation stack
         context.user_data["navigation_stack"].append(SELECTING_DATE)
         
@@ -239,18 +349,7 @@ class TelegramBot:
             return await self.change_action(update, context)
         
         # Calculate the selected date WITH UZBEKISTAN TIMEZONE
-        uzb_timezone = pytz.timezone('Asia/Tashkent')
-        now_uzb = datetime.now(uzb_timezone)
-        today = now_uzb.date()
-        
-        if date_choice == "yesterday":
-            selected_date = today - timedelta(days=1)
-        elif date_choice == "today":
-            selected_date = today
-        elif date_choice == "tomorrow":
-            selected_date = today + timedelta(days=1)
-        
-        date_str = selected_date.strftime("%Y-%m-%d")
+        date_str = get_date_options()[date_choice]
 
         # Store selected date
         context.user_data["selected_date"] = date_str
@@ -260,7 +359,7 @@ class TelegramBot:
         only_empty = user_action == "Yangi Buyurtma"  # True for new orders, False for existing orders
         
         # Get KODs from Excel based on the action type
-        kods = sheets_helper.get_available_kods(date_str, only_empty=only_empty)
+        kods = await sheets_helper.get_available_kods(date_str, only_empty=only_empty)
         
         if not kods:
             if only_empty:
@@ -298,6 +397,9 @@ class TelegramBot:
             reply_markup=reply_markup
         )
         
+        # Load what selecting one of these KODs will look up
+        prefetcher.prefetch_kods(update.effective_user.id, date_str, kods)
+        
         # Update navigation stack
         context.user_data["navigation_stack"].append(SELECTING_KOD)
         
@@ -325,6 +427,8 @@ class TelegramBot:
             reply_markup=reply_markup
         )
         
+        prefetcher.prefetch_dates(update.effective_user.id, list(get_date_options().values()))
+        
         return SELECTING_DATE
 
     async def back_to_action(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
@@ -336,6 +440,8 @@ class TelegramBot:
         if "navigation_stack" in context.user_data and SELECTING_DATE in context.user_data["navigation_stack"]:
             context.user_data["navigation_stack"].remove(SELECTING_DATE)
         
+        prefetcher.cancel(update.effective_user.id)
+        
         # Create keyboard with options
         reply_keyboard = [["Yangi Buyurtma", "Eski Buyurtma"]]
         
@@ -368,7 +474,7 @@ class TelegramBot:
         selected_date = context.user_data.get("selected_date", datetime.now().strftime("%Y-%m-%d"))
         
         # Get MANZIL from Sheet2 for BOTH cases
-        manzil = sheets_helper.get_sheet2_manzil(kod, selected_date)
+        manzil = await sheets_helper.get_sheet2_manzil(kod, selected_date)
         if manzil:
             context.user_data["manzil"] = manzil
         
@@ -377,7 +483,7 @@ class TelegramBot:
         
         # For BOTH "Eski Buyurtma" and "Yangi Buyurtma", show region selection
         if user_action == "Eski Buyurtma":
-            existing_order = sheets_helper.get_existing_order(kod, selected_date)
+            existing_order = await sheets_helper.get_existing_order(kod, selected_date)
             
             if existing_order:
                 # Show existing order with region selection
@@ -424,7 +530,7 @@ class TelegramBot:
                 return ConversationHandler.END
                     
         else:  # "Yangi Buyurtma" - Show region selection
-            existing_order = sheets_helper.get_existing_order(kod, selected_date)
+            existing_order = await sheets_helper.get_existing_order(kod, selected_date)
             
             if existing_order:
                 # Existing order found for "Yangi Buyurtma" - ask what to do
@@ -521,7 +627,7 @@ class TelegramBot:
         only_empty = user_action == "Yangi Buyurtma"  # True for new orders, False for existing orders
         
         # Get KODs again
-        kods = sheets_helper.get_available_kods(selected_date, only_empty=only_empty)
+        kods = await sheets_helper.get_available_kods(selected_date, only_empty=only_empty)
         
         if not kods:
             if only_empty:
@@ -558,6 +664,8 @@ class TelegramBot:
             reply_markup=reply_markup
         )
         
+        prefetcher.prefetch_kods(update.effective_user.id, selected_date, kods)
+        
         # Update navigation stack
         if "navigation_stack" in context.user_data and ENTERING_ADDRESS in context.user_data["navigation_stack"]:
             context.user_data["navigation_stack"].remove(ENTERING_ADDRESS)
@@ -603,11 +711,9 @@ class TelegramBot:
             
         phone = update.message.text
         
-        # Remove all non-digit characters for validation
-        phone_digits = ''.join(filter(str.isdigit, phone))
-        
-        # Simple phone validation (only digits, check length)
-        if not phone_digits.isdigit() or len(phone_digits) < 9:
+        # Simple phone validation (at least 9 digits; the same check as file imports)
+        digits = phone_digits(phone)
+        if digits is None:
             await update.message.reply_text(
                 "Telefon raqami noto'g'ri formatda. Iltimos, faqat raqamlar kiriting (kamida 9 ta):\n\n"
                 "Masalan: 99 008 44 06 yoki 990084406"
@@ -616,7 +722,7 @@ class TelegramBot:
         
         # Store both formatted and digits-only versions
         context.user_data["telefon"] = phone  # Store the formatted version
-        context.user_data["telefon_digits"] = phone_digits  # Store digits-only for validation
+        context.user_data["telefon_digits"] = digits  # Store digits-only for validation
         
         # Create keyboard with back button
         keyboard = [[InlineKeyboardButton("◀️ Orqaga", callback_data="back_to_phone")]]
@@ -748,29 +854,9 @@ class TelegramBot:
             
         amount = update.message.text
         
-        # Remove thousand separators but keep decimal point
-        cleaned_amount = amount.replace(" ", "").replace(",", "").replace(".", "")
-        
-        # For decimal values, we need a different approach
-        # Let's check if it's a valid number by trying to convert to float
+        # Thousand separators (spaces, commas, several dots) are dropped; the same rules as file imports
         try:
-            # First, remove thousand separators but keep the last dot as decimal
-            temp_amount = amount.replace(" ", "").replace(",", "")
-            
-            # Count dots to handle thousand separators vs decimal point
-            dot_count = temp_amount.count('.')
-            if dot_count > 1:
-                # Multiple dots - treat as thousand separators except the last one
-                parts = temp_amount.split('.')
-                decimal_part = parts[-1] if len(parts[-1]) <= 2 else ''  # Assume max 2 decimal places
-                integer_part = ''.join(parts[:-1]) if decimal_part else ''.join(parts)
-                if decimal_part:
-                    temp_amount = f"{integer_part}.{decimal_part}"
-                else:
-                    temp_amount = integer_part
-            
-            amount_num = float(temp_amount)
-            
+            amount_num = parse_amount(amount)
         except ValueError:
             await update.message.reply_text(
                 "To'lov summasi noto'g'ri formatda. Iltimos, faqat raqamlar kiriting:\n\n"
@@ -784,10 +870,7 @@ class TelegramBot:
             return ENTERING_AMOUNT
         
         # Format amount with thousand separators for display
-        if amount_num.is_integer():
-            formatted_amount = "{:,.0f}".format(amount_num).replace(",", " ")
-        else:
-            formatted_amount = "{:,.2f}".format(amount_num).replace(",", " ")
+        formatted_amount = format_amount(amount_num)
         
         # Store both original and formatted versions
         context.user_data["summa"] = formatted_amount
@@ -860,9 +943,14 @@ class TelegramBot:
             "Ma'lumotlar to'g'rimi?"
         )
         
+        # Idempotency key of this submission: (user, KOD, date, summary shown)
+        submission = hashlib.sha1(
+            f"{update.effective_user.id}:{kod}:{selected_date}:{uuid.uuid4().hex}".encode()
+        ).hexdigest()[:16]
+        
         # Create inline keyboard for confirmation and editing
         keyboard = [
-            [InlineKeyboardButton("✅ Ha, jo'natish", callback_data="confirm_submit")],
+            [InlineKeyboardButton("✅ Ha, jo'natish", callback_data=f"confirm_submit:{submission}")],
             [InlineKeyboardButton("✏️ Manzil", callback_data="edit_field:Manzil")],
             [InlineKeyboardButton("✏️ Transport", callback_data="edit_field:Transport_raqami")],
             [InlineKeyboardButton("✏️ Telefon", callback_data="edit_field:Haydovchi_telefon")],
@@ -916,7 +1004,7 @@ class TelegramBot:
         
         action = query.data
         
-        if action == "confirm_submit":
+        if action.startswith("confirm_submit"):
             # Proceed with saving the order
             return await self.save_order(update, context)
         elif action.startswith("edit_field:"):
@@ -958,72 +1046,112 @@ class TelegramBot:
         return await self.show_summary(update, context)
 
     async def save_order(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-        """Save the complete order to Google Sheets."""
+        """
+        Save the complete order to Google Sheets, once per submission.
+        
+        The "confirm" button carries the submission's idempotency key: a
+        repeated tap, while the save runs or after it, gets the stored result
+        instead of writing the order again.
+        """
         query = update.callback_query
         await query.answer()
         
-        selected_date = context.user_data.get("selected_date", datetime.now().strftime("%Y-%m-%d"))
+        submission = query.data.partition(":")[2]
+        if submission:
+            result, duplicate = await self.submissions.run(
+                f"{update.effective_user.id}:{submission}",
+                lambda: self.submit_order(context.user_data)
+            )
+            if duplicate:
+                logger.info("Repeated confirm_submit from user %s answered from the stored result", update.effective_user.id)
+        else:
+            # Summary shown before submissions had keys
+            result = await self.submit_order(context.user_data)
+        
+        await self.show_submit_result(query, result)
+        
+        # Clear user data
+        if context.user_data:
+            context.user_data.clear()
+        prefetcher.cancel(update.effective_user.id)
+        
+        return ConversationHandler.END
+
+    async def submit_order(self, user_data: dict) -> dict:
+        """Write the order to Sheet1 and Sheet2. Returns {"success", "text"} for the reply."""
+        selected_date = user_data.get("selected_date", datetime.now().strftime("%Y-%m-%d"))
         
         # Prepare order data with Viloyat
         order_data = {
             "Sana": selected_date,
-            "KOD": context.user_data.get("kod"),
-            "Manzil": context.user_data.get("manzil", ""),  # From Sheet2
-            "Viloyat": context.user_data.get("viloyat", ""),  # NEW
-            "Transport_raqami": context.user_data.get("transport"),
-            "Haydovchi_telefon": context.user_data.get("telefon"),
-            "Karta_raqami": context.user_data.get("karta"),
-            "To'lov_summasi": context.user_data.get("summa")
+            "KOD": user_data.get("kod"),
+            "Manzil": user_data.get("manzil", ""),  # From Sheet2
+            "Viloyat": user_data.get("viloyat", ""),  # NEW
+            "Transport_raqami": user_data.get("transport"),
+            "Haydovchi_telefon": user_data.get("telefon"),
+            "Karta_raqami": user_data.get("karta"),
+            "To'lov_summasi": user_data.get("summa")
         }
                 
         # Save to Sheet1
-        success_sheet1 = sheets_helper.add_order_to_sheet1(order_data)
+        success_sheet1 = await sheets_helper.add_order_to_sheet1(order_data)
         
         # Update transport info in Sheet2
         success_sheet2 = False
         sheet2_message = ""
         
         if success_sheet1:
-            success_sheet2, sheet2_message = sheets_helper.update_sheet2_transport_info(
+            success_sheet2, sheet2_message = await sheets_helper.update_sheet2_transport_info(
                 order_data["KOD"], 
                 order_data["Transport_raqami"], 
                 order_data["Haydovchi_telefon"],
                 selected_date
             )
         
-        if success_sheet1:
-            # Create a formatted message
-            tolov_summasi = order_data["To'lov_summasi"]
-            
-            message_text = (
-                "✅ Buyurtma muvaffaqiyatli saqlandi!\n\n"
-                f"Sana: {selected_date}\n"
-                f"KOD: {order_data['KOD']}\n"
-                f"Manzil: {order_data['Manzil']}\n"
-                f"Transport raqami: {order_data['Transport_raqami']}\n"
-                f"Haydovchi telefon: {order_data['Haydovchi_telefon']}\n"
-                f"Karta raqami: {order_data['Karta_raqami']}\n"
-            )
-            
-            # Add Sheet2 status message
-            if sheet2_message:
-                message_text += f"\n\n{sheet2_message}"
-            else:
-                message_text += "\n\n✅ Google Sheet 2 ham muvaffaqiyatli yangilandi"
-                
-            message_text += "\n\nYangi buyurtma uchun /start ni bosing."
-            
-            await query.edit_message_text(text=message_text)
-        else:
-            await query.edit_message_text(
-                text="❌ Xatolik yuz berdi. Buyurtma saqlanmadi. Iltimos, qayta urunib ko'ring."
-            )
+        if not success_sheet1:
+            return {
+                "success": False,
+                "text": "❌ Xatolik yuz berdi. Buyurtma saqlanmadi. Iltimos, qayta urunib ko'ring."
+            }
         
-        # Clear user data
-        if context.user_data:
-            context.user_data.clear()
+        # Create a formatted message
+        message_text = (
+            "✅ Buyurtma muvaffaqiyatli saqlandi!\n\n"
+            f"Sana: {selected_date}\n"
+            f"KOD: {order_data['KOD']}\n"
+            f"Manzil: {order_data['Manzil']}\n"
+            f"Transport raqami: {order_data['Transport_raqami']}\n"
+            f"Haydovchi telefon: {order_data['Haydovchi_telefon']}\n"
+            f"Karta raqami: {order_data['Karta_raqami']}\n"
+        )
         
-        return ConversationHandler.END
+        # Add Sheet2 status message
+        if sheet2_message:
+            message_text += f"\n\n{sheet2_message}"
+        else:
+            message_text += "\n\n✅ Google Sheet 2 ham muvaffaqiyatli yangilandi"
+            
+        message_text += "\n\nYangi buyurtma uchun /start ni bosing."
+        return {"success": True, "text": message_text}
+
+    async def show_submit_result(self, query, result: dict):
+        try:
+            await query.edit_message_text(text=result["text"])
+        except BadRequest as e:
+            # A repeat of a submission whose result is already on screen
+            if "not modified" not in str(e).lower():
+                raise
+
+    async def repeat_submit(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """A "confirm" tap that arrives after its conversation ended: answer with the stored result."""
+        query = update.callback_query
+        result = await self.submissions.get(f"{update.effective_user.id}:{query.data.partition(':')[2]}")
+        if result is None:
+            await query.answer("Bu so'rov eskirgan. Yangi buyurtma uchun /start ni bosing.")
+            return
+        
+        await query.answer()
+        await self.show_submit_result(query, result)
 
     async def confirm_overwrite(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         """Handle user choice to edit or overwrite existing order."""
@@ -1099,7 +1227,7 @@ class TelegramBot:
             selected_date = context.user_data.get("selected_date", datetime.now().strftime("%Y-%m-%d"))
             
             # Update the order in Sheet1
-            success = sheets_helper.update_order_in_sheet1(
+            success = await sheets_helper.update_order_in_sheet1(
                 context.user_data.get("kod"), 
                 order_data
             )
@@ -1108,7 +1236,7 @@ class TelegramBot:
             if success and ("transport" in context.user_data or "telefon" in context.user_data):
                 transport = order_data.get("Transport_raqami", "")
                 phone = order_data.get("Haydovchi_telefon", "")
-                sheets_helper.update_sheet2_transport_info(
+                await sheets_helper.update_sheet2_transport_info(
                     context.user_data.get("kod"), 
                     transport, 
                     phone,
@@ -1140,6 +1268,7 @@ class TelegramBot:
             # Clear user data
             if context.user_data:
                 context.user_data.clear()
+            prefetcher.cancel(update.effective_user.id)
             
             return ConversationHandler.END
             
@@ -1217,6 +1346,7 @@ class TelegramBot:
         # Clear user data
         if context.user_data:
             context.user_data.clear()
+        prefetcher.cancel(user.id)
         
         await update.message.reply_text(
             "❌ Buyurtma bekor qilindi. Yangi buyurtma uchun /start ni bosing.",
@@ -1232,14 +1362,185 @@ class TelegramBot:
             "/start - Botni ishga tushirish yoki har qanday vaqt yangidan boshlash\n"
             "/change - Yangi/Eski buyurtma tanlovini o'zgartirish\n"
             "/cancel - Joriy amalni bekor qilish\n"
-            "/help - Yordam ko'rsatish\n\n"
+            "/help - Yordam ko'rsatish\n"
+            "📎 .xlsx yoki .csv fayl yuborib, ko'p buyurtmani birdaniga kiritish mumkin\n\n"
             "Har qanday bosqichda /start ni bosish orqali yangidan boshlashingiz mumkin.\n"
             "/change buyrug'i orqali Yangi/Eski buyurtma tanlovini o'zgartirishingiz mumkin."
         )
 
+    async def import_orders(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """Import the orders of an uploaded .xlsx/.csv file and reply with a per-row report."""
+        document = update.message.document
+        status_message = await update.message.reply_text("⏳ Fayl tekshirilmoqda...")
+        
+        try:
+            telegram_file = await document.get_file()
+            content = bytes(await telegram_file.download_as_bytearray())
+            rows = await asyncio.to_thread(read_rows, document.file_name, content)
+        except Exception as e:
+            logger.error(f"Error reading import file {document.file_name}: {e}")
+            await status_message.edit_text("❌ Faylni o'qib bo'lmadi. Iltimos, .xlsx yoki .csv fayl yuboring.")
+            return
+        
+        max_rows = int(os.getenv("IMPORT_MAX_ROWS", "1000"))
+        if len(rows) - 1 > max_rows:
+            await status_message.edit_text(f"❌ Faylda juda ko'p qator bor (ko'pi bilan {max_rows} ta).")
+            return
+        
+        # Validate every row first, then save the valid ones in one go
+        orders, errors = parse_orders(rows)
+        await status_message.edit_text(f"⏳ {len(orders)} ta buyurtma saqlanmoqda...")
+        results = await sheets_helper.import_orders([order for _, order in orders]) if orders else []
+        
+        report = [(line_number, "", False, message) for line_number, message in errors]
+        for (line_number, order), (success, message) in zip(orders, results):
+            report.append((line_number, order["KOD"], success, message))
+        report.sort()
+        
+        output = io.StringIO()
+        writer = csv.writer(output)
+        writer.writerow(["Qator", "KOD", "Holat", "Izoh"])
+        for line_number, kod, success, message in report:
+            writer.writerow([line_number, kod, "OK" if success else "XATO", message])
+        
+        saved = sum(1 for _, _, success, _ in report if success)
+        await status_message.edit_text(
+            f"📥 Import yakunlandi: {saved} ta saqlandi, {len(report) - saved} ta xato.\n"
+            "Har bir qator natijasi ilova qilingan faylda."
+        )
+        await update.message.reply_document(
+            document=io.BytesIO(output.getvalue().encode("utf-8-sig")),
+            filename="import_natijasi.csv"
+        )
+
+    async def report_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """
+        Send a Sheet1 order report (admins only).
+        
+        Usage: /report [FROM] [TO] [Viloyat] [csv]; dates as YYYY-MM-DD or DD.MM.YYYY.
+        Without dates, the report covers the current month up to today.
+        """
+        if update.effective_user.id not in ADMIN_IDS:
+            await update.message.reply_text("❌ Bu buyruq faqat administratorlar uchun.")
+            return
+        
+        args = list(context.args or [])
+        file_format = "csv" if args and args[-1].lower() == "csv" else "xlsx"
+        if args and args[-1].lower() in ("csv", "xlsx"):
+            args.pop()
+        
+        today = datetime.now(pytz.timezone('Asia/Tashkent')).date()
+        try:
+            start = datetime.strptime(parse_date(args[0]), "%Y-%m-%d").date() if args else today.replace(day=1)
+            end = datetime.strptime(parse_date(args[1]), "%Y-%m-%d").date() if len(args) > 1 else today
+        except ValueError:
+            await update.message.reply_text(
+                "❌ Sana noto'g'ri. Masalan:\n/report 2026-10-01 2026-10-31 Toshkent csv"
+            )
+            return
+        viloyat = args[2] if len(args) > 2 else None
+        
+        status_message = await update.message.reply_text("⏳ Hisobot tayyorlanmoqda...")
+        
+        def build(path: str) -> int:
+            # A report is a long read; keep it behind the users' own requests
+            with sheets_helper.helper.scheduler.priority(BACKGROUND):
+                return export_report(sheets_helper.helper, start, end, path, file_format, viloyat)
+        
+        handle, path = tempfile.mkstemp(suffix=f".{file_format}")
+        os.close(handle)
+        try:
+            count = await asyncio.to_thread(build, path)
+            with open(path, "rb") as report_file:
+                await update.message.reply_document(
+                    document=report_file,
+                    filename=f"hisobot_{start}_{end}.{file_format}",
+                    caption=f"📊 {start} — {end}" + (f", {viloyat}" if viloyat else "") + f": {count} ta buyurtma"
+                )
+            await status_message.delete()
+        except Exception as e:
+            logger.error(f"Error building report: {e}")
+            await status_message.edit_text("❌ Hisobotni tayyorlashda xatolik yuz berdi.")
+        finally:
+            os.remove(path)
+
+    async def stats_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """Show the slowest handlers and Sheets calls (admins only)."""
+        if update.effective_user.id not in ADMIN_IDS:
+            await update.message.reply_text("❌ Bu buyruq faqat administratorlar uchun.")
+            return
+        
+        lines = []
+        for family, title in (("handler", "Bosqichlar"), ("helper", "Sheets metodlari"), ("api", "Sheets API")):
+            lines.append(f"📊 {title} (chaqiruv / xato / p50 / p99):")
+            for name, calls, errors, p50, p99 in metrics.summary(family):
+                lines.append(f"  {name}: {calls} / {errors} / {p50 * 1000:.0f}ms / {p99 * 1000:.0f}ms")
+            lines.append("")
+        
+        scheduler_stats = sheets_helper.helper.scheduler.stats()
+        for lane, lane_stats in scheduler_stats["lanes"].items():
+            lines.append(
+                f"⏳ {lane}: navbat {lane_stats['queue_depth']}, "
+                f"kutish o'rtacha {lane_stats['wait_time_avg'] * 1000:.0f}ms, "
+                f"maks {lane_stats['wait_time_max'] * 1000:.0f}ms"
+            )
+        lines.append(f"🔁 Qayta urinishlar: {scheduler_stats['retries']}")
+        lines.append(
+            f"🗂 Metadata so'rovlari: {sheets_helper.helper.metadata_calls}, "
+            f"keshdan: {sheets_helper.helper.metadata_calls_saved}"
+        )
+        lines.append(f"🤝 Birgalikdagi so'rovlar: {sheets_helper.lookups.shared}")
+        if self.submissions is not None:
+            lines.append(f"♻️ Takroriy jo'natishlar: {self.submissions.duplicates}")
+        
+        await update.message.reply_text("\n".join(lines))
+
+    async def post_init(self, application: Application) -> None:
+        """Open the submissions store and start connecting to Google Sheets in the background while polling starts."""
+        self.submissions = DedupStore(
+            os.getenv("SUBMISSIONS_DB_PATH", "submissions.db") or None,
+            ttl=float(os.getenv("SUBMISSION_TTL", "86400"))
+        )
+        if os.getenv("SHEETS_WARM_UP", "1") == "1":
+            self.warm_up_task = asyncio.create_task(self.warm_up_sheets())
+
+    async def warm_up_sheets(self) -> None:
+        """Connect to Google Sheets and load the working set ahead of the first update that needs it."""
+        try:
+            await sheets_helper.connect()
+            # The three dates of the date keyboard: the shift's working set
+            await sheets_helper.warm_dates(list(get_date_options().values()))
+        except Exception as e:
+            # Not fatal: the first handler that needs Sheets retries the connection
+            logger.error(f"Google Sheets warm-up failed: {e}")
+
+    async def post_shutdown(self, application: Application) -> None:
+        """Release the Sheets thread pool and the submissions store once the application has stopped."""
+        sheets_helper.shutdown(wait=False)
+        if self.submissions is not None:
+            self.submissions.close()
+
     def run(self):
-        """Run the bot."""
-        self.application.run_polling()
+        """Run the bot with long polling, or as a webhook server if BOT_MODE=webhook."""
+        if os.getenv("BOT_MODE", "polling") == "webhook":
+            # In production, prefer gunicorn: gunicorn "webhook:create_app()"
+            from webhook import WebhookRunner, create_app
+            
+            runner = WebhookRunner(
+                self.application,
+                webhook_url=os.getenv("WEBHOOK_URL"),
+                secret_token=os.getenv("WEBHOOK_SECRET")
+            )
+            runner.start()
+            try:
+                create_app(runner).run(host="0.0.0.0", port=int(os.getenv("PORT", "8080")))
+            finally:
+                runner.stop()
+        else:
+            metrics_port = os.getenv("METRICS_PORT")
+            if metrics_port:
+                start_metrics_server(int(metrics_port))
+            self.application.run_polling()
 
 def main():
     """Start the bot."""
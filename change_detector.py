@@ -0,0 +1,52 @@
+import logging
+import threading
+import time
+from typing import Optional
+
+from googleapiclient.discovery import build
+
+logger = logging.getLogger(__name__)
+
+
+class SpreadsheetChangeDetector:
+    """
+    Tells whether a spreadsheet changed, using the Drive API file metadata.
+
+    files.get(fields="version,modifiedTime") is a tiny request compared to
+    downloading a worksheet, and the version goes up on every change to the
+    file. Each spreadsheet is checked at most once per `interval` seconds;
+    callers in between get the last known version.
+    """
+
+    def __init__(self, credentials, interval: float = 15):
+        self.interval = interval
+        self.checks = 0
+        self._service = build("drive", "v3", credentials=credentials, cache_discovery=False)
+        self._versions = {}  # file ID -> (version, checked_at)
+        self._lock = threading.Lock()
+        # The underlying httplib2 connection is not thread-safe
+        self._request_lock = threading.Lock()
+
+    def version(self, file_id: str) -> Optional[str]:
+        """Get the spreadsheet's current version, or None if it can't be determined."""
+        with self._lock:
+            cached = self._versions.get(file_id)
+            if cached is not None and time.monotonic() - cached[1] < self.interval:
+                return cached[0]
+
+        try:
+            with self._request_lock:
+                metadata = self._service.files().get(
+                    fileId=file_id,
+                    fields="version,modifiedTime",
+                    supportsAllDrives=True
+                ).execute()
+        except Exception as e:
+            logger.warning(f"Could not check spreadsheet {file_id} for changes: {e}")
+            return None
+
+        version = metadata.get("version") or metadata.get("modifiedTime")
+        with self._lock:
+            self.checks += 1
+            self._versions[file_id] = (version, time.monotonic())
+        return version
@@ -0,0 +1,58 @@
+import os
+
+# Tests run against fake_sheets in memory: no write-behind queue, replica or quota pacing,
+# and no databases left in the working directory. Set before the modules are imported.
+os.environ.setdefault("SHEETS_WRITE_BEHIND", "0")
+os.environ.setdefault("SHEETS_REPLICA", "0")
+os.environ.setdefault("SHEETS_QUOTA_PER_MINUTE", "1000000000")
+os.environ.setdefault("SHEETS_QUOTA_BURST", "1000000")
+os.environ.setdefault("SHEETS_WARM_UP", "0")
+os.environ.setdefault("BOT_PERSISTENCE", "0")
+os.environ.setdefault("SUBMISSIONS_DB_PATH", "")
+
+import pytest
+
+from fake_sheets import FakeClient
+from google_sheets import GoogleSheetsHelper, SHEET1_HEADERS
+
+DATE = "2026-10-17"
+SHEET2_DATE = "17.10.2026"
+MONTH = "Oktabr 2026"
+
+
+def sheet1_row(order_id: int, kod: str, sana: str = SHEET2_DATE) -> list:
+    return [str(order_id), sana, f"Manzil {kod}", kod, "Toshkent", "01A000AA", "+998900000000",
+            "8600000000000000", "100000", "", "", "", ""]
+
+
+def sheet2_row(i: int, kod: str, sana: str = SHEET2_DATE) -> list:
+    return [str(i), sana, f"Manzil {kod}", kod, kod] + [""] * 11
+
+
+@pytest.fixture
+def fake_client():
+    """Sheet1 with 5 orders (K000001..K000005) in MONTH; Sheet2 with 30 KODs on DATE."""
+    client = FakeClient()
+    client.create("sheet1").load(MONTH, [list(SHEET1_HEADERS)] + [
+        sheet1_row(i, f"K{i:06d}") for i in range(1, 6)
+    ])
+    client.create("sheet2").load(SHEET2_DATE, [["#", "Sana", "MANZIL", "KOD", "KOD"] + [""] * 11] + [
+        sheet2_row(i, f"K{i:06d}") for i in range(1, 31)
+    ])
+    return client
+
+
+@pytest.fixture
+def helper(fake_client):
+    helper = GoogleSheetsHelper(client=fake_client, sheet1_id="sheet1", sheet2_id="sheet2")
+    helper.connect()
+    yield helper
+    helper.close()
+
+
+def new_order(kod: str, date_str: str = DATE) -> dict:
+    return {
+        "Sana": date_str, "Manzil": f"Manzil {kod}", "KOD": kod, "Viloyat": "Toshkent",
+        "Transport_raqami": "01A111AA", "Haydovchi_telefon": "+998901111111",
+        "Karta_raqami": "8600111111111111", "To'lov_summasi": "150 000",
+    }
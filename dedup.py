@@ -0,0 +1,155 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+from typing import Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """
+    Collapse identical concurrent calls into one.
+
+    While a call for a key is running, later callers with the same key await
+    its result instead of starting their own. Nothing is kept once it
+    finishes; callers share the result object, so they must not mutate it.
+    """
+
+    def __init__(self):
+        self._in_flight: Dict[Hashable, asyncio.Task] = {}
+        self.shared = 0
+
+    def running(self, key: Hashable) -> Optional[asyncio.Task]:
+        """The call in flight for key, if any."""
+        return self._in_flight.get(key)
+
+    async def run(self, key: Hashable, func: Callable[[], Awaitable]) -> Tuple[object, bool]:
+        """Run func(), or join the call already running for key. Returns (result, joined)."""
+        task = self._in_flight.get(key)
+        if task is not None:
+            self.shared += 1
+            return await asyncio.shield(task), True
+
+        task = asyncio.ensure_future(func())
+        self._in_flight[key] = task
+        try:
+            # Shielded: a cancelled caller doesn't cancel the call the others wait for
+            return await asyncio.shield(task), False
+        finally:
+            if self._in_flight.get(key) is task:
+                del self._in_flight[key]
+
+
+class DedupStore:
+    """
+    Results of side-effecting operations by idempotency key, kept for `ttl`
+    seconds in memory and (with a path) in SQLite, so a repeated request is
+    answered from the stored result instead of being carried out again -
+    also after a restart, or on another worker sharing the database.
+
+    A repeat that arrives while the first is still running waits for it.
+    Results must be JSON-serializable.
+    """
+
+    def __init__(self, path: Optional[str] = None, ttl: float = 86400):
+        self.ttl = ttl
+        self._results: Dict[str, Tuple[float, object]] = {}
+        self._flight = SingleFlight()
+        self.duplicates = 0
+
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, result TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS results_expires_at ON results (expires_at)")
+            self._db.commit()
+
+    async def run(self, key: str, func: Callable[[], Awaitable]) -> Tuple[object, bool]:
+        """
+        Run func() once per key. Returns (result, duplicate): a duplicate got
+        the stored (or in-flight) result of an earlier call.
+        """
+        stored = await self.get(key)
+        if stored is not None:
+            self.duplicates += 1
+            return stored, True
+
+        async def run_and_store():
+            result = await func()
+            await self.put(key, result)
+            return result
+
+        result, joined = await self._flight.run(key, run_and_store)
+        if joined:
+            self.duplicates += 1
+        return result, joined
+
+    async def get(self, key: str):
+        """The stored result for key, waiting for it if the call is still running; None if unknown."""
+        task = self._flight.running(key)
+        if task is not None:
+            return await asyncio.shield(task)
+
+        entry = self._results.get(key)
+        if entry is not None:
+            if entry[0] > time.time():
+                return entry[1]
+            del self._results[key]
+
+        if self._db is None:
+            return None
+        try:
+            return await asyncio.to_thread(self._load, key)
+        except Exception as e:
+            logger.warning(f"Could not read dedup key {key}: {e}")
+            return None
+
+    async def put(self, key: str, result):
+        expires_at = time.time() + self.ttl
+        self._results[key] = (expires_at, result)
+        self._prune()
+
+        if self._db is None:
+            return
+        try:
+            await asyncio.to_thread(self._store, key, result, expires_at)
+        except Exception as e:
+            # Still deduplicated in memory
+            logger.warning(f"Could not store dedup key {key}: {e}")
+
+    def _prune(self):
+        now = time.time()
+        for key in [key for key, (expires_at, _) in self._results.items() if expires_at <= now]:
+            del self._results[key]
+
+    def _load(self, key: str):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT result, expires_at FROM results WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or row[1] <= time.time():
+            return None
+        result = json.loads(row[0])
+        self._results[key] = (row[1], result)
+        return result
+
+    def _store(self, key: str, result, expires_at: float):
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM results WHERE expires_at <= ?", (time.time(),))
+            self._db.execute(
+                "INSERT OR REPLACE INTO results (key, result, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(result, ensure_ascii=False), expires_at)
+            )
+
+    def close(self):
+        if self._db is not None:
+            with self._lock:
+                self._db.close()
+            self._db = None
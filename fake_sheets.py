@@ -0,0 +1,242 @@
+import re
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+
+import gspread
+from gspread.cell import Cell
+from gspread.utils import a1_to_rowcol, column_letter_to_index
+
+
+class FakeClient:
+    """
+    In-memory stand-in for a gspread Client, for GoogleSheetsHelper(client=...).
+
+    Implements the subset of gspread the helper uses. Every method that would
+    be an HTTP request sleeps `latency` seconds and is counted in `calls`, so
+    benchmarks can report round trips as well as wall time; `cells_read`
+    counts the cells returned by reads, a stand-in for bytes transferred.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls = Counter()
+        self.cells_read = 0
+        self.spreadsheets: Dict[str, "FakeSpreadsheet"] = {}
+        self._lock = threading.Lock()
+
+    def request(self, name: str, cells: int = 0):
+        """Record one simulated API request."""
+        with self._lock:
+            self.calls[name] += 1
+            self.cells_read += cells
+        if self.latency:
+            time.sleep(self.latency)
+
+    def create(self, spreadsheet_id: str) -> "FakeSpreadsheet":
+        """Create an empty spreadsheet (setup helper, not counted)."""
+        spreadsheet = FakeSpreadsheet(self, spreadsheet_id)
+        self.spreadsheets[spreadsheet_id] = spreadsheet
+        return spreadsheet
+
+    def open_by_key(self, key: str) -> "FakeSpreadsheet":
+        self.request("open_by_key")
+        if key not in self.spreadsheets:
+            raise gspread.exceptions.SpreadsheetNotFound(key)
+        return self.spreadsheets[key]
+
+
+class FakeSpreadsheet:
+    def __init__(self, client: FakeClient, spreadsheet_id: str):
+        self.client = client
+        self.id = spreadsheet_id
+        self._worksheets: Dict[str, "FakeWorksheet"] = {}
+
+    def load(self, title: str, rows: List[List[str]]) -> "FakeWorksheet":
+        """Create a worksheet holding the given rows (setup helper, not counted)."""
+        worksheet = FakeWorksheet(self, title, [list(row) for row in rows])
+        self._worksheets[title] = worksheet
+        return worksheet
+
+    def worksheets(self) -> List["FakeWorksheet"]:
+        self.client.request("fetch_sheet_metadata")
+        return list(self._worksheets.values())
+
+    def worksheet(self, title: str) -> "FakeWorksheet":
+        self.client.request("fetch_sheet_metadata")
+        if title not in self._worksheets:
+            raise gspread.exceptions.WorksheetNotFound(title)
+        return self._worksheets[title]
+
+    def add_worksheet(self, title: str, rows: int = 1000, cols: int = 26, index: int = None) -> "FakeWorksheet":
+        self.client.request("add_worksheet")
+        worksheet = self.load(title, [])
+        worksheet.grid_rows = rows
+        return worksheet
+
+    def values_batch_get(self, ranges: List[str], params: Dict = None) -> Dict:
+        value_ranges = []
+        for range_name in ranges:
+            title, cell_range = split_range_name(range_name)
+            if title is None:
+                # A bare (quoted) sheet name means the whole worksheet
+                title, cell_range = split_range_name(f"{range_name}!A:ZZZ")
+            if title not in self._worksheets:
+                raise gspread.exceptions.WorksheetNotFound(title)
+            values = self._worksheets[title]._read_range(cell_range)
+            value_ranges.append({"range": range_name, "majorDimension": "ROWS", "values": values})
+        self.client.request("values_batch_get", sum(count_cells(value_range["values"]) for value_range in value_ranges))
+        return {"spreadsheetId": self.id, "valueRanges": value_ranges}
+
+    def values_batch_update(self, body: Dict) -> Dict:
+        self.client.request("values_batch_update")
+        for data in body["data"]:
+            title, cell_range = split_range_name(data["range"])
+            self._worksheets[title].set_range(cell_range, data["values"])
+        return {"totalUpdatedCells": sum(len(row) for data in body["data"] for row in data["values"])}
+
+
+class FakeWorksheet:
+    def __init__(self, spreadsheet: FakeSpreadsheet, title: str, rows: List[List[str]]):
+        self.spreadsheet = spreadsheet
+        self.title = title
+        self.rows = rows
+        self.grid_rows = len(rows)
+        self._lock = threading.Lock()
+
+    @property
+    def row_count(self) -> int:
+        """Rows in the grid: the rows created with it, or more if writes went past them."""
+        return max(self.grid_rows, len(self.rows))
+
+    def _request(self, name: str, cells: int = 0):
+        self.spreadsheet.client.request(name, cells)
+
+    def set_range(self, cell_range: str, values: List[List]):
+        """Write values with their top-left cell at the start of an A1 range."""
+        row, col = a1_to_rowcol(cell_range.split(":")[0])
+        with self._lock:
+            for row_offset, row_values in enumerate(values):
+                for col_offset, value in enumerate(row_values):
+                    self._set(row + row_offset, col + col_offset, value)
+
+    def _set(self, row: int, col: int, value):
+        while len(self.rows) < row:
+            self.rows.append([])
+        cells = self.rows[row - 1]
+        while len(cells) < col:
+            cells.append("")
+        cells[col - 1] = "" if value is None else str(value)
+
+    def get_all_values(self) -> List[List[str]]:
+        with self._lock:
+            # Like the API: trailing empty rows dropped, rows padded to the widest
+            rows = list(self.rows)
+            while rows and not any(rows[-1]):
+                rows.pop()
+            width = max((len(row) for row in rows), default=0)
+            values = [list(row) + [""] * (width - len(row)) for row in rows]
+        self._request("get_all_values", count_cells(values))
+        return values
+
+    def get(self, range_name: str) -> List[List[str]]:
+        values = self._read_range(range_name)
+        self._request("get", count_cells(values))
+        return values
+
+    def batch_get(self, ranges: List[str], **kwargs) -> List[List[List[str]]]:
+        results = [self._read_range(range_name) for range_name in ranges]
+        self._request("batch_get", sum(count_cells(values) for values in results))
+        return results
+
+    def row_values(self, row: int) -> List[str]:
+        values = self._read_range(f"{row}:{row}")
+        self._request("row_values", count_cells(values))
+        return values[0] if values else []
+
+    def _read_range(self, range_name: str) -> List[List[str]]:
+        """
+        Values of an A1 range ("A1:C5", "B:E" or "1:1") like the API returns
+        them: trailing empty rows and cells dropped.
+        """
+        start, _, end = range_name.partition(":")
+        first_row, first_col = range_bound(start, 1)
+        last_row, last_col = range_bound(end or start, None)
+        with self._lock:
+            values = [list(row[first_col - 1:last_col]) for row in self.rows[first_row - 1:last_row]]
+        for row in values:
+            while row and not row[-1]:
+                row.pop()
+        while values and not values[-1]:
+            values.pop()
+        return values
+
+    def col_values(self, col: int) -> List[str]:
+        with self._lock:
+            values = [row[col - 1] if len(row) >= col else "" for row in self.rows]
+        while values and not values[-1]:
+            values.pop()
+        self._request("col_values", len(values))
+        return values
+
+    def find(self, query: str, in_column: int = None) -> Optional[Cell]:
+        cells = self._find(query, in_column, first=True)
+        return cells[0] if cells else None
+
+    def findall(self, query: str, in_column: int = None) -> List[Cell]:
+        return self._find(query, in_column, first=False)
+
+    def _find(self, query: str, in_column: Optional[int], first: bool) -> List[Cell]:
+        self._request("find")
+        found = []
+        with self._lock:
+            for row_number, row in enumerate(self.rows, start=1):
+                for col_number, value in enumerate(row, start=1):
+                    if in_column is not None and col_number != in_column:
+                        continue
+                    if value == query:
+                        found.append(Cell(row_number, col_number, value))
+                        if first:
+                            return found
+        return found
+
+    def update_cell(self, row: int, col: int, value):
+        self._request("update_cell")
+        with self._lock:
+            self._set(row, col, value)
+
+    def batch_update(self, data: List[Dict], value_input_option: str = "RAW", **kwargs):
+        self._request("batch_update")
+        for update in data:
+            self.set_range(split_range_name(update["range"])[1], update["values"])
+
+    def append_row(self, values: List, value_input_option: str = "RAW", **kwargs):
+        self._request("append_row")
+        with self._lock:
+            while self.rows and not any(self.rows[-1]):
+                self.rows.pop()
+            self.rows.append(["" if value is None else str(value) for value in values])
+
+
+def count_cells(values: List[List[str]]) -> int:
+    return sum(len(row) for row in values)
+
+
+def range_bound(reference: str, default: Optional[int]):
+    """(row, col) of one end of an A1 range; a missing row or column is `default` (None: unbounded)."""
+    match = re.fullmatch(r"([A-Za-z]*)(\d*)", reference)
+    letters, digits = match.groups()
+    row = int(digits) if digits else default
+    col = column_letter_to_index(letters) if letters else default
+    return row, col
+
+
+def split_range_name(range_name: str):
+    """Split "'Sheet name'!A1:B2" into ("Sheet name", "A1:B2"); the title is None without one."""
+    if "!" not in range_name:
+        return None, range_name
+    title, cell_range = range_name.rsplit("!", 1)
+    if title.startswith("'") and title.endswith("'"):
+        title = title[1:-1].replace("''", "'")
+    return title, cell_range
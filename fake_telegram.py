@@ -0,0 +1,102 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs
+
+
+class FakeBotApi:
+    """
+    Local stand-in for the Telegram Bot API server, for tests of the webhook
+    mode: point the bot at it with TELEGRAM_API_BASE_URL=fake.base_url.
+
+    Answers the methods the bot calls (getMe, setWebhook, sendMessage, ...)
+    with minimal valid results and records every request in `requests` as
+    (method, parameters), so a test can check what the bot sent back.
+    """
+
+    BOT_USER = {"id": 123456, "is_bot": True, "first_name": "Megaton", "username": "megaton_test_bot"}
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self.requests: List[Tuple[str, Dict]] = []
+        self._changed = threading.Condition()
+        self._message_ids = 0
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-bot-api", daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/bot"
+
+    def start(self) -> "FakeBotApi":
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+    def sent(self, method: str) -> List[Dict]:
+        """Parameters of every request of one method so far."""
+        with self._changed:
+            return [params for name, params in self.requests if name == method]
+
+    def wait_for(self, method: str, timeout: float = 5.0) -> Optional[Dict]:
+        """Wait for the first request of a method; its parameters, or None on timeout."""
+        deadline = time.monotonic() + timeout
+        with self._changed:
+            while True:
+                for name, params in self.requests:
+                    if name == method:
+                        return params
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._changed.wait(remaining)
+
+    def handle(self, method: str, params: Dict):
+        """Record a request and return its result."""
+        with self._changed:
+            self.requests.append((method, params))
+            self._changed.notify_all()
+            if method == "getMe":
+                return self.BOT_USER
+            if method in ("sendMessage", "editMessageText"):
+                self._message_ids += 1
+                return {
+                    "message_id": self._message_ids,
+                    "date": int(time.time()),
+                    "chat": {"id": int(params.get("chat_id", 0)), "type": "private"},
+                    "from": self.BOT_USER,
+                    "text": params.get("text", ""),
+                }
+            return True
+
+    def _handler_class(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                # /bot<token>/<method>
+                method = self.path.rsplit("/", 1)[-1]
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0)).decode()
+                if self.headers.get("Content-Type", "").startswith("application/json"):
+                    params = json.loads(body or "{}")
+                else:
+                    # python-telegram-bot sends form fields, with JSON-encoded values for objects
+                    params = {key: values[0] for key, values in parse_qs(body).items()}
+
+                payload = json.dumps({"ok": True, "result": api.handle(method, params)}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
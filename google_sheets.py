@@ -1,63 +1,590 @@
 import gspread
 from google.oauth2.service_account import Credentials
-from typing import List, Dict, Optional, Tuple
+from typing import List, Dict, Iterable, Optional, Tuple
 import os
-from datetime import datetime
+from datetime import datetime, timedelta
 import logging
 import re
 import base64
 import json
+import asyncio
+import functools
+import hashlib
+import threading
+import sys
+import time
+from collections import OrderedDict
+from contextlib import ExitStack
+from concurrent.futures import ThreadPoolExecutor
+from gspread.utils import rowcol_to_a1, absolute_range_name
+from write_queue import WriteBehindQueue
+from change_detector import SpreadsheetChangeDetector
+from scheduler import RequestScheduler, BACKGROUND, INTERACTIVE
+from replica import SheetReplica
+from metrics import metrics
+from dedup import SingleFlight
 
-# Set up logging
-logging.basicConfig(level=logging.INFO)
+# Logging is configured by the application (see log_setup.py)
 logger = logging.getLogger(__name__)
 
-class GoogleSheetsHelper:
-    def __init__(self):
-        """Initialize Google Sheets connection using service account credentials from Base64 environment variable."""
-        try:
-            # Define the scope
-            scope = [
-                "https://spreadsheets.google.com/feeds",
-                "https://www.googleapis.com/auth/drive",
-                "https://www.googleapis.com/auth/spreadsheets"
-            ]
-            
-            # Get and decode Base64 credentials
-            credentials_base64 = os.environ.get("CREDENTIALS_BASE64")
-            if not credentials_base64:
-                raise ValueError("CREDENTIALS_BASE64 environment variable not set")
-            
-            credentials_json = base64.b64decode(credentials_base64).decode('utf-8')
-            creds_dict = json.loads(credentials_json)
-            
-            # Create credentials from the decoded dictionary
-            creds = Credentials.from_service_account_info(creds_dict, scopes=scope)
-            logger.info("Using credentials from Base64 environment variable")
+# Header row of a new Sheet1 monthly worksheet
+SHEET1_HEADERS = ["ID", "Sana", "Manzil", "KOD", "Viloyat", "Transport Raqami", 
+                  "Haydovchi telefon raqami", "Karta raqami", "To'lov summasi",
+                  "Salarka hajmi (litr da)", "To'lov holati", "To'lov qilingan vaqt", "Izoh"]
+
+# Order fields -> Sheet1 header names
+SHEET1_FIELD_HEADERS = {
+    "Manzil": "Manzil",
+    "Viloyat": "Viloyat",
+    "Transport_raqami": "Transport Raqami",
+    "Haydovchi_telefon": "Haydovchi telefon raqami",
+    "Karta_raqami": "Karta raqami",
+    "To'lov_summasi": "To'lov summasi",
+}
+
+# Sheet2 columns read by the bot (1-based); only these are downloaded
+SHEET2_READ_COLUMNS = {
+    "Sana": 2,                 # B - date check before transport updates
+    "MANZIL": 3,               # C
+    "KOD": 4,                  # D - MANZIL and order info lookups
+    "KOD_list": 5,             # E - KOD list and transport updates
+    "Transport_info": 14,      # N - order info
+    "Transport_raqami": 15,    # O
+    "Haydovchi_telefon": 16,   # P
+}
+
+# Sheet1 headers read by the bot; their columns come from the worksheet's header row
+SHEET1_READ_HEADERS = ["ID", "Sana", "KOD"] + list(SHEET1_FIELD_HEADERS.values())
+
+# Sheet2 columns written by the bot (1-based)
+SHEET2_COLUMNS = {
+    "MBK": 9,                  # I - MBK marker
+    "Transport_raqami": 15,    # O - Transport
+    "Haydovchi_telefon": 16,   # P - Telefon
+}
+
+
+def pad_rows(rows: List[List[str]]) -> List[List[str]]:
+    """Pad rows to the widest one, like get_all_values() does."""
+    width = max((len(row) for row in rows), default=0)
+    return [list(row) + [""] * (width - len(row)) for row in rows]
+
+
+def column_letter(col: int) -> str:
+    """Letter(s) of a 1-based column: 1 -> "A", 27 -> "AA"."""
+    return re.sub(r"\d", "", rowcol_to_a1(1, col))
+
+
+class RowView:
+    """One row of a ColumnStore, read like the list get_all_values() would have given."""
+
+    __slots__ = ("_store", "_index")
+
+    def __init__(self, store: "ColumnStore", index: int):
+        self._store = store
+        self._index = index
+
+    def __len__(self) -> int:
+        return self._store.width
+
+    def __getitem__(self, col):
+        if isinstance(col, slice):
+            return [self[c] for c in range(*col.indices(self._store.width))]
+        if col < 0:
+            col += self._store.width
+        if not 0 <= col < self._store.width:
+            raise IndexError("row index out of range")
+        column = self._store.columns.get(col)
+        return column[self._index] if column is not None else ""
+
+    def __iter__(self):
+        for col in range(self._store.width):
+            yield self[col]
+
+    def __repr__(self) -> str:
+        return repr(list(self))
+
+
+class ColumnStore:
+    """
+    Worksheet rows held column by column.
+    
+    Only columns with a value in some row get a list; the others (e.g. those
+    left out by projected reads) cost nothing. Values of the low-cardinality
+    columns (dates, regions, KODs; found by their header) are interned, so
+    they are stored once across rows and cached worksheets; interning the
+    unique IDs, phones and card numbers would only grow the intern table.
+    Rows read like padded get_all_values() lists through RowView.
+    """
+
+    __slots__ = ("width", "length", "columns", "interned")
+
+    # Headers (lowercase) of the columns worth interning
+    INTERNED_HEADERS = frozenset({"sana", "kod", "viloyat"})
+
+    def __init__(self, rows: List[List[str]], interned: Optional[Iterable[int]] = None):
+        self.length = len(rows)
+        self.width = max((len(row) for row in rows), default=0)
+        if interned is None:
+            header = rows[0] if rows else []
+            interned = [col for col, name in enumerate(header)
+                        if isinstance(name, str) and name.strip().lower() in self.INTERNED_HEADERS]
+        self.interned = frozenset(interned)
+        self.columns: Dict[int, List[str]] = {}
+        for col in range(self.width):
+            if col in self.interned:
+                values = [sys.intern(row[col]) if col < len(row) else "" for row in rows]
+            else:
+                values = [row[col] if col < len(row) else "" for row in rows]
+            if any(values):
+                self.columns[col] = values
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [RowView(self, i) for i in range(*index.indices(self.length))]
+        if index < 0:
+            index += self.length
+        if not 0 <= index < self.length:
+            raise IndexError("row index out of range")
+        return RowView(self, index)
+
+    def __iter__(self):
+        for index in range(self.length):
+            yield RowView(self, index)
+
+    def column(self, col: int) -> List[str]:
+        """All values of a 0-based column (read-only; empty strings if it has none)."""
+        return self.columns.get(col) or [""] * self.length
+
+    def set(self, row_index: int, col: int, value: str):
+        """Set one cell, growing the store as needed."""
+        if row_index >= self.length:
+            for values in self.columns.values():
+                values.extend([""] * (row_index + 1 - self.length))
+            self.length = row_index + 1
+        self.width = max(self.width, col + 1)
+        
+        values = self.columns.get(col)
+        if values is None:
+            values = self.columns[col] = [""] * self.length
+        values[row_index] = sys.intern(value) if col in self.interned and isinstance(value, str) else value
+
+    def extended(self, length: int, rows: List[List[str]]) -> "ColumnStore":
+        """A new store with the first `length` rows of this one, then `rows`."""
+        # The tail has no header row: keep this store's interned columns
+        tail = ColumnStore(rows, self.interned)
+        store = ColumnStore([], self.interned)
+        store.length = length + tail.length
+        store.width = max(self.width, tail.width)
+        for col in sorted(set(self.columns) | set(tail.columns)):
+            head_values = self.columns.get(col)
+            tail_values = tail.columns.get(col)
+            store.columns[col] = (
+                (head_values[:length] if head_values is not None else [""] * length)
+                + (tail_values if tail_values is not None else [""] * tail.length)
+            )
+        return store
+
+
+class WorksheetSnapshot:
+    """
+    Rows of one worksheet (in a ColumnStore), plus when they were fetched.
+    
+    Lookups by key columns go through hash indexes (value -> 0-based row index)
+    that are built once per snapshot and kept in sync with write-through updates.
+    """
+
+    def __init__(self, rows: Optional[List[List[str]]], version: Optional[str] = None):
+        # rows is None when the worksheet does not exist
+        self.rows = ColumnStore(rows) if rows is not None else None
+        # Spreadsheet version (Drive) read before the rows were downloaded, if known
+        self.version = version
+        # When the rows were downloaded, or last confirmed unchanged
+        self.fetched_at = time.monotonic()
+        # Sheet1: (rows on Google, probe column, its fingerprint, time of the full read)
+        # as of the download, so a refresh can read only the rows added since
+        self.tail_base = None
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    @property
+    def exists(self) -> bool:
+        return self.rows is not None
+
+    def extended(self, length: int, rows: List[List[str]], version: Optional[str]) -> "WorksheetSnapshot":
+        """
+        A new snapshot with the first `length` rows of this one and `rows` after
+        them. This one is left as it is for lookups still using it.
+        """
+        snapshot = WorksheetSnapshot([], version)
+        snapshot.rows = self.rows.extended(length, rows)
+        return snapshot
+
+    def _index_key(self, row_index: int, columns: Tuple[int, ...], strip: bool):
+        if self.rows.width <= max(columns) or row_index >= len(self.rows):
+            return None
+        values = tuple(
+            self.rows.columns[c][row_index] if c in self.rows.columns else ""
+            for c in columns
+        )
+        if strip:
+            values = tuple(value.strip() for value in values)
+        return values[0] if len(values) == 1 else values
+
+    def index(self, columns: Tuple[int, ...], strip: bool = False) -> Dict:
+        """
+        Get the index of the given key columns (0-based), building it on first use.
+        
+        Keys are the cell value for a single column, or a tuple of values for
+        several columns. Like a top-down scan, the first matching row wins.
+        """
+        with self._lock:
+            index = self._indexes.get((columns, strip))
+            if index is None:
+                index = {}
+                if self.rows is not None and self.rows.width > max(columns):
+                    key_columns = [self.rows.column(c) for c in columns]
+                    keys = key_columns[0] if len(columns) == 1 else zip(*key_columns)
+                    for row_index, key in enumerate(keys):
+                        if strip:
+                            key = key.strip() if len(columns) == 1 else tuple(value.strip() for value in key)
+                        index.setdefault(key, row_index)
+                self._indexes[(columns, strip)] = index
+            return index
+
+    def find_row(self, columns: Tuple[int, ...], key, strip: bool = False) -> Optional[int]:
+        """Get the 0-based index of the first row whose key columns equal key."""
+        return self.index(columns, strip).get(key)
+
+    def set_cells(self, row_index: int, values: Dict[int, str]):
+        """Apply a write made through the helper (0-based row and column indexes)."""
+        with self._lock:
+            # Grow to the header width (at least), like get_all_values() pads rows
+            self.rows.width = max(self.rows.width, max(values) + 1)
             
-            # Authorize and open client
-            self.client = gspread.authorize(creds)
+            old_keys = {
+                (columns, strip): self._index_key(row_index, columns, strip)
+                for columns, strip in self._indexes
+                if any(c in values for c in columns)
+            }
             
-            # Get both Sheet IDs from environment variables
-            sheet1_id = os.getenv("SHEET1_ID")
-            sheet2_id = os.getenv("SHEET2_ID")
+            for col_index, value in values.items():
+                self.rows.set(row_index, col_index, value)
             
-            if not sheet1_id or not sheet2_id:
-                raise ValueError("Sheet IDs not found in environment variables")
+            for (columns, strip), old_key in old_keys.items():
+                index = self._indexes[(columns, strip)]
+                if old_key is not None and index.get(old_key) == row_index:
+                    # Fall back to a rebuild in case a later row shares the old key
+                    del self._indexes[(columns, strip)]
+                    continue
+                new_key = self._index_key(row_index, columns, strip)
+                if new_key is not None and (new_key not in index or index[new_key] > row_index):
+                    index[new_key] = row_index
+
+
+class SnapshotCache:
+    """Thread-safe LRU cache of worksheet snapshots with a time-to-live."""
+
+    def __init__(self, ttl: float, max_size: int):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str, is_current=None) -> Optional[WorksheetSnapshot]:
+        """
+        Return the cached snapshot, or None if it is missing or expired.
+        
+        If is_current is given, an expired snapshot is kept (and its TTL restarted)
+        when is_current(snapshot) confirms the data has not changed since.
+        """
+        with self._lock:
+            snapshot = self._entries.get(key)
+            if snapshot is None:
+                return None
+            if time.monotonic() - snapshot.fetched_at <= self.ttl:
+                self._entries.move_to_end(key)
+                return snapshot
+        
+        # Expired: revalidate outside the lock, since it may go to the network
+        if is_current is not None and is_current(snapshot):
+            with self._lock:
+                snapshot.fetched_at = time.monotonic()
+                if self._entries.get(key) is snapshot:
+                    self._entries.move_to_end(key)
+            return snapshot
+        
+        # Kept (until replaced or evicted) for peek()
+        return None
+
+    def peek(self, key: str) -> Optional[WorksheetSnapshot]:
+        """The snapshot held for key, even if expired; for incremental refreshes."""
+        with self._lock:
+            return self._entries.get(key)
+
+    def put(self, key: str, snapshot: WorksheetSnapshot):
+        with self._lock:
+            self._entries[key] = snapshot
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def update_cells(self, key: str, row_index: int, values: Dict[int, str]):
+        """Write-through: patch a cached snapshot in place if it is still cached."""
+        with self._lock:
+            snapshot = self._entries.get(key)
+        if snapshot is not None and snapshot.exists:
+            snapshot.set_cells(row_index, values)
+
+    def invalidate(self, key: str = None):
+        """Drop one cached snapshot, or all of them when no key is given."""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+
+class RowAllocator:
+    """
+    Hands out row numbers and order IDs for one Sheet1 monthly worksheet.
+    
+    Seeded from column A, then kept locally so a save needs no full read.
+    Callers hold `lock` across allocate() and the write that uses the result;
+    the helper re-seeds it when column A shows rows written elsewhere.
+    """
+
+    def __init__(self, id_column: List[str]):
+        self.lock = threading.Lock()
+        self.seed(id_column)
+
+    def seed(self, id_column: List[str]):
+        """(Re)start from the values of column A."""
+        numeric_ids = [int(value) for value in id_column[1:] if value.isdigit()]  # Skip header
+        self.next_id = max(numeric_ids) + 1 if numeric_ids else 1
+        
+        # Rows with an empty ID cell are filled first, then rows after the data
+        self.free_rows = [i for i, value in enumerate(id_column[1:], start=2) if not value.strip()]
+        self.next_row = max(len(id_column) + 1, 2)
+
+    def allocate(self) -> Tuple[int, int]:
+        """Reserve the next (row_number, order_id)."""
+        if self.free_rows:
+            row_number = self.free_rows.pop(0)
+        else:
+            row_number = self.next_row
+            self.next_row += 1
+        
+        order_id = self.next_id
+        self.next_id += 1
+        return row_number, order_id
+
+    def conflicts(self, id_column: List[str]) -> bool:
+        """Whether column A has values in rows this allocator still considers free."""
+        if any(value.strip() for value in id_column[self.next_row - 1:]):
+            return True
+        return any(row <= len(id_column) and id_column[row - 1].strip() for row in self.free_rows)
+
+
+class GoogleSheetsHelper:
+    def __init__(self, client=None, sheet1_id: str = None, sheet2_id: str = None):
+        """
+        Set up the helper without touching the network.
+        
+        Credentials are decoded and both spreadsheets opened on first use
+        (or by an explicit connect(), e.g. a background warm-up), so importing
+        the bot stays fast and works without network access.
+        
+        Args:
+            client: A gspread-compatible client to use instead of authorizing
+                    with CREDENTIALS_BASE64 (e.g. fake_sheets.FakeClient).
+            sheet1_id, sheet2_id: Spreadsheet IDs or URLs; default to the
+                    SHEET1_ID and SHEET2_ID environment variables.
+        """
+        self._backend = client
+        self._sheet1_key = sheet1_id
+        self._sheet2_key = sheet2_id
+        self._client = None
+        self._sheet1 = None
+        self._sheet2 = None
+        self._connect_lock = threading.Lock()
+        
+        # Every Sheets API request goes through the scheduler (quota pacing,
+        # 429/5xx retries, interactive requests ahead of background ones)
+        self.scheduler = RequestScheduler(
+            requests_per_minute=float(os.getenv("SHEETS_QUOTA_PER_MINUTE", "60")),
+            burst=int(os.getenv("SHEETS_QUOTA_BURST", "10")),
+            max_retries=int(os.getenv("SHEETS_MAX_RETRIES", "5"))
+        )
+        
+        # Per-date cache of Sheet2 worksheets (DD.MM.YYYY -> snapshot)
+        self.sheet2_cache = SnapshotCache(
+            ttl=float(os.getenv("SHEET2_CACHE_TTL", "60")),
+            max_size=int(os.getenv("SHEET2_CACHE_SIZE", "16"))
+        )
+        
+        # Per-month cache of Sheet1 worksheets ("Oktabr 2026" -> snapshot)
+        self.sheet1_cache = SnapshotCache(
+            ttl=float(os.getenv("SHEET1_CACHE_TTL", "60")),
+            max_size=int(os.getenv("SHEET1_CACHE_SIZE", "4"))
+        )
+        
+        # Worksheet handles by spreadsheet ID and title, so opening a worksheet
+        # doesn't cost a metadata fetch of the whole spreadsheet every time
+        self.worksheet_cache_ttl = float(os.getenv("WORKSHEET_CACHE_TTL", "300"))
+        self._worksheet_handles = {}
+        self._worksheet_handles_refreshed_at = {}
+        self._worksheet_handles_lock = threading.Lock()
+        self.metadata_calls = 0
+        self.metadata_calls_saved = 0
+        
+        # Download only the columns the bot reads (SHEET2_READ_COLUMNS, SHEET1_READ_HEADERS)
+        self.projected_reads = os.getenv("SHEETS_PROJECTED_READS", "1") == "1"
+        # Sheet1 worksheet name -> 1-based columns of SHEET1_READ_HEADERS, from its header row
+        self._sheet1_read_columns = {}
+        
+        # Refresh Sheet1 worksheets by reading only the rows added since the last
+        # download, with a full reload at least every SHEET1_FULL_RELOAD_INTERVAL seconds
+        self.sheet1_tail_reads = os.getenv("SHEET1_TAIL_READS", "1") == "1"
+        self.sheet1_full_reload_interval = float(os.getenv("SHEET1_FULL_RELOAD_INTERVAL", "600"))
+        
+        # Row/ID allocators for Sheet1 monthly worksheets, by worksheet name
+        self._row_allocators = {}
+        self._row_allocators_lock = threading.Lock()
+        
+        # Durable write-behind queue, started by connect()
+        self.write_queue = None
+        
+        # Drive-based change detection, set up by connect()
+        self.change_detector = None
+        
+        # Local SQLite replica of the worksheets read, and its sync thread, set up by connect()
+        self.replica = None
+        self._replica_sync_thread = None
+        self._replica_sync_stop = threading.Event()
+
+    @property
+    def connected(self) -> bool:
+        return self._sheet2 is not None
+
+    def connect(self):
+        """Initialize Google Sheets connection using service account credentials from Base64 environment variable."""
+        with self._connect_lock:
+            if self.connected:
+                return
             
-            # Extract just the ID part from URLs if full URLs are provided
-            self.sheet1_id = self.extract_sheet_id(sheet1_id)
-            self.sheet2_id = self.extract_sheet_id(sheet2_id)
+            try:
+                started = time.monotonic()
                 
-            # Open both spreadsheets
-            self.sheet1 = self.client.open_by_key(self.sheet1_id)
-            self.sheet2 = self.client.open_by_key(self.sheet2_id)
-            
-            logger.info("Successfully connected to both Google Sheets")
-            
-        except Exception as e:
-            logger.error(f"Error initializing Google Sheets: {e}")
-            raise
+                if self._backend is not None:
+                    # Injected client (e.g. the in-memory fake): no credentials
+                    creds = None
+                    client = self._backend
+                else:
+                    creds = self.load_credentials()
+                    
+                    # Authorize and open client
+                    client = gspread.authorize(creds)
+                
+                # Get both Sheet IDs from the arguments or environment variables
+                sheet1_id = self._sheet1_key or os.getenv("SHEET1_ID")
+                sheet2_id = self._sheet2_key or os.getenv("SHEET2_ID")
+                
+                if not sheet1_id or not sheet2_id:
+                    raise ValueError("Sheet IDs not found in environment variables")
+                
+                # Extract just the ID part from URLs if full URLs are provided
+                self.sheet1_id = self.extract_sheet_id(sheet1_id)
+                self.sheet2_id = self.extract_sheet_id(sheet2_id)
+                    
+                # Open both spreadsheets
+                self._client = client
+                self._sheet1 = self.api("open_by_key", client.open_by_key, self.sheet1_id)
+                sheet2 = self.api("open_by_key", client.open_by_key, self.sheet2_id)
+                
+                # Durable write-behind queue: writes are acknowledged once stored locally
+                # and flushed in one batchUpdate per spreadsheet every batch window
+                # (new Sheet1 rows excepted, see allocate_rows)
+                if os.getenv("SHEETS_WRITE_BEHIND", "1") == "1":
+                    self.write_queue = WriteBehindQueue(
+                        path=os.getenv("WRITE_QUEUE_PATH", "write_queue.db"),
+                        writer=self.send_queued_writes,
+                        flush_interval_ms=int(os.getenv("WRITE_FLUSH_INTERVAL_MS", "500")),
+                        max_attempts=int(os.getenv("WRITE_MAX_ATTEMPTS", "8")),
+                        on_failure=self.on_queued_writes_failed
+                    )
+                    self.write_queue.start()
+                
+                # Keep cached snapshots past their TTL while the spreadsheet is unchanged
+                if creds is not None and os.getenv("SHEETS_CHANGE_DETECTION", "1") == "1":
+                    self.change_detector = SpreadsheetChangeDetector(
+                        creds,
+                        interval=float(os.getenv("CHANGE_CHECK_INTERVAL", "15"))
+                    )
+                
+                # Worksheets survive restarts and short Google outages in a local replica
+                if os.getenv("SHEETS_REPLICA", "1") == "1":
+                    self.replica = SheetReplica(os.getenv("REPLICA_PATH", "sheets_replica.db"))
+                
+                # Set last: other threads treat a non-None sheet2 as "connected"
+                self._sheet2 = sheet2
+                
+                sync_interval = float(os.getenv("REPLICA_SYNC_INTERVAL", "60"))
+                if self.replica is not None and sync_interval > 0:
+                    self._replica_sync_thread = threading.Thread(
+                        target=self._run_replica_sync,
+                        args=(sync_interval,),
+                        name="sheets-replica-sync",
+                        daemon=True
+                    )
+                    self._replica_sync_thread.start()
+                
+                logger.info(f"Successfully connected to both Google Sheets in {time.monotonic() - started:.2f}s")
+                
+            except Exception as e:
+                logger.error(f"Error initializing Google Sheets: {e}")
+                raise
+
+    @staticmethod
+    def load_credentials() -> Credentials:
+        """Service account credentials from the Base64 CREDENTIALS_BASE64 environment variable."""
+        # Define the scope
+        scope = [
+            "https://spreadsheets.google.com/feeds",
+            "https://www.googleapis.com/auth/drive",
+            "https://www.googleapis.com/auth/spreadsheets"
+        ]
+        
+        # Get and decode Base64 credentials
+        credentials_base64 = os.environ.get("CREDENTIALS_BASE64")
+        if not credentials_base64:
+            raise ValueError("CREDENTIALS_BASE64 environment variable not set")
+        
+        credentials_json = base64.b64decode(credentials_base64).decode('utf-8')
+        creds_dict = json.loads(credentials_json)
+        
+        # Create credentials from the decoded dictionary
+        creds = Credentials.from_service_account_info(creds_dict, scopes=scope)
+        logger.info("Using credentials from Base64 environment variable")
+        return creds
+
+    @property
+    def client(self):
+        self.connect()
+        return self._client
+
+    @property
+    def sheet1(self):
+        self.connect()
+        return self._sheet1
+
+    @property
+    def sheet2(self):
+        self.connect()
+        return self._sheet2
 
     def extract_sheet_id(self, sheet_input: str) -> str:
         """Extract just the sheet ID from a full URL or use as-is if already an ID."""
@@ -92,6 +619,789 @@ class GoogleSheetsHelper:
         
         return f"{uzbek_months.get(month_number, 'Unknown')} {year}"
 
+    def refresh_worksheet_handles(self, spreadsheet):
+        """Reload all worksheet handles of a spreadsheet with a single metadata fetch."""
+        worksheets = self.api("worksheets", spreadsheet.worksheets)  # One fetch_sheet_metadata call
+        
+        with self._worksheet_handles_lock:
+            self.metadata_calls += 1
+            self._worksheet_handles[spreadsheet.id] = {ws.title: ws for ws in worksheets}
+            self._worksheet_handles_refreshed_at[spreadsheet.id] = time.monotonic()
+
+    def get_worksheet(self, spreadsheet, worksheet_name: str):
+        """
+        Get a worksheet handle from the cache.
+        
+        The cache is refreshed when it is older than WORKSHEET_CACHE_TTL or when
+        the title is not in it (e.g. a worksheet created since the last refresh).
+        Raises gspread.exceptions.WorksheetNotFound like spreadsheet.worksheet().
+        """
+        with self._worksheet_handles_lock:
+            refreshed_at = self._worksheet_handles_refreshed_at.get(spreadsheet.id)
+            handles = self._worksheet_handles.get(spreadsheet.id, {})
+            
+            if (refreshed_at is not None
+                    and time.monotonic() - refreshed_at <= self.worksheet_cache_ttl
+                    and worksheet_name in handles):
+                self.metadata_calls_saved += 1
+                return handles[worksheet_name]
+        
+        self.refresh_worksheet_handles(spreadsheet)
+        
+        with self._worksheet_handles_lock:
+            worksheet = self._worksheet_handles[spreadsheet.id].get(worksheet_name)
+        
+        if worksheet is None:
+            raise gspread.exceptions.WorksheetNotFound(worksheet_name)
+        return worksheet
+
+    def remember_worksheet(self, spreadsheet, worksheet):
+        """Add a worksheet created through the helper to the handle cache."""
+        with self._worksheet_handles_lock:
+            self._worksheet_handles.setdefault(spreadsheet.id, {})[worksheet.title] = worksheet
+
+    def get_row_allocator(self, worksheet, id_column: List[str] = None) -> RowAllocator:
+        """Get the allocator of a Sheet1 worksheet, seeding it from column A on first use."""
+        with self._row_allocators_lock:
+            allocator = self._row_allocators.get(worksheet.title)
+            if allocator is None:
+                if id_column is None:
+                    id_column = self.api("col_values", worksheet.col_values, 1)  # Column A
+                allocator = RowAllocator(self.with_pending_ids(worksheet.title, id_column))
+                self._row_allocators[worksheet.title] = allocator
+            return allocator
+
+    def with_pending_ids(self, worksheet_name: str, id_column: List[str]) -> List[str]:
+        """Column A values with the rows still waiting in the write queue filled in (they are taken too)."""
+        id_column = list(id_column)
+        if self.write_queue is not None:
+            for row, col, values in self.write_queue.pending(self.sheet1.id, worksheet_name):
+                if col == 1:
+                    while len(id_column) < row:
+                        id_column.append("")
+                    id_column[row - 1] = str(values[0][0])
+        return id_column
+
+    def allocate_rows(self, worksheet, allocator: RowAllocator, count: int) -> List[Tuple[int, int]]:
+        """
+        Reserve `count` (row_number, order_id) pairs, after checking column A
+        on Google that the rows are still empty. The caller holds allocator.lock.
+        
+        One small read: the ID cells of reused gaps, and column A below the
+        rows the allocator knows about. Rows with a column A write still in
+        the write queue (e.g. left by another worker sharing it) are taken
+        too. If someone else wrote there (by hand, another process or
+        worker), the allocator is re-seeded from column A and the rows are
+        allocated again.
+        
+        This only sees rows that are on Google or in this write queue, so the
+        new rows themselves are written through (write_cells(queue=False)),
+        never queued: a worker with its own queue couldn't see them.
+        """
+        for _ in range(3):
+            known_rows_end = allocator.next_row
+            allocations = [allocator.allocate() for _ in range(count)]
+            
+            queued_rows = self.queued_id_rows(worksheet.title)
+            if not any(row in queued_rows for row, _ in allocations):
+                ranges = [f"A{row}" for row, _ in allocations if row < known_rows_end] + [f"A{known_rows_end}:A"]
+                results = self.api("batch_get", worksheet.batch_get, ranges)
+                if not any(value.strip() for values in results for row in values for value in row):
+                    return allocations
+            
+            logger.warning(f"Rows of {worksheet.title} were written outside this process: re-reading column A")
+            id_column = self.api("col_values", worksheet.col_values, 1)
+            allocator.seed(self.with_pending_ids(worksheet.title, id_column))
+        
+        raise RuntimeError(f"Free rows of {worksheet.title} keep being taken by other writers")
+
+    def queued_id_rows(self, worksheet_name: str) -> set:
+        """Sheet1 rows whose column A has a write waiting in the write queue."""
+        if self.write_queue is None:
+            return set()
+        return {
+            row + offset
+            for row, col, values in self.write_queue.pending(self.sheet1.id, worksheet_name) if col == 1
+            for offset in range(len(values))
+        }
+
+    def check_row_allocator(self, worksheet_name: str, id_column: List[str]):
+        """
+        Re-seed a worksheet's allocator if freshly downloaded column A shows
+        rows it would hand out as taken. Skipped while a save holds it (the
+        save checks its rows itself).
+        """
+        with self._row_allocators_lock:
+            allocator = self._row_allocators.get(worksheet_name)
+        if allocator is None or not allocator.lock.acquire(blocking=False):
+            return
+        try:
+            if allocator.conflicts(id_column):
+                logger.info(f"Column A of {worksheet_name} changed outside this process: re-seeding rows and IDs")
+                allocator.seed(self.with_pending_ids(worksheet_name, id_column))
+        finally:
+            allocator.lock.release()
+
+    def write_cells(self, spreadsheet, worksheet, writes: List[Tuple[int, int, List[List[str]]]],
+                    value_input_option: str = "RAW", queue: bool = True):
+        """
+        Write blocks of cells to a worksheet.
+        
+        Each write is (row, col, values): a 1-based top-left cell and a 2D list
+        of values. With the write-behind queue the writes are stored and sent
+        later (unless queue=False); otherwise they go out now as one batch_update.
+        """
+        if self.write_queue is not None and queue:
+            self.write_queue.enqueue(spreadsheet.id, worksheet.title, writes, value_input_option)
+            return
+        
+        updates = [
+            {'range': self.a1_range(row, col, values), 'values': values}
+            for row, col, values in writes
+        ]
+        self.api("batch_update", worksheet.batch_update, updates, value_input_option=value_input_option)
+
+    @staticmethod
+    def a1_range(row: int, col: int, values: List[List[str]]) -> str:
+        """A1 range covered by a block of values whose top-left cell is (row, col)."""
+        width = max(len(row_values) for row_values in values)
+        return f"{rowcol_to_a1(row, col)}:{rowcol_to_a1(row + len(values) - 1, col + width - 1)}"
+
+    def update_row_columns(self, spreadsheet, worksheet, row_number: int, values: Dict[int, str],
+                           value_input_option: str = "RAW"):
+        """
+        Write several columns of one row (1-based column -> value) in a single request.
+        
+        Adjacent columns share one range, so e.g. O and P go out as O:P. The cached
+        snapshot of the worksheet is updated to match.
+        """
+        self.write_cells(spreadsheet, worksheet, self.row_writes(row_number, values), value_input_option)
+        
+        # Write-through so cached reads see the new values
+        cache = self.sheet1_cache if spreadsheet is self.sheet1 else self.sheet2_cache
+        cache.update_cells(worksheet.title, row_number - 1, {col - 1: value for col, value in values.items()})
+
+    @staticmethod
+    def row_writes(row_number: int, values: Dict[int, str]) -> List[Tuple[int, int, List[List[str]]]]:
+        """(row, col, values) writes for several columns of one row, adjacent columns merged."""
+        writes = []
+        for col in sorted(values):
+            if writes and writes[-1][1] + len(writes[-1][2][0]) == col:
+                writes[-1][2][0].append(values[col])
+            else:
+                writes.append((row_number, col, [[values[col]]]))
+        return writes
+
+    def update_row_fields(self, spreadsheet, worksheet, row_number: int, fields: Dict[str, str],
+                          columns: Dict[str, int], value_input_option: str = "RAW"):
+        """
+        Write named columns of one row in a single request.
+        
+        Args:
+            fields: Column name -> new value.
+            columns: Column name -> 1-based column number.
+        """
+        values = {}
+        for name, value in fields.items():
+            if name not in columns:
+                logger.warning(f"Column '{name}' not found in {worksheet.title}, skipping")
+                continue
+            values[columns[name]] = value
+        
+        if values:
+            self.update_row_columns(spreadsheet, worksheet, row_number, values, value_input_option)
+
+    def get_sheet1_columns(self, snapshot: WorksheetSnapshot) -> Dict[str, int]:
+        """Map order fields to 1-based Sheet1 columns using the worksheet's header row."""
+        headers = snapshot.rows[0] if snapshot.exists and snapshot.rows else SHEET1_HEADERS
+        positions = {header: i + 1 for i, header in enumerate(headers)}
+        return {
+            field: positions[header]
+            for field, header in SHEET1_FIELD_HEADERS.items()
+            if header in positions
+        }
+
+    def send_queued_writes(self, spreadsheet_id: str, value_input_option: str, data: List[Dict]):
+        """Write-queue writer: send a spreadsheet's queued writes as one values.batchUpdate."""
+        spreadsheet = self.sheet1 if spreadsheet_id == self.sheet1.id else self.sheet2
+        body = self.batch_update_body(value_input_option, [
+            (write["worksheet"], write["row"], write["col"], write["values"]) for write in data
+        ])
+        # Interactive lane: users were already told these writes are saved, so
+        # they must not starve behind other users' requests at the quota
+        self.api("values_batch_update", spreadsheet.values_batch_update, body, priority=INTERACTIVE)
+
+    @classmethod
+    def batch_update_body(cls, value_input_option: str, writes: List[Tuple[str, int, int, List[List[str]]]]) -> Dict:
+        """values.batchUpdate body for (worksheet name, row, col, values) writes."""
+        return {
+            "valueInputOption": value_input_option,
+            "data": [
+                {
+                    "range": absolute_range_name(worksheet_name, cls.a1_range(row, col, values)),
+                    "values": values
+                }
+                for worksheet_name, row, col, values in writes
+            ]
+        }
+
+    def write_batch(self, spreadsheet, writes: List[Tuple[str, int, int, List[List[str]]]],
+                    value_input_option: str = "RAW", queue: bool = True):
+        """
+        Write blocks of cells across worksheets of one spreadsheet in one request.
+        
+        Each write is (worksheet name, row, col, values). With the write-behind
+        queue (and queue=True) the writes are stored, and flushed together in
+        one batchUpdate.
+        """
+        if self.write_queue is not None and queue:
+            by_worksheet = {}
+            for worksheet_name, row, col, values in writes:
+                by_worksheet.setdefault(worksheet_name, []).append((row, col, values))
+            for worksheet_name, worksheet_writes in by_worksheet.items():
+                self.write_queue.enqueue(spreadsheet.id, worksheet_name, worksheet_writes, value_input_option)
+            return
+        
+        body = self.batch_update_body(value_input_option, writes)
+        self.api("values_batch_update", spreadsheet.values_batch_update, body)
+
+    def on_queued_writes_failed(self, spreadsheet_id: str, worksheet_name: str):
+        """Forget local state that assumed the given-up writes would land."""
+        if spreadsheet_id == self.sheet1.id:
+            with self._row_allocators_lock:
+                self._row_allocators.pop(worksheet_name, None)
+            self.sheet1_cache.invalidate(worksheet_name)
+        else:
+            self.sheet2_cache.invalidate(worksheet_name)
+
+    def apply_pending_writes(self, spreadsheet, worksheet_name: str, snapshot: WorksheetSnapshot):
+        """Overlay writes that are still in the queue onto freshly downloaded rows."""
+        if self.write_queue is None or not snapshot.exists:
+            return
+        
+        for row, col, values in self.write_queue.pending(spreadsheet.id, worksheet_name):
+            for row_offset, row_values in enumerate(values):
+                if row_values:
+                    snapshot.set_cells(row - 1 + row_offset, {
+                        col - 1 + col_offset: value for col_offset, value in enumerate(row_values)
+                    })
+
+    def api(self, name: str, func, *args, priority: int = None, **kwargs):
+        """
+        Make one Sheets API request through the scheduler.
+        
+        The request runs in the calling thread's priority lane (see
+        RequestScheduler.priority()) unless a priority is given. Its latency
+        and outcome are recorded in the metrics under `name`.
+        """
+        started = time.perf_counter()
+        try:
+            result = self.scheduler.call(name, func, *args, priority=priority, **kwargs)
+        except Exception:
+            metrics.observe("api", name, time.perf_counter() - started, error=True)
+            raise
+        metrics.observe("api", name, time.perf_counter() - started)
+        return result
+
+    def close(self):
+        """Flush and stop the write-behind queue, and stop the replica sync."""
+        self._replica_sync_stop.set()
+        if self._replica_sync_thread is not None:
+            self._replica_sync_thread.join()
+        if self.write_queue is not None:
+            self.write_queue.stop()
+        if self.replica is not None:
+            self.replica.close()
+
+    def sync_replica(self):
+        """
+        Bring the recent worksheets (yesterday, today, tomorrow and their months)
+        up to date in the cache and the replica.
+        
+        Unchanged spreadsheets cost one Drive version check; only changed
+        worksheets are downloaded, and only their changed rows are written.
+        """
+        today = datetime.now()
+        with self.scheduler.priority(BACKGROUND):
+            self.warm_dates([(today + timedelta(days=offset)).strftime("%Y-%m-%d") for offset in (-1, 0, 1)])
+
+    def _run_replica_sync(self, interval: float):
+        while not self._replica_sync_stop.wait(interval):
+            try:
+                self.sync_replica()
+            except Exception as e:
+                logger.warning(f"Replica sync failed: {e}")
+
+    def get_spreadsheet_version(self, spreadsheet) -> Optional[str]:
+        """Current Drive version of a spreadsheet, or None without change detection."""
+        if self.change_detector is None:
+            return None
+        return self.change_detector.version(spreadsheet.id)
+
+    def is_snapshot_current(self, spreadsheet, snapshot: WorksheetSnapshot) -> bool:
+        """Whether the spreadsheet is unchanged since the snapshot was downloaded."""
+        if snapshot.version is None:
+            return False
+        return self.get_spreadsheet_version(spreadsheet) == snapshot.version
+
+    def read_worksheet_rows(self, spreadsheet, worksheet) -> List[List[str]]:
+        """
+        Download the rows of a worksheet, projected to the columns the bot reads.
+        
+        Other columns come back as empty strings, so rows keep their usual shape.
+        """
+        if self.projected_reads:
+            # A Sheet1 plan is rebuilt once if its columns moved
+            for _ in range(2):
+                ranges, parse = self.read_plan(spreadsheet, worksheet.title)
+                rows = parse(self.api("batch_get", worksheet.batch_get, ranges))
+                if rows is not None:
+                    return rows
+        
+        # Headers changing between reads: don't chase them
+        return self.api("get_all_values", worksheet.get_all_values)
+
+    def read_plan(self, spreadsheet, worksheet_name: str):
+        """
+        Ranges to download for a worksheet, and a function turning their
+        values into full-width rows.
+        
+        Sheet2 reads SHEET2_READ_COLUMNS. Sheet1 reads its header row and the
+        columns of SHEET1_READ_HEADERS (where they were last seen, or where
+        SHEET1_HEADERS puts them); parse() returns None if the header row
+        shows they moved, and the next plan uses the new columns.
+        """
+        if spreadsheet is self.sheet2:
+            sheet2_columns = tuple(SHEET2_READ_COLUMNS.values())
+            return self.column_ranges(sheet2_columns), lambda results: self.merge_columns(sheet2_columns, results)
+        
+        columns = self._sheet1_read_columns.get(worksheet_name)
+        if columns is None:
+            columns = self.sheet1_read_columns(SHEET1_HEADERS)
+        
+        def parse(results):
+            header = list(results[0][0]) if results and results[0] else []
+            if self.sheet1_read_columns(header) != columns:
+                self._sheet1_read_columns[worksheet_name] = self.sheet1_read_columns(header)
+                return None
+            if not columns:
+                return [header] if header else []
+            return self.merge_columns(columns, results[1:])
+        
+        return ["1:1"] + self.column_ranges(columns), parse
+
+    @staticmethod
+    def sheet1_read_columns(header: List[str]) -> Tuple[int, ...]:
+        """1-based columns of SHEET1_READ_HEADERS in a header row (last one wins, like a header dict)."""
+        positions = {name: i + 1 for i, name in enumerate(header)}
+        return tuple(sorted({positions[name] for name in SHEET1_READ_HEADERS if name in positions}))
+
+    @staticmethod
+    def column_spans(columns) -> List[Tuple[int, int]]:
+        """Merge 1-based columns into (first, last) spans of adjacent columns."""
+        spans = []
+        for col in sorted(set(columns)):
+            if spans and spans[-1][1] + 1 == col:
+                spans[-1][1] = col
+            else:
+                spans.append([col, col])
+        return [tuple(span) for span in spans]
+
+    @classmethod
+    def column_ranges(cls, columns) -> List[str]:
+        """Whole-column A1 ranges covering the columns, e.g. [2, 3, 4, 15] -> ["B:D", "O:O"]."""
+        return [
+            f"{column_letter(first)}:{column_letter(last)}"
+            for first, last in cls.column_spans(columns)
+        ]
+
+    @classmethod
+    def merge_columns(cls, columns, results: List[List[List[str]]]) -> List[List[str]]:
+        """Rebuild full-width rows from the values of column_ranges(columns), one result per range."""
+        spans = cls.column_spans(columns)
+        width = spans[-1][1] if spans else 0
+        height = max((len(values) for values in results), default=0)
+        rows = [[""] * width for _ in range(height)]
+        
+        for (first, _), values in zip(spans, results):
+            for row_index, row_values in enumerate(values):
+                rows[row_index][first - 1:first - 1 + len(row_values)] = list(row_values)
+        return rows
+
+    def download_snapshot(self, spreadsheet, worksheet_name: str) -> WorksheetSnapshot:
+        """
+        Load a worksheet from the local replica if it is current, else from Google.
+        
+        A fresh download is stored in the replica. If Google can't be reached,
+        the replica's copy is used even when it is out of date.
+        """
+        # Read the version first, so it can only be older than the data
+        version = self.get_spreadsheet_version(spreadsheet)
+        
+        stored = self.load_replica(spreadsheet, worksheet_name)
+        if stored is not None and version is not None and stored[1] == version:
+            return WorksheetSnapshot(stored[0], version)
+        
+        try:
+            try:
+                worksheet = self.get_worksheet(spreadsheet, worksheet_name)
+                rows = self.read_worksheet_rows(spreadsheet, worksheet)
+            except gspread.exceptions.WorksheetNotFound:
+                rows = None
+        except Exception as e:
+            if stored is None:
+                raise
+            synced_at = datetime.fromtimestamp(stored[2]).strftime("%Y-%m-%d %H:%M:%S")
+            logger.warning(f"Serving {worksheet_name} from the replica synced at {synced_at}: {e}")
+            return WorksheetSnapshot(stored[0], stored[1])
+        
+        self.store_replica(spreadsheet, worksheet_name, rows, version)
+        return WorksheetSnapshot(rows, version)
+
+    @staticmethod
+    def columns_fingerprint(columns: List[List[str]], length: int) -> str:
+        """Checksum of the first `length` values of some columns (missing values count as empty)."""
+        digest = hashlib.blake2b(digest_size=16)
+        for values in columns:
+            values = list(values[:length]) + [""] * (length - len(values))
+            digest.update("\x1f".join(values).encode())
+            digest.update(b"\x1e")
+        return digest.hexdigest()
+
+    @staticmethod
+    def sheet1_probe_columns(header: List[str]) -> Tuple[int, ...]:
+        """1-based ID, Sana and KOD columns of a header row: what row lookups and the allocator rely on."""
+        positions = {name: i + 1 for i, name in enumerate(header)}
+        return tuple(sorted({positions[name] for name in ("ID", "Sana", "KOD") if name in positions})) or (1,)
+
+    def mark_sheet1_download(self, worksheet_name: str, snapshot: WorksheetSnapshot, full_read_at: float = None):
+        """
+        Record a Sheet1 snapshot's row count and the fingerprint of its ID,
+        Sana and KOD columns, as downloaded, for refresh_sheet1_tail(); and
+        check the worksheet's row allocator against its column A.
+        """
+        if not snapshot.exists or len(snapshot.rows) < 2:
+            return
+        self.check_row_allocator(worksheet_name, snapshot.rows.column(0))
+        probe_columns = self.sheet1_probe_columns(list(snapshot.rows[0]))
+        row_count = len(snapshot.rows)
+        snapshot.tail_base = (
+            row_count,
+            probe_columns,
+            self.columns_fingerprint([snapshot.rows.column(col - 1) for col in probe_columns], row_count),
+            full_read_at if full_read_at is not None else time.monotonic(),
+        )
+
+    def refresh_sheet1_tail(self, worksheet_name: str, base: Optional[WorksheetSnapshot]) -> Optional[WorksheetSnapshot]:
+        """
+        Bring a Sheet1 monthly worksheet up to date by reading only its new rows.
+        
+        Monthly worksheets only grow, so one batch_get reads the header row, the
+        ID, Sana and KOD columns of the rows already known (a checksum probe:
+        the key columns lookups and writes rely on) and the rows after them.
+        Returns None when a full reload is needed instead: no usable earlier
+        download, the Drive version changed since it (an edit anywhere, e.g.
+        to an earlier row's Manzil or amount), the header or a probed column
+        changed, or the last full read is older than
+        SHEET1_FULL_RELOAD_INTERVAL (without change detection, edits to other
+        cells of earlier rows are only picked up then).
+        
+        The new snapshot is stored in the replica too.
+        """
+        if not self.sheet1_tail_reads or base is None or base.tail_base is None:
+            return None
+        row_count, probe_columns, fingerprint, full_read_at = base.tail_base
+        if time.monotonic() - full_read_at > self.sheet1_full_reload_interval:
+            return None
+        
+        columns = self.sheet1_read_columns(list(base.rows[0]))
+        if not columns:
+            return None
+        if self.projected_reads:
+            tail_ranges = [
+                f"{column_letter(first)}{row_count + 1}:{column_letter(last)}"
+                for first, last in self.column_spans(columns)
+            ]
+        else:
+            tail_ranges = [f"A{row_count + 1}:{column_letter(max(base.rows.width, len(SHEET1_HEADERS)))}"]
+        probe_ranges = [
+            f"{column_letter(first)}1:{column_letter(last)}{row_count}"
+            for first, last in self.column_spans(probe_columns)
+        ]
+        
+        # Read the version first, so it can only be older than the data
+        version = self.get_spreadsheet_version(self.sheet1)
+        if version is not None and base.version is not None and version != base.version:
+            logger.info(f"{self.sheet1.id} changed since {worksheet_name} was read: full reload")
+            return None
+        try:
+            worksheet = self.get_worksheet(self.sheet1, worksheet_name)
+        except gspread.exceptions.WorksheetNotFound:
+            return None
+        results = self.api("batch_get", worksheet.batch_get, ["1:1"] + probe_ranges + tail_ranges)
+        
+        header = list(results[0][0]) if results[0] else []
+        if self.sheet1_read_columns(header) != columns or self.sheet1_probe_columns(header) != probe_columns:
+            logger.info(f"Header of {worksheet_name} changed: full reload")
+            return None
+        probed_rows = self.merge_columns(probe_columns, results[1:1 + len(probe_ranges)])
+        probed_columns = [[row[col - 1] for row in probed_rows] for col in probe_columns]
+        if self.columns_fingerprint(probed_columns, row_count) != fingerprint:
+            logger.info(f"Rows 1-{row_count} of {worksheet_name} changed: full reload")
+            return None
+        
+        tail_results = results[1 + len(probe_ranges):]
+        if self.projected_reads:
+            tail = self.merge_columns(columns, tail_results)
+        else:
+            tail = [list(row) for row in tail_results[0]]
+        
+        snapshot = base.extended(row_count, tail, version)
+        self.mark_sheet1_download(worksheet_name, snapshot, full_read_at)
+        if self.replica is not None:
+            self.store_replica(self.sheet1, worksheet_name, [list(row) for row in snapshot.rows], version)
+        logger.debug("Refreshed %s: %d new rows after row %d", worksheet_name, len(tail), row_count)
+        return snapshot
+
+    def load_replica(self, spreadsheet, worksheet_name: str):
+        """The replica's (rows, version, synced_at) of a worksheet, or None."""
+        if self.replica is None:
+            return None
+        try:
+            return self.replica.load(spreadsheet.id, worksheet_name)
+        except Exception as e:
+            logger.warning(f"Could not read {worksheet_name} from the replica: {e}")
+            return None
+
+    def store_replica(self, spreadsheet, worksheet_name: str, rows: Optional[List[List[str]]], version: Optional[str]):
+        if self.replica is None:
+            return
+        try:
+            self.replica.store(spreadsheet.id, worksheet_name, rows, version)
+        except Exception as e:
+            logger.warning(f"Could not store {worksheet_name} in the replica: {e}")
+
+    def existing_worksheets(self, spreadsheet, worksheet_names: List[str]) -> set:
+        """
+        Which of the worksheets exist, from the handle cache; at most one
+        metadata fetch, instead of a WorksheetNotFound round-trip per name.
+        """
+        with self._worksheet_handles_lock:
+            refreshed_at = self._worksheet_handles_refreshed_at.get(spreadsheet.id)
+            handles = self._worksheet_handles.get(spreadsheet.id, {})
+            if (refreshed_at is not None
+                    and time.monotonic() - refreshed_at <= self.worksheet_cache_ttl
+                    and all(name in handles for name in worksheet_names)):
+                self.metadata_calls_saved += 1
+                return set(worksheet_names)
+        
+        self.refresh_worksheet_handles(spreadsheet)
+        
+        with self._worksheet_handles_lock:
+            handles = self._worksheet_handles[spreadsheet.id]
+            return {name for name in worksheet_names if name in handles}
+
+    def load_worksheets(self, spreadsheet, cache: SnapshotCache, worksheet_names: List[str]):
+        """
+        Load several worksheets of one spreadsheet into the cache with a single
+        values.batchGet. Worksheets already cached and current are skipped.
+        """
+        names = [
+            name for name in dict.fromkeys(worksheet_names)
+            if cache.get(name, is_current=lambda cached: self.is_snapshot_current(spreadsheet, cached)) is None
+        ]
+        if not names:
+            return
+        
+        # Read the version first, so it can only be older than the data
+        version = self.get_spreadsheet_version(spreadsheet)
+        existing = self.existing_worksheets(spreadsheet, names)
+        
+        snapshots = {}
+        if cache is self.sheet1_cache:
+            for name in names:
+                if name in existing:
+                    snapshot = self.refresh_sheet1_tail(name, cache.peek(name))
+                    if snapshot is not None:
+                        snapshots[name] = snapshot
+        
+        for name in names:
+            if name in snapshots:
+                continue
+            if name not in existing:
+                snapshots[name] = WorksheetSnapshot(None, version)
+                continue
+            stored = self.load_replica(spreadsheet, name)
+            if stored is not None and version is not None and stored[1] == version:
+                snapshots[name] = WorksheetSnapshot(stored[0], version)
+                if cache is self.sheet1_cache:
+                    self.mark_sheet1_download(name, snapshots[name])
+        
+        to_download = [name for name in names if name not in snapshots]
+        if to_download:
+            plans = {}
+            ranges = []
+            for name in to_download:
+                if self.projected_reads:
+                    worksheet_ranges, parse = self.read_plan(spreadsheet, name)
+                else:
+                    worksheet_ranges, parse = [None], lambda results: pad_rows(results[0])
+                plans[name] = (len(ranges), len(worksheet_ranges), parse)
+                ranges.extend(absolute_range_name(name, cell_range) for cell_range in worksheet_ranges)
+            
+            response = self.api("values_batch_get", spreadsheet.values_batch_get, ranges)
+            value_ranges = response.get("valueRanges", [])
+            
+            for name, (start, count, parse) in plans.items():
+                results = [value_range.get("values", []) for value_range in value_ranges[start:start + count]]
+                rows = parse(results)
+                if rows is None:
+                    # Sheet1 columns moved: read this one on its own with the new plan
+                    snapshots[name] = self.download_snapshot(spreadsheet, name)
+                    self.mark_sheet1_download(name, snapshots[name])
+                    continue
+                self.store_replica(spreadsheet, name, rows, version)
+                snapshots[name] = WorksheetSnapshot(rows, version)
+                if cache is self.sheet1_cache:
+                    self.mark_sheet1_download(name, snapshots[name])
+        
+        for name, snapshot in snapshots.items():
+            self.apply_pending_writes(spreadsheet, name, snapshot)
+            cache.put(name, snapshot)
+
+    def warm_dates(self, dates: List[str]):
+        """
+        Load the Sheet2 worksheets of several dates (YYYY-MM-DD) and their Sheet1
+        months: one values.batchGet per spreadsheet, then build the indexes.
+        """
+        self.load_worksheets(self.sheet2, self.sheet2_cache, [self.convert_date_format(d) for d in dates])
+        self.load_worksheets(self.sheet1, self.sheet1_cache, [self.get_uzbek_month_worksheet(d) for d in dates])
+        
+        # Everything is cached now; this only builds the indexes
+        for date_str in dates:
+            self.warm_sheet2(date_str)
+            self.warm_sheet1(date_str)
+
+    def get_sheet2_snapshot(self, sheet2_date: str, fresh: bool = False) -> WorksheetSnapshot:
+        """
+        Get the rows of a Sheet2 date worksheet (DD.MM.YYYY) through the cache.
+        
+        Args:
+            sheet2_date: Worksheet name in DD.MM.YYYY format.
+            fresh: If True, always re-download and refresh the cached copy.
+            
+        Returns:
+            WorksheetSnapshot; its rows are None if the worksheet does not exist.
+        """
+        if not fresh:
+            snapshot = self.sheet2_cache.get(
+                sheet2_date,
+                is_current=lambda cached: self.is_snapshot_current(self.sheet2, cached)
+            )
+            if snapshot is not None:
+                return snapshot
+        
+        snapshot = self.download_snapshot(self.sheet2, sheet2_date)
+        self.apply_pending_writes(self.sheet2, sheet2_date, snapshot)
+        self.sheet2_cache.put(sheet2_date, snapshot)
+        return snapshot
+
+    def get_sheet1_snapshot(self, worksheet_name: str, fresh: bool = False) -> WorksheetSnapshot:
+        """
+        Get the rows of a Sheet1 monthly worksheet through the cache.
+        
+        Args:
+            worksheet_name: Monthly worksheet name, e.g. "Oktabr 2026".
+            fresh: If True, always refresh the cached copy from Google (only
+                   the new rows, see refresh_sheet1_tail()).
+            
+        Returns:
+            WorksheetSnapshot; its rows are None if the worksheet does not exist.
+        """
+        if not fresh:
+            snapshot = self.sheet1_cache.get(
+                worksheet_name,
+                is_current=lambda cached: self.is_snapshot_current(self.sheet1, cached)
+            )
+            if snapshot is not None:
+                return snapshot
+        
+        # Only the new rows if the last download is still good, else all of them
+        try:
+            snapshot = self.refresh_sheet1_tail(worksheet_name, self.sheet1_cache.peek(worksheet_name))
+        except Exception as e:
+            # A full download falls back to the replica if Google is down
+            logger.warning(f"Tail read of {worksheet_name} failed, reading it in full: {e}")
+            snapshot = None
+        if snapshot is None:
+            snapshot = self.download_snapshot(self.sheet1, worksheet_name)
+            self.mark_sheet1_download(worksheet_name, snapshot)
+        self.apply_pending_writes(self.sheet1, worksheet_name, snapshot)
+        self.sheet1_cache.put(worksheet_name, snapshot)
+        return snapshot
+
+    def iter_worksheet_rows(self, spreadsheet, worksheet_name: str, chunk_size: int = 5000,
+                            last_column: str = "M"):
+        """
+        Yield the rows of a worksheet in chunks of `chunk_size` rows, one request per chunk,
+        so a large worksheet is never held in memory at once. Yields nothing if it doesn't exist.
+        
+        Chunks run to the worksheet's row count: the API leaves trailing empty
+        rows out of a range, so a short chunk doesn't mean the data ended.
+        """
+        # Fresh handles, so row_count includes rows added since they were cached
+        self.refresh_worksheet_handles(spreadsheet)
+        try:
+            worksheet = self.get_worksheet(spreadsheet, worksheet_name)
+        except gspread.exceptions.WorksheetNotFound:
+            return
+        
+        for start in range(1, worksheet.row_count + 1, chunk_size):
+            cell_range = f"A{start}:{last_column}{start + chunk_size - 1}"
+            rows = [list(row) for row in self.api("get", worksheet.get, cell_range)]
+            if rows:
+                yield rows
+
+    def find_sheet1_row(self, snapshot: WorksheetSnapshot, kod: str, compare_date: str) -> Optional[int]:
+        """
+        Find the 0-based row index of the order with the given KOD and Sana
+        (DD.MM.YYYY) in a Sheet1 snapshot, using the (KOD, Sana) index.
+        """
+        key_columns = self.get_sheet1_key_columns(snapshot)
+        if key_columns is None:
+            return None
+        
+        row_index = snapshot.find_row(key_columns, (kod, compare_date), strip=True)
+        if row_index is None or row_index == 0:  # Never match the header row
+            return None
+        return row_index
+
+    def get_sheet1_key_columns(self, snapshot: WorksheetSnapshot) -> Optional[Tuple[int, int]]:
+        """0-based (KOD, Sana) columns of a Sheet1 snapshot, or None if it has no orders."""
+        if not snapshot.exists or len(snapshot.rows) < 2:
+            return None
+        
+        # Locate KOD and Sana by header name (last one wins, like a header dict)
+        columns = {header: i for i, header in enumerate(snapshot.rows[0])}
+        if "KOD" not in columns or "Sana" not in columns:
+            return None
+        
+        return columns["KOD"], columns["Sana"]
+
+    def warm_sheet2(self, date_str: str):
+        """Load a Sheet2 date worksheet into the cache and build its KOD indexes."""
+        snapshot = self.get_sheet2_snapshot(self.convert_date_format(date_str))
+        if snapshot.exists:
+            snapshot.index((3,))  # Column D, used for MANZIL and order info
+            snapshot.index((4,))  # Column E, used for transport updates
+
+    def warm_sheet1(self, date_str: str):
+        """Load a Sheet1 monthly worksheet into the cache and build its (KOD, Sana) index."""
+        snapshot = self.get_sheet1_snapshot(self.get_uzbek_month_worksheet(date_str))
+        key_columns = self.get_sheet1_key_columns(snapshot)
+        if key_columns is not None:
+            snapshot.index(key_columns, strip=True)
+
     def get_available_kods(self, date_str: str = None, only_empty: bool = True) -> List[str]:
         """
         Get KOD values from Sheet2 for a specific date.
@@ -111,24 +1421,24 @@ class GoogleSheetsHelper:
             # Convert date format for Sheet 2 worksheet name (DD.MM.YYYY)
             sheet2_date = self.convert_date_format(date_str)
             
-            # Try to open the worksheet for the given date
-            try:
-                worksheet = self.sheet2.worksheet(sheet2_date)
-            except gspread.exceptions.WorksheetNotFound:
+            # Get all values of the worksheet for the given date
+            snapshot = self.get_sheet2_snapshot(sheet2_date)
+            if not snapshot.exists:
                 logger.warning(f"No worksheet found for date: {sheet2_date}")
                 return []
             
-            # Get all values from the worksheet
-            data = worksheet.get_all_values()
+            data = snapshot.rows
             
-            # Extract KOD values from column D (4th column, index 3)
+            # Extract KOD values from column E, reading the three columns straight from the store
             kods = []
-            for row in data[1:]:  # Skip header row (assuming row 1 is header)
-                if len(row) > 15:  # Check if row has at least 15 columns
-                    kod = row[4] if len(row) > 4 else ""  # KOD column
-                    transport = row[14] if len(row) > 14 else ""  # Transport column
-                    phone = row[15] if len(row) > 15 else ""  # Phone column
-                    
+            if data.width > 15:  # Check if rows have at least 16 columns
+                columns = zip(
+                    data.column(4),   # KOD column
+                    data.column(14),  # Transport column
+                    data.column(15),  # Phone column
+                )
+                next(columns, None)  # Skip header row (assuming row 1 is header)
+                for kod, transport, phone in columns:
                     # Skip empty KODs
                     if not kod.strip():
                         continue
@@ -143,7 +1453,9 @@ class GoogleSheetsHelper:
                         if transport.strip() and phone.strip():
                             kods.append(kod)
             
-            logger.info(f"Found {len(kods)} KODs for date {sheet2_date} (only_empty={only_empty}): {kods}")
+            # Hot path: lazy %-formatting, and the full list only at DEBUG
+            logger.info("Found %d KODs for date %s (only_empty=%s)", len(kods), sheet2_date, only_empty)
+            logger.debug("KODs for date %s: %s", sheet2_date, kods)
             return kods
             
         except Exception as e:
@@ -166,33 +1478,30 @@ class GoogleSheetsHelper:
                 date_str = datetime.now().strftime("%Y-%m-%d")
             
             sheet2_date = self.convert_date_format(date_str)
-            logger.info(f"Looking for KOD '{kod}' in Sheet2 date: {sheet2_date}")
+            logger.debug("Looking for KOD '%s' in Sheet2 date: %s", kod, sheet2_date)
             
-            try:
-                worksheet = self.sheet2.worksheet(sheet2_date)
-            except gspread.exceptions.WorksheetNotFound:
+            snapshot = self.get_sheet2_snapshot(sheet2_date)
+            if not snapshot.exists:
                 logger.warning(f"No worksheet found for date: {sheet2_date}")
                 return None
             
             # Find the KOD in column D
-            try:
-                cell = worksheet.find(kod, in_column=4)  # Column D = KOD
-                row_number = cell.row
-                logger.info(f"Found KOD '{kod}' at row {row_number}")
-                
-                # Get MANZIL from column C
-                manzil = worksheet.cell(row_number, 3).value  # Column C = MANZIL
-                
-                if manzil and manzil.strip():
-                    logger.info(f"Found MANZIL: {manzil.strip()}")
-                    return manzil.strip()
-                else:
-                    logger.warning(f"MANZIL is empty for KOD '{kod}'")
-                    return None
-                    
-            except gspread.exceptions.CellNotFound:
+            row_index = snapshot.find_row((3,), kod)  # Column D = KOD
+            if row_index is None:
                 logger.warning(f"KOD '{kod}' not found in Sheet2 worksheet '{sheet2_date}'")
                 return None
+            
+            logger.debug("Found KOD '%s' at row %d", kod, row_index + 1)
+            
+            # Get MANZIL from column C
+            manzil = snapshot.rows[row_index][2]  # Column C = MANZIL
+            
+            if manzil and manzil.strip():
+                logger.debug("Found MANZIL for KOD '%s'", kod)
+                return manzil.strip()
+            else:
+                logger.warning(f"MANZIL is empty for KOD '{kod}'")
+                return None
                 
         except Exception as e:
             logger.error(f"Error getting MANZIL from Sheet2 for KOD '{kod}': {str(e)}")
@@ -206,25 +1515,23 @@ class GoogleSheetsHelper:
             
             sheet2_date = self.convert_date_format(date_str)
             
-            try:
-                worksheet = self.sheet2.worksheet(sheet2_date)
-            except gspread.exceptions.WorksheetNotFound:
+            snapshot = self.get_sheet2_snapshot(sheet2_date)
+            if not snapshot.exists:
                 logger.warning(f"No worksheet found for date: {sheet2_date}")
                 return None
             
-            data = worksheet.get_all_values()
+            row_index = snapshot.find_row((3,), kod)  # KOD in column D
+            if row_index is None:
+                return None
             
-            for row in data:
-                if len(row) > 3 and row[3] == kod:  # KOD in column D
-                    transport = row[13] if len(row) > 13 else ""  # Column N
-                    phone = row[14] if len(row) > 14 else ""     # Column O
-                    
-                    return {
-                        "Transport_raqami": transport.strip(),
-                        "Haydovchi_telefon": phone.strip()
-                    }
+            row = snapshot.rows[row_index]
+            transport = row[13] if len(row) > 13 else ""  # Column N
+            phone = row[14] if len(row) > 14 else ""     # Column O
             
-            return None
+            return {
+                "Transport_raqami": transport.strip(),
+                "Haydovchi_telefon": phone.strip()
+            }
                 
         except Exception as e:
             logger.error(f"Error getting Sheet2 order info: {e}")
@@ -241,131 +1548,111 @@ class GoogleSheetsHelper:
             
             worksheet_name = self.get_uzbek_month_worksheet(date_str)
             
-            # Try to get the worksheet
-            try:
-                worksheet = self.sheet1.worksheet(worksheet_name)
-            except gspread.exceptions.WorksheetNotFound:
+            # Get all values as raw data (avoiding get_all_records)
+            snapshot = self.get_sheet1_snapshot(worksheet_name)
+            if not snapshot.exists:
                 logger.warning(f"Worksheet not found: {worksheet_name}")
                 return None
             
             # Convert date format for Sheet1 (DD.MM.YYYY)
             compare_date = datetime.strptime(date_str, "%Y-%m-%d").strftime("%d.%m.%Y")
             
-            # Get all values as raw data (avoiding get_all_records)
-            all_data = worksheet.get_all_values()
-            
-            if len(all_data) < 2:  # No data beyond headers
+            # Find record with matching KOD and date through the (KOD, Sana) index
+            row_index = self.find_sheet1_row(snapshot, kod, compare_date)
+            if row_index is None:
+                logger.warning(f"No order found for KOD: {kod}, Date: {compare_date}")
                 return None
             
-            # Get headers from first row
-            headers = all_data[0]
+            # Create a dictionary from the matching row only
+            headers = snapshot.rows[0]
+            row = snapshot.rows[row_index]
+            record = {}
+            for i, header in enumerate(headers):
+                if header and i < len(row):  # Columns that weren't downloaded have no header
+                    record[header] = row[i]
             
-            # Find record with matching KOD and date
-            for row in all_data[1:]:  # Skip header row
-                if len(row) < len(headers):
-                    continue  # Skip incomplete rows
-                    
-                # Create a dictionary from this row
-                record = {}
-                for i, header in enumerate(headers):
-                    if i < len(row):
-                        record[header] = row[i]
-                
-                record_kod = record.get("KOD", "").strip()
-                record_date = record.get("Sana", "")
-                
-                # Convert record_date to string if it's a datetime object
-                if hasattr(record_date, 'strftime'):
-                    record_date = record_date.strftime("%d.%m.%Y")
-                elif isinstance(record_date, str):
-                    record_date = record_date.strip()
-                
-                if (record_kod == kod and record_date == compare_date):
-                    logger.info(f"Found existing order: {record}")
-                    return record
-            
-            logger.warning(f"No order found for KOD: {kod}, Date: {compare_date}")
-            return None
+            logger.info("Found existing order for KOD '%s' at row %d", kod, row_index + 1)
+            logger.debug("Existing order: %s", record)
+            return record
                 
         except Exception as e:
             logger.error(f"Error checking existing order: {e}")
             return None
 
+    def get_or_create_sheet1_worksheet(self, worksheet_name: str):
+        """Get a Sheet1 monthly worksheet, creating it with the header row if it doesn't exist."""
+        try:
+            return self.get_worksheet(self.sheet1, worksheet_name)
+        except gspread.exceptions.WorksheetNotFound:
+            worksheet = self.api("add_worksheet", self.sheet1.add_worksheet, title=worksheet_name, rows=1000, cols=20)
+            self.remember_worksheet(self.sheet1, worksheet)
+            logger.info(f"Created new worksheet: {worksheet_name}")
+            
+            # Add headers
+            headers = SHEET1_HEADERS
+            self.api("append_row", worksheet.append_row, headers)
+            
+            # Seed the allocator from the headers we just wrote
+            self.get_row_allocator(worksheet, id_column=[headers[0]])
+            
+            # Replace a cached "missing" snapshot, so write-through sees the new orders
+            self.sheet1_cache.put(worksheet_name, WorksheetSnapshot([list(headers)]))
+            return worksheet
+
+    @staticmethod
+    def build_sheet1_row(order_data: Dict, order_id: int) -> List[str]:
+        """Columns A..I of a new Sheet1 order row."""
+        # Convert date format
+        sana_date = datetime.strptime(order_data.get("Sana"), "%Y-%m-%d").strftime("%d.%m.%Y")
+        
+        # ✅ USE COLUMN LETTERS WITH VILOYAT (Column E): A..I in one range
+        return [
+            str(order_id),                               # A - ID
+            sana_date,                                   # B - Sana
+            order_data.get("Manzil", ""),                # C - Manzil
+            order_data.get("KOD", ""),                   # D - KOD
+            order_data.get("Viloyat", ""),               # E - Viloyat (NEW)
+            order_data.get("Transport_raqami", ""),      # F - Transport
+            order_data.get("Haydovchi_telefon", ""),     # G - Telefon
+            order_data.get("Karta_raqami", ""),          # H - Karta
+            order_data.get("To'lov_summasi", ""),        # I - Summa
+            # Columns J and beyond are left empty intentionally
+        ]
+
     def add_order_to_sheet1(self, order_data: Dict) -> bool:
         """
         Add a new order to Sheet1 using exact column letters.
-        Finds the first truly empty row instead of just appending.
+        Fills the first truly empty row instead of just appending.
+        
+        The row and ID come from the worksheet's RowAllocator, so a save is a
+        small check of column A and a single write, and parallel saves never
+        get the same row or ID.
         """
         try:
             # Get the date and worksheet name
             date_str = order_data.get("Sana")
             worksheet_name = self.get_uzbek_month_worksheet(date_str)
-            date_obj = datetime.strptime(date_str, "%Y-%m-%d")
+            worksheet = self.get_or_create_sheet1_worksheet(worksheet_name)
+            allocator = self.get_row_allocator(worksheet)
             
-            # Try to get the worksheet, create if it doesn't exist
-            try:
-                worksheet = self.sheet1.worksheet(worksheet_name)
-            except gspread.exceptions.WorksheetNotFound:
-                worksheet = self.sheet1.add_worksheet(title=worksheet_name, rows=1000, cols=20)
-                logger.info(f"Created new worksheet: {worksheet_name}")
+            # Hold the worksheet lock until the row is written, so the next save
+            # on this worksheet sees it
+            with allocator.lock:
+                [(next_row, next_id)] = self.allocate_rows(worksheet, allocator, 1)
+                row_values = self.build_sheet1_row(order_data, next_id)
                 
-                # Add headers
-                headers = ["ID", "Sana", "Manzil", "KOD", "Viloyat", "Transport Raqami", 
-                          "Haydovchi telefon raqami", "Karta raqami", "To'lov summasi",
-                          "Salarka hajmi (litr da)", "To'lov holati", "To'lov qilingan vaqt", "Izoh"]
-                worksheet.append_row(headers)
-            
-            # Convert date format
-            sana_date = date_obj.strftime("%d.%m.%Y")
-            
-            # Find the first truly empty row (where column A is empty)
-            all_data = worksheet.get_all_values()
-            next_row = 2  # Start from row 2 (after headers)
-            
-            # Find the first empty row by checking if column A is empty
-            for i, row in enumerate(all_data[1:], start=2):  # Skip header, start from row 2
-                if len(row) == 0 or not row[0].strip():  # Check if first cell (ID) is empty
-                    next_row = i
-                    break
-            else:
-                # If no empty rows found, use the next row after existing data
-                next_row = len(all_data) + 1
+                # Written now even with the write-behind queue: other workers
+                # allocate rows against column A on Google
+                try:
+                    self.write_cells(self.sheet1, worksheet, [(next_row, 1, [row_values])], queue=False)
+                except Exception:
+                    # We no longer know what the sheet holds; re-seed on the next save
+                    with self._row_allocators_lock:
+                        self._row_allocators.pop(worksheet.title, None)
+                    raise
             
-            # Get the next available ID by checking existing IDs in column A
-            try:
-                id_column = worksheet.col_values(1)  # Column A
-                if len(id_column) > 1:  # Has data beyond header
-                    # Get all numeric IDs and find the max
-                    numeric_ids = []
-                    for cell_value in id_column[1:]:  # Skip header
-                        if cell_value.isdigit():
-                            numeric_ids.append(int(cell_value))
-                    
-                    if numeric_ids:
-                        next_id = max(numeric_ids) + 1
-                    else:
-                        next_id = 1
-                else:
-                    next_id = 1
-            except:
-                next_id = 1
-            
-            # ✅ USE COLUMN LETTERS WITH VILOYAT (Column E)
-            updates = [
-                {'range': f'A{next_row}', 'values': [[str(next_id)]]},           # A - ID
-                {'range': f'B{next_row}', 'values': [[sana_date]]},              # B - Sana
-                {'range': f'C{next_row}', 'values': [[order_data.get("Manzil", "")]]},  # C - Manzil
-                {'range': f'D{next_row}', 'values': [[order_data.get("KOD", "")]]},     # D - KOD
-                {'range': f'E{next_row}', 'values': [[order_data.get("Viloyat", "")]]}, # E - Viloyat (NEW)
-                {'range': f'F{next_row}', 'values': [[order_data.get("Transport_raqami", "")]]},  # F - Transport
-                {'range': f'G{next_row}', 'values': [[order_data.get("Haydovchi_telefon", "")]]}, # G - Telefon
-                {'range': f'H{next_row}', 'values': [[order_data.get("Karta_raqami", "")]]},      # H - Karta
-                {'range': f'I{next_row}', 'values': [[order_data.get("To'lov_summasi", "")]]},    # I - Summa
-                # Columns J and beyond are left empty intentionally
-            ]
-            
-            # Execute batch update
-            worksheet.batch_update(updates)
+            # Write-through so cached lookups see the new order
+            self.sheet1_cache.update_cells(worksheet_name, next_row - 1, dict(enumerate(row_values)))
             
             logger.info(f"✅ Successfully added order to {worksheet_name} at row {next_row}")
             return True
@@ -376,14 +1663,15 @@ class GoogleSheetsHelper:
 
     def update_order_in_sheet1(self, kod: str, order_data: Dict) -> bool:
         """
-        Update an existing order in Sheet1 using column letters.
+        Update an existing order in Sheet1.
+        Columns are located by header name and written in a single request.
         """
         try:
             date_str = order_data.get("Sana", datetime.now().strftime("%Y-%m-%d"))
             worksheet_name = self.get_uzbek_month_worksheet(date_str)
             
             try:
-                worksheet = self.sheet1.worksheet(worksheet_name)
+                worksheet = self.get_worksheet(self.sheet1, worksheet_name)
             except gspread.exceptions.WorksheetNotFound:
                 logger.warning(f"Worksheet not found: {worksheet_name}")
                 return False
@@ -391,35 +1679,24 @@ class GoogleSheetsHelper:
             # Convert date format for comparison
             compare_date = datetime.strptime(date_str, "%Y-%m-%d").strftime("%d.%m.%Y")
             
-            # Find the row with matching KOD and date
-            try:
-                # Find KOD in column D
-                kod_cells = worksheet.findall(kod, in_column=4)  # Column D = KOD
-                
-                for cell in kod_cells:
-                    row_number = cell.row
-                    # Check if date in column B matches
-                    row_date = worksheet.cell(row_number, 2).value  # Column B = Sana
-                    if row_date == compare_date:
-                        # ✅ UPDATE USING COLUMN LETTERS
-                        updates = [
-                            {'range': f'C{row_number}', 'values': [[order_data.get("Manzil", "")]]},  # Manzil
-                            {'range': f'E{row_number}', 'values': [[order_data.get("Transport_raqami", "")]]},  # Transport
-                            {'range': f'F{row_number}', 'values': [[order_data.get("Haydovchi_telefon", "")]]}, # Telefon
-                            {'range': f'G{row_number}', 'values': [[order_data.get("Karta_raqami", "")]]},      # Karta
-                            {'range': f'H{row_number}', 'values': [[order_data.get("To'lov_summasi", "")]]},    # Summa
-                        ]
-                        
-                        worksheet.batch_update(updates)
-                        logger.info(f"✅ Successfully updated order in row {row_number}")
-                        return True
-                
+            # Find the row with matching KOD and date (fresh rows, since we write to it)
+            snapshot = self.get_sheet1_snapshot(worksheet_name, fresh=True)
+            row_index = self.find_sheet1_row(snapshot, kod, compare_date)
+            if row_index is None:
                 logger.warning(f"Order not found for update: {kod} in {worksheet_name}")
                 return False
-                
-            except gspread.exceptions.CellNotFound:
-                logger.warning(f"KOD not found: {kod} in {worksheet_name}")
-                return False
+            
+            row_number = row_index + 1
+            
+            # ✅ UPDATE BY HEADER NAME (Manzil, Transport, Telefon, Karta, Summa)
+            fields = {
+                field: order_data.get(field, "")
+                for field in ["Manzil", "Transport_raqami", "Haydovchi_telefon", "Karta_raqami", "To'lov_summasi"]
+            }
+            self.update_row_fields(self.sheet1, worksheet, row_number, fields, self.get_sheet1_columns(snapshot))
+            
+            logger.info(f"✅ Successfully updated order in row {row_number}")
+            return True
                 
         except Exception as e:
             logger.error(f"Error updating order in Sheet1: {e}")
@@ -436,37 +1713,155 @@ class GoogleSheetsHelper:
             
             sheet2_date = self.convert_date_format(date_str)
             
-            try:
-                worksheet = self.sheet2.worksheet(sheet2_date)
-            except gspread.exceptions.WorksheetNotFound:
+            # Always write against fresh rows so a row inserted since the last
+            # read can't shift the target; this also refreshes the cache.
+            snapshot = self.get_sheet2_snapshot(sheet2_date, fresh=True)
+            if not snapshot.exists:
                 return False, f"❌ {sheet2_date} sanasi uchun worksheet topilmadi"
             
-            data = worksheet.get_all_values()
+            i = snapshot.find_row((4,), kod)  # KOD in column E
+            if i is None:
+                return False, f"❌ {kod} topilmadi {sheet2_date} worksheetida"
             
-            for i, row in enumerate(data):
-                if len(row) > 4 and row[4] == kod:
-                    # Check for date mismatch
-                    if len(row) > 1 and row[1] != sheet2_date:
-                        return False, f"⚠️ KOD {kod} {row[1]} sanasida joylashtirilgan, {sheet2_date} emas"
-                    
-                    # Update the cells
-                    worksheet.update_cell(i+1, 15, transport)
-                    worksheet.update_cell(i+1, 16, phone)
-                    worksheet.update_cell(i+1, 9, "MBK")
-                    
-                    return True, f"✅ {kod} uchun transport ma'lumotlari yangilandi"
+            row = snapshot.rows[i]
             
-            return False, f"❌ {kod} topilmadi {sheet2_date} worksheetida"
+            # Check for date mismatch
+            if len(row) > 1 and row[1] != sheet2_date:
+                return False, f"⚠️ KOD {kod} {row[1]} sanasida joylashtirilgan, {sheet2_date} emas"
+            
+            # Update transport, phone (O:P) and the MBK marker (I) in one request
+            worksheet = self.get_worksheet(self.sheet2, sheet2_date)
+            self.update_row_fields(self.sheet2, worksheet, i+1, {
+                "Transport_raqami": transport,
+                "Haydovchi_telefon": phone,
+                "MBK": "MBK",
+            }, SHEET2_COLUMNS, value_input_option="USER_ENTERED")  # Same parsing as update_cell
+            
+            return True, f"✅ {kod} uchun transport ma'lumotlari yangilandi"
             
         except Exception as e:
             return False, f"❌ Xatolik: {str(e)}"
         
+    def import_orders(self, orders: List[Dict]) -> List[Tuple[bool, str]]:
+        """
+        Save many orders at once: one batch write to Sheet1 and one to Sheet2.
+        
+        Each order is checked against Sheet2 (KOD present on that date) and
+        Sheet1 (not saved yet) first; orders that fail a check are skipped.
+        Returns a (success, message) result per order, in order.
+        """
+        results: List[Optional[Tuple[bool, str]]] = [None] * len(orders)
+        accepted = []  # (index, order_data, sheet2 worksheet name, sheet2 row number)
+        seen = set()
+        downloaded = set()  # Worksheets read fresh once per import, like a single save does
+        
+        try:
+            for i, order_data in enumerate(orders):
+                kod = order_data["KOD"]
+                sheet2_date = self.convert_date_format(order_data["Sana"])
+                
+                if (kod, sheet2_date) in seen:
+                    results[i] = (False, f"⚠️ {kod} ({sheet2_date}) faylda takrorlangan")
+                    continue
+                seen.add((kod, sheet2_date))
+                
+                sheet2_snapshot = self.get_sheet2_snapshot(sheet2_date, fresh=sheet2_date not in downloaded)
+                downloaded.add(sheet2_date)
+                if not sheet2_snapshot.exists:
+                    results[i] = (False, f"❌ {sheet2_date} sanasi uchun worksheet topilmadi")
+                    continue
+                
+                row_index = sheet2_snapshot.find_row((4,), kod)  # KOD in column E
+                if row_index is None:
+                    results[i] = (False, f"❌ {kod} topilmadi {sheet2_date} worksheetida")
+                    continue
+                
+                row = sheet2_snapshot.rows[row_index]
+                if len(row) > 1 and row[1] != sheet2_date:
+                    results[i] = (False, f"⚠️ KOD {kod} {row[1]} sanasida joylashtirilgan, {sheet2_date} emas")
+                    continue
+                
+                month = self.get_uzbek_month_worksheet(order_data["Sana"])
+                sheet1_snapshot = self.get_sheet1_snapshot(month, fresh=month not in downloaded)
+                downloaded.add(month)
+                if self.find_sheet1_row(sheet1_snapshot, kod, sheet2_date) is not None:
+                    results[i] = (False, f"⚠️ {kod} uchun {sheet2_date} sanasida buyurtma allaqachon mavjud")
+                    continue
+                
+                if not order_data.get("Manzil"):
+                    manzil_index = sheet2_snapshot.find_row((3,), kod)  # Column D = KOD
+                    if manzil_index is not None:
+                        order_data = {**order_data, "Manzil": sheet2_snapshot.rows[manzil_index][2].strip()}
+                
+                accepted.append((i, order_data, sheet2_date, row_index + 1))
+            
+            if not accepted:
+                return results
+            
+            # Sheet1: allocate every row under the month locks, then one write
+            months = {}
+            for i, order_data, _, _ in accepted:
+                months.setdefault(self.get_uzbek_month_worksheet(order_data["Sana"]), []).append((i, order_data))
+            
+            sheet1_writes = []
+            with ExitStack() as locks:
+                for worksheet_name in sorted(months):  # Fixed order, so imports can't deadlock
+                    worksheet = self.get_or_create_sheet1_worksheet(worksheet_name)
+                    allocator = self.get_row_allocator(worksheet)
+                    locks.enter_context(allocator.lock)
+                    allocations = self.allocate_rows(worksheet, allocator, len(months[worksheet_name]))
+                    for (i, order_data), (row_number, order_id) in zip(months[worksheet_name], allocations):
+                        sheet1_writes.append((worksheet_name, row_number, 1, [self.build_sheet1_row(order_data, order_id)]))
+                
+                try:
+                    self.write_batch(self.sheet1, sheet1_writes, queue=False)  # New rows: see add_order_to_sheet1
+                except Exception:
+                    # We no longer know what the sheet holds; re-seed on the next save
+                    with self._row_allocators_lock:
+                        for worksheet_name in months:
+                            self._row_allocators.pop(worksheet_name, None)
+                    raise
+            
+            for worksheet_name, row_number, _, values in sheet1_writes:
+                self.sheet1_cache.update_cells(worksheet_name, row_number - 1, dict(enumerate(values[0])))
+            
+            logger.info(f"✅ Imported {len(sheet1_writes)} orders into Sheet1")
+        
+        except Exception as e:
+            logger.error(f"❌ Error importing orders into Sheet1: {e}")
+            for i, _, _, _ in accepted:
+                results[i] = (False, f"❌ Xatolik: {str(e)}")
+            return [result or (False, f"❌ Xatolik: {str(e)}") for result in results]
+        
+        # Sheet2: transport, phone (O:P) and the MBK marker (I) of every row in one write
+        sheet2_writes = []
+        for i, order_data, sheet2_date, row_number in accepted:
+            values = {
+                SHEET2_COLUMNS[field]: order_data[field] if field != "MBK" else "MBK"
+                for field in ("Transport_raqami", "Haydovchi_telefon", "MBK")
+            }
+            for row, col, cell_values in self.row_writes(row_number, values):
+                sheet2_writes.append((sheet2_date, row, col, cell_values))
+            self.sheet2_cache.update_cells(sheet2_date, row_number - 1, {col - 1: value for col, value in values.items()})
+        
+        try:
+            self.write_batch(self.sheet2, sheet2_writes, value_input_option="USER_ENTERED")
+            sheet2_message = "✅ Saqlandi"
+        except Exception as e:
+            logger.error(f"❌ Error importing transport info into Sheet2: {e}")
+            self.sheet2_cache.invalidate()
+            sheet2_message = f"⚠️ Sheet1 ga saqlandi, Sheet2 yangilanmadi: {str(e)}"
+        
+        for i, _, _, _ in accepted:
+            results[i] = (True, sheet2_message)
+        return results
+        
         # EXTRA SAFETY FUNCTION: Get worksheet safely
     def get_worksheet_safely(self, spreadsheet, worksheet_name):
         """Safely get a worksheet without affecting others."""
         try:
-            # Get fresh worksheet reference each time
-            worksheet = spreadsheet.worksheet(worksheet_name)
+            # Handles come from the cache, which refreshes itself on a miss
+            worksheet = self.get_worksheet(spreadsheet, worksheet_name)
             
             # Verify it's the correct worksheet
             if worksheet.title != worksheet_name:
@@ -481,8 +1876,112 @@ class GoogleSheetsHelper:
     def safe_batch_update(self, worksheet, updates):
         """Perform safe batch updates to minimize API calls and errors."""
         try:
-            worksheet.batch_update(updates)
+            self.api("batch_update", worksheet.batch_update, updates)
             return True
         except Exception as e:
             logger.error(f"Batch update failed: {e}")
             return False
+
+
+class AsyncGoogleSheetsHelper:
+    """
+    Async facade over GoogleSheetsHelper for the bot handlers.
+
+    gspread is synchronous, so every call is run on a bounded thread pool.
+    This keeps the event loop free while one conversation waits on the
+    Sheets API, and lets several conversations overlap their network I/O.
+
+    Warm-ups (prefetch, startup) run on a separate small pool in the
+    scheduler's background lane, so they never hold the threads or quota
+    tokens a waiting user needs.
+
+    Lookups are single-flight: a repeated tap that asks for the same data
+    while the first lookup is still running shares its result.
+    """
+
+    def __init__(self, helper: GoogleSheetsHelper, max_workers: int = None):
+        if max_workers is None:
+            max_workers = int(os.getenv("SHEETS_MAX_WORKERS", "8"))
+
+        self.helper = helper
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="sheets")
+        self.background_executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv("SHEETS_BACKGROUND_WORKERS", "2")),
+            thread_name_prefix="sheets-bg"
+        )
+        self.lookups = SingleFlight()
+        logger.info(f"Sheets thread pool started with {max_workers} workers")
+
+    async def _run(self, func, *args, **kwargs):
+        """Run a blocking helper method on the thread pool and await its result."""
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        try:
+            return await loop.run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
+        finally:
+            metrics.observe("helper", func.__name__, time.perf_counter() - started)
+
+    async def _run_background(self, func, *args, **kwargs):
+        """Run a blocking helper method on the background pool, in the background lane."""
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        try:
+            return await loop.run_in_executor(
+                self.background_executor,
+                functools.partial(self._call_in_lane, BACKGROUND, func, *args, **kwargs)
+            )
+        finally:
+            metrics.observe("helper", func.__name__, time.perf_counter() - started)
+
+    async def _run_shared(self, func, *args, **kwargs):
+        """Like _run(), but identical calls in flight at the same time share one run (read-only results)."""
+        key = (func.__name__, args, tuple(sorted(kwargs.items())))
+        result, _ = await self.lookups.run(key, lambda: self._run(func, *args, **kwargs))
+        return result
+
+    def _call_in_lane(self, lane: int, func, *args, **kwargs):
+        with self.helper.scheduler.priority(lane):
+            return func(*args, **kwargs)
+
+    async def connect(self):
+        """Connect to Google Sheets on the thread pool (e.g. as a background warm-up)."""
+        await self._run(self.helper.connect)
+
+    async def warm_sheet2(self, date_str: str):
+        await self._run_background(self.helper.warm_sheet2, date_str)
+
+    async def warm_sheet1(self, date_str: str):
+        await self._run_background(self.helper.warm_sheet1, date_str)
+
+    async def warm_dates(self, dates: List[str]):
+        await self._run_background(self.helper.warm_dates, dates)
+
+    async def get_available_kods(self, date_str: str = None, only_empty: bool = True) -> List[str]:
+        return await self._run_shared(self.helper.get_available_kods, date_str, only_empty=only_empty)
+
+    async def get_sheet2_manzil(self, kod: str, date_str: str = None) -> Optional[str]:
+        return await self._run_shared(self.helper.get_sheet2_manzil, kod, date_str)
+
+    async def get_sheet2_order_info(self, kod: str, date_str: str = None) -> Optional[Dict]:
+        return await self._run_shared(self.helper.get_sheet2_order_info, kod, date_str)
+
+    async def get_existing_order(self, kod: str, date_str: str = None) -> Optional[Dict]:
+        return await self._run_shared(self.helper.get_existing_order, kod, date_str)
+
+    async def add_order_to_sheet1(self, order_data: Dict) -> bool:
+        return await self._run(self.helper.add_order_to_sheet1, order_data)
+
+    async def update_order_in_sheet1(self, kod: str, order_data: Dict) -> bool:
+        return await self._run(self.helper.update_order_in_sheet1, kod, order_data)
+
+    async def update_sheet2_transport_info(self, kod: str, transport: str, phone: str, date_str: str = None) -> Tuple[bool, str]:
+        return await self._run(self.helper.update_sheet2_transport_info, kod, transport, phone, date_str)
+
+    async def import_orders(self, orders: List[Dict]) -> List[Tuple[bool, str]]:
+        return await self._run(self.helper.import_orders, orders)
+
+    def shutdown(self, wait: bool = True):
+        """Stop the thread pool, optionally waiting for in-flight calls, then flush queued writes."""
+        self.executor.shutdown(wait=wait)
+        self.background_executor.shutdown(wait=wait, cancel_futures=True)
+        self.helper.close()
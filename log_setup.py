@@ -0,0 +1,136 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+from datetime import datetime
+from typing import Optional
+
+LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+# Attributes every LogRecord has; anything else came in through `extra=`
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+
+class BoundedQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that only does the cheap part on the caller's thread.
+
+    The message is merged with its args (so later mutation of the args can't
+    change it) and cut to `max_length` characters; timestamps, formatting and
+    the stream write happen on the listener thread.
+    """
+
+    def __init__(self, log_queue, max_length: int = 1000):
+        super().__init__(log_queue)
+        self.max_length = max_length
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        message = record.getMessage()
+        if len(message) > self.max_length:
+            message = f"{message[:self.max_length]}... ({len(message)} chars)"
+
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = message
+        record.args = None
+        if record.exc_info:
+            # Tracebacks hold frames; render them now, while they are still valid
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Let through one in every `rate` DEBUG/INFO records per call site.
+    Warnings and errors always pass.
+    """
+
+    def __init__(self, rate: int):
+        super().__init__()
+        self.rate = rate
+        self._seen = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.rate <= 1 or record.levelno >= logging.WARNING:
+            return True
+
+        key = (record.pathname, record.lineno)
+        with self._lock:
+            seen = self._seen.get(key, 0)
+            self._seen[key] = seen + 1
+        return seen % self.rate == 0
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with any `extra=` fields as keys."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def setup_logging(level: str = None, stream=None) -> logging.handlers.QueueListener:
+    """
+    Send all logging through a queue to a listener thread that does the output.
+
+    Configured from the environment:
+        LOG_LEVEL           root level (default INFO)
+        LOG_FORMAT          "text" (default) or "json"
+        LOG_MAX_LENGTH      longest message kept, in characters (default 1000)
+        LOG_SAMPLE_RATE     keep 1 in N DEBUG/INFO records per call site (default 1: all)
+
+    Safe to call more than once; the previous pipeline is replaced.
+    """
+    global _listener
+
+    level = level or os.getenv("LOG_LEVEL", "INFO")
+
+    output = logging.StreamHandler(stream)
+    if os.getenv("LOG_FORMAT", "text") == "json":
+        output.setFormatter(JsonFormatter())
+    else:
+        output.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    log_queue = queue.SimpleQueue()
+    handler = BoundedQueueHandler(log_queue, max_length=int(os.getenv("LOG_MAX_LENGTH", "1000")))
+    handler.addFilter(SamplingFilter(int(os.getenv("LOG_SAMPLE_RATE", "1"))))
+
+    root = logging.getLogger()
+    if _listener is not None:
+        _listener.stop()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def stop_logging():
+    """Write out the queued records and stop the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(stop_logging)
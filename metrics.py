@@ -0,0 +1,168 @@
+import functools
+import logging
+import threading
+import time
+from typing import Callable, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Latency histogram buckets in seconds (Prometheus "le" bounds)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram with call and error counts."""
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.errors = 0
+
+    def observe(self, seconds: float, error: bool = False):
+        for i, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.count += 1
+        self.sum += seconds
+        if error:
+            self.errors += 1
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-quantile (an estimate, like histogram_quantile)."""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts[:-1]):
+            seen += count
+            if seen >= target:
+                return self.buckets[i]
+        return float("inf")
+
+
+class Metrics:
+    """
+    Latency histograms for bot handlers, Sheets helper methods and Sheets API
+    requests, rendered in the Prometheus text format (/metrics) or as a short
+    summary (/stats).
+    """
+
+    FAMILIES = {
+        "handler": ("bot_handler_seconds", "Conversation handler latency", "handler"),
+        "helper": ("sheets_helper_seconds", "GoogleSheetsHelper method latency, including queueing", "method"),
+        "api": ("sheets_api_seconds", "Google Sheets API request latency, including retries", "method"),
+    }
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms: Dict[str, Dict[str, Histogram]] = {family: {} for family in self.FAMILIES}
+        self._gauges: List[Callable[[], Dict[str, float]]] = []
+        self.started_at = time.time()
+
+    def observe(self, family: str, name: str, seconds: float, error: bool = False):
+        with self._lock:
+            histogram = self._histograms[family].get(name)
+            if histogram is None:
+                histogram = self._histograms[family][name] = Histogram()
+            histogram.observe(seconds, error)
+
+    def add_gauges(self, collect: Callable[[], Dict[str, float]]):
+        """Register a callback returning {metric_name: value}, read on every render."""
+        self._gauges.append(collect)
+
+    def timed_handler(self, callback):
+        """Wrap an async handler callback so its latency is recorded under its name."""
+        name = callback.__name__
+
+        @functools.wraps(callback)
+        async def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            error = False
+            try:
+                return await callback(*args, **kwargs)
+            except Exception:
+                error = True
+                raise
+            finally:
+                self.observe("handler", name, time.perf_counter() - started, error)
+
+        return wrapper
+
+    def instrument_conversation(self, conversation_handler):
+        """Time every callback of a ConversationHandler (entry points, states and fallbacks)."""
+        handlers = list(conversation_handler.entry_points) + list(conversation_handler.fallbacks)
+        for state_handlers in conversation_handler.states.values():
+            handlers.extend(state_handlers)
+
+        for handler in handlers:
+            if not getattr(handler.callback, "__wrapped__", None):
+                handler.callback = self.timed_handler(handler.callback)
+
+    def render_prometheus(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            for family, (metric, help_text, label) in self.FAMILIES.items():
+                lines.append(f"# HELP {metric} {help_text}")
+                lines.append(f"# TYPE {metric} histogram")
+                for name, histogram in sorted(self._histograms[family].items()):
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        cumulative += count
+                        lines.append(f'{metric}_bucket{{{label}="{name}",le="{bound}"}} {cumulative}')
+                    lines.append(f'{metric}_bucket{{{label}="{name}",le="+Inf"}} {histogram.count}')
+                    lines.append(f'{metric}_sum{{{label}="{name}"}} {histogram.sum:.6f}')
+                    lines.append(f'{metric}_count{{{label}="{name}"}} {histogram.count}')
+
+                errors_metric = metric.replace("_seconds", "_errors_total")
+                lines.append(f"# TYPE {errors_metric} counter")
+                for name, histogram in sorted(self._histograms[family].items()):
+                    lines.append(f'{errors_metric}{{{label}="{name}"}} {histogram.errors}')
+
+        for collect in self._gauges:
+            try:
+                for metric, value in collect().items():
+                    lines.append(f"{metric} {value}")
+            except Exception as e:
+                logger.warning(f"Could not collect gauges: {e}")
+
+        return "\n".join(lines) + "\n"
+
+    def summary(self, family: str, limit: int = 10) -> List[Tuple[str, int, int, float, float]]:
+        """(name, calls, errors, p50, p99) for the slowest names of a family by p99."""
+        with self._lock:
+            rows = [
+                (name, h.count, h.errors, h.quantile(0.5), h.quantile(0.99))
+                for name, h in self._histograms[family].items()
+            ]
+        rows.sort(key=lambda row: row[4], reverse=True)
+        return rows[:limit]
+
+
+# Shared by the bot, the Sheets helper and the HTTP endpoints
+metrics = Metrics()
+
+
+def start_metrics_server(port: int):
+    """Serve /metrics on its own thread (polling mode has no web server otherwise)."""
+    from flask import Flask, Response
+
+    app = Flask(__name__)
+
+    @app.get("/metrics")
+    def prometheus_metrics():
+        return Response(metrics.render_prometheus(), mimetype="text/plain; version=0.0.4")
+
+    thread = threading.Thread(
+        target=app.run,
+        kwargs={"host": "0.0.0.0", "port": port},
+        name="metrics-server",
+        daemon=True
+    )
+    thread.start()
+    logger.info(f"Metrics served on port {port}")
@@ -0,0 +1,144 @@
+import csv
+import io
+import re
+from datetime import date, datetime
+from typing import Dict, List, Optional, Tuple
+
+# Order fields -> accepted column headers in an import file (compared case-insensitively)
+IMPORT_COLUMNS = {
+    "Sana": ["sana", "date"],
+    "KOD": ["kod"],
+    "Manzil": ["manzil"],
+    "Viloyat": ["viloyat"],
+    "Transport_raqami": ["transport raqami", "transport"],
+    "Haydovchi_telefon": ["haydovchi telefon raqami", "haydovchi telefon", "telefon"],
+    "Karta_raqami": ["karta raqami", "karta"],
+    "To'lov_summasi": ["to'lov summasi", "summa"],
+}
+
+# Manzil is looked up in Sheet2 when the file doesn't have it
+REQUIRED_FIELDS = ["Sana", "KOD", "Viloyat", "Transport_raqami", "Haydovchi_telefon", "Karta_raqami", "To'lov_summasi"]
+
+
+def read_rows(filename: str, content: bytes) -> List[List]:
+    """Rows of the first worksheet of an .xlsx file, or of a .csv file (comma or semicolon separated)."""
+    if filename.lower().endswith(".xlsx"):
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(io.BytesIO(content), read_only=True, data_only=True)
+        try:
+            return [list(row) for row in workbook.worksheets[0].iter_rows(values_only=True)]
+        finally:
+            workbook.close()
+
+    text = content.decode("utf-8-sig")
+    delimiter = ";" if text.split("\n", 1)[0].count(";") > text.split("\n", 1)[0].count(",") else ","
+    return [row for row in csv.reader(io.StringIO(text), delimiter=delimiter)]
+
+
+def cell_text(value) -> str:
+    """A cell as text: whole floats without ".0", dates as YYYY-MM-DD."""
+    if value is None:
+        return ""
+    if isinstance(value, (datetime, date)):
+        return value.strftime("%Y-%m-%d")
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value).strip()
+
+
+def parse_date(value: str) -> str:
+    """A date as YYYY-MM-DD, from YYYY-MM-DD, DD.MM.YYYY or DD/MM/YYYY."""
+    for date_format in ("%Y-%m-%d", "%d.%m.%Y", "%d/%m/%Y"):
+        try:
+            return datetime.strptime(value, date_format).strftime("%Y-%m-%d")
+        except ValueError:
+            continue
+    raise ValueError(value)
+
+
+def phone_digits(phone: str) -> Optional[str]:
+    """The digits of a driver's phone number, or None if there are fewer than 9."""
+    digits = ''.join(filter(str.isdigit, phone))
+    return digits if len(digits) >= 9 else None
+
+
+def parse_amount(amount: str) -> float:
+    """Parse a payment amount ("1 500 000", "1,500,000", "1.500.000", "1500000.50")."""
+    temp_amount = amount.replace(" ", "").replace(",", "")
+
+    # Several dots are thousand separators, except a last group of up to 2 digits
+    if temp_amount.count('.') > 1:
+        parts = temp_amount.split('.')
+        decimal_part = parts[-1] if len(parts[-1]) <= 2 else ''
+        integer_part = ''.join(parts[:-1]) if decimal_part else ''.join(parts)
+        temp_amount = f"{integer_part}.{decimal_part}" if decimal_part else integer_part
+
+    return float(temp_amount)
+
+
+def format_amount(amount: float) -> str:
+    """Thousand separators as spaces, like the summary screen: 1 500 000."""
+    if amount.is_integer():
+        return "{:,.0f}".format(amount).replace(",", " ")
+    return "{:,.2f}".format(amount).replace(",", " ")
+
+
+def parse_orders(rows: List[List]) -> Tuple[List[Tuple[int, Dict]], List[Tuple[int, str]]]:
+    """
+    Validate the rows of an import file in one pass.
+
+    The first row is the header. Returns (orders, errors): orders are
+    (line number, order_data) ready for import_orders(); errors are
+    (line number, message) for rows that can't be imported.
+    """
+    if not rows:
+        return [], [(1, "❌ Fayl bo'sh")]
+
+    headers = [re.sub(r"\s+", " ", cell_text(cell)).lower() for cell in rows[0]]
+    positions = {}
+    for field, names in IMPORT_COLUMNS.items():
+        for name in names:
+            if name in headers:
+                positions[field] = headers.index(name)
+                break
+
+    missing = [field for field in REQUIRED_FIELDS if field not in positions]
+    if missing:
+        return [], [(1, f"❌ Ustunlar topilmadi: {', '.join(missing)}")]
+
+    orders = []
+    errors = []
+    for line_number, row in enumerate(rows[1:], start=2):
+        values = {
+            field: cell_text(row[position]) if position < len(row) else ""
+            for field, position in positions.items()
+        }
+        if not any(values.values()):
+            continue  # Blank line
+
+        empty = [field for field in REQUIRED_FIELDS if not values[field]]
+        if empty:
+            errors.append((line_number, f"❌ Bo'sh maydonlar: {', '.join(empty)}"))
+            continue
+
+        try:
+            values["Sana"] = parse_date(values["Sana"])
+        except ValueError:
+            errors.append((line_number, f"❌ Sana noto'g'ri: {values['Sana']}"))
+            continue
+
+        if phone_digits(values["Haydovchi_telefon"]) is None:
+            errors.append((line_number, f"❌ Telefon raqami noto'g'ri: {values['Haydovchi_telefon']}"))
+            continue
+
+        amount = values["To'lov_summasi"]
+        try:
+            values["To'lov_summasi"] = format_amount(parse_amount(amount))
+        except ValueError:
+            errors.append((line_number, f"❌ To'lov summasi noto'g'ri: {amount}"))
+            continue
+
+        orders.append((line_number, values))
+
+    return orders, errors
@@ -0,0 +1,252 @@
+import asyncio
+import json
+import logging
+import pickle
+import sqlite3
+import threading
+import time
+import uuid
+from copy import deepcopy
+from typing import Dict, Optional
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+logger = logging.getLogger(__name__)
+
+
+class SQLitePersistence(BasePersistence):
+    """
+    Conversation and user_data persistence backed by SQLite.
+
+    Only what changed is written: python-telegram-bot hands over the users,
+    chats and conversations touched since its last persistence run, and they
+    are buffered here and written in one transaction shortly after (off the
+    event loop), instead of pickling every conversation on each update.
+
+    With `shared=True`, user_data written by another worker is reloaded before
+    the user's next update, so workers sharing the database (and rolling
+    restarts) see each other's half-entered orders. ConversationHandler states
+    are only loaded at startup, so a user's updates should still be routed to
+    one worker at a time.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        store_data: PersistenceInput = None,
+        update_interval: float = 5,
+        write_delay: float = 0.5,
+        shared: bool = False,
+    ):
+        super().__init__(store_data=store_data, update_interval=update_interval)
+        self.write_delay = write_delay
+        self.shared = shared
+        self.writer_id = uuid.uuid4().hex
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        for table, key in (("user_data", "user_id"), ("chat_data", "chat_id")):
+            self._db.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} ("
+                f"{key} INTEGER PRIMARY KEY, data BLOB NOT NULL, writer TEXT NOT NULL, updated_at REAL NOT NULL)"
+            )
+        self._db.execute("CREATE TABLE IF NOT EXISTS singletons (name TEXT PRIMARY KEY, data BLOB NOT NULL)")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS conversations ("
+            "name TEXT NOT NULL, conversation_key TEXT NOT NULL, state BLOB NOT NULL, "
+            "PRIMARY KEY (name, conversation_key))"
+        )
+        self._db.commit()
+
+        # Deltas waiting to be written; a value of None means "delete"
+        self._pending_users: Dict[int, Optional[dict]] = {}
+        self._pending_chats: Dict[int, Optional[dict]] = {}
+        self._pending_singletons: Dict[str, object] = {}
+        self._pending_conversations: Dict[tuple, object] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+
+        # updated_at of the user_data rows this worker has seen
+        self._seen_users: Dict[int, float] = {}
+
+    # Reading (startup)
+
+    def _load_table(self, table: str, key: str) -> dict:
+        with self._lock:
+            rows = self._db.execute(f"SELECT {key}, data, updated_at FROM {table}").fetchall()
+        result = {}
+        for row_key, data, updated_at in rows:
+            result[row_key] = pickle.loads(data)
+            if table == "user_data":
+                self._seen_users[row_key] = updated_at
+        return result
+
+    def _load_singleton(self, name: str):
+        with self._lock:
+            row = self._db.execute("SELECT data FROM singletons WHERE name = ?", (name,)).fetchone()
+        return pickle.loads(row[0]) if row else None
+
+    async def get_user_data(self) -> Dict[int, dict]:
+        return await asyncio.to_thread(self._load_table, "user_data", "user_id")
+
+    async def get_chat_data(self) -> Dict[int, dict]:
+        return await asyncio.to_thread(self._load_table, "chat_data", "chat_id")
+
+    async def get_bot_data(self) -> dict:
+        return await asyncio.to_thread(self._load_singleton, "bot_data") or {}
+
+    async def get_callback_data(self):
+        return await asyncio.to_thread(self._load_singleton, "callback_data")
+
+    async def get_conversations(self, name: str) -> dict:
+        def load():
+            with self._lock:
+                rows = self._db.execute(
+                    "SELECT conversation_key, state FROM conversations WHERE name = ?", (name,)
+                ).fetchall()
+            return {tuple(json.loads(key)): pickle.loads(state) for key, state in rows}
+
+        return await asyncio.to_thread(load)
+
+    # Buffered writes
+
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        # Copy now: the write happens later, on another thread
+        self._pending_users[user_id] = deepcopy(data)
+        self._schedule_write()
+
+    async def update_chat_data(self, chat_id: int, data: dict) -> None:
+        self._pending_chats[chat_id] = deepcopy(data)
+        self._schedule_write()
+
+    async def update_bot_data(self, data: dict) -> None:
+        self._pending_singletons["bot_data"] = deepcopy(data)
+        self._schedule_write()
+
+    async def update_callback_data(self, data) -> None:
+        self._pending_singletons["callback_data"] = deepcopy(data)
+        self._schedule_write()
+
+    async def update_conversation(self, name: str, key: tuple, new_state: Optional[object]) -> None:
+        self._pending_conversations[(name, key)] = new_state
+        self._schedule_write()
+
+    async def drop_user_data(self, user_id: int) -> None:
+        self._pending_users[user_id] = None
+        self._schedule_write()
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        self._pending_chats[chat_id] = None
+        self._schedule_write()
+
+    async def refresh_user_data(self, user_id: int, user_data: dict) -> None:
+        """In shared mode, pick up user_data another worker wrote since we last saw it."""
+        if not self.shared or user_id in self._pending_users:
+            return
+
+        def load():
+            with self._lock:
+                return self._db.execute(
+                    "SELECT data, writer, updated_at FROM user_data WHERE user_id = ?", (user_id,)
+                ).fetchone()
+
+        row = await asyncio.to_thread(load)
+        if row is None:
+            return
+
+        data, writer, updated_at = row
+        if writer != self.writer_id and updated_at > self._seen_users.get(user_id, 0):
+            user_data.clear()
+            user_data.update(pickle.loads(data))
+        self._seen_users[user_id] = updated_at
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: dict) -> None:
+        pass
+
+    def _schedule_write(self):
+        """Write the buffered deltas shortly, so several changes share one transaction."""
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._delayed_write())
+
+    async def _delayed_write(self):
+        # Changes made while a write runs don't schedule one (this task is
+        # still running), so keep going until nothing is buffered
+        while True:
+            await asyncio.sleep(self.write_delay)
+            if not await self._write_pending():
+                return
+            if not (self._pending_users or self._pending_chats
+                    or self._pending_singletons or self._pending_conversations):
+                return
+
+    async def _write_pending(self) -> bool:
+        """Write the buffered deltas. Returns False if the write failed (they stay buffered)."""
+        users, self._pending_users = self._pending_users, {}
+        chats, self._pending_chats = self._pending_chats, {}
+        singletons, self._pending_singletons = self._pending_singletons, {}
+        conversations, self._pending_conversations = self._pending_conversations, {}
+
+        if not (users or chats or singletons or conversations):
+            return True
+
+        try:
+            await asyncio.to_thread(self._write, users, chats, singletons, conversations)
+            return True
+        except Exception as e:
+            logger.error(f"Error writing persistence data: {e}")
+            # Keep the deltas for the next write, unless newer ones replaced them
+            for pending, failed in (
+                (self._pending_users, users),
+                (self._pending_chats, chats),
+                (self._pending_singletons, singletons),
+                (self._pending_conversations, conversations),
+            ):
+                for key, value in failed.items():
+                    pending.setdefault(key, value)
+            return False
+
+    def _write(self, users: dict, chats: dict, singletons: dict, conversations: dict):
+        now = time.time()
+        with self._lock:
+            with self._db:  # One transaction
+                for table, key, pending in (("user_data", "user_id", users), ("chat_data", "chat_id", chats)):
+                    for row_key, data in pending.items():
+                        if data is None:
+                            self._db.execute(f"DELETE FROM {table} WHERE {key} = ?", (row_key,))
+                        else:
+                            self._db.execute(
+                                f"INSERT OR REPLACE INTO {table} ({key}, data, writer, updated_at) VALUES (?, ?, ?, ?)",
+                                (row_key, pickle.dumps(data), self.writer_id, now),
+                            )
+
+                for name, data in singletons.items():
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO singletons (name, data) VALUES (?, ?)", (name, pickle.dumps(data))
+                    )
+
+                for (name, key), state in conversations.items():
+                    if state is None:
+                        self._db.execute(
+                            "DELETE FROM conversations WHERE name = ? AND conversation_key = ?",
+                            (name, json.dumps(list(key))),
+                        )
+                    else:
+                        self._db.execute(
+                            "INSERT OR REPLACE INTO conversations (name, conversation_key, state) VALUES (?, ?, ?)",
+                            (name, json.dumps(list(key)), pickle.dumps(state)),
+                        )
+
+        for user_id, data in users.items():
+            if data is not None:
+                self._seen_users[user_id] = now
+
+    async def flush(self) -> None:
+        """Write everything still buffered (called on shutdown)."""
+        if self._flush_task is not None and not self._flush_task.done():
+            self._flush_task.cancel()
+        await self._write_pending()
+        with self._lock:
+            self._db.close()
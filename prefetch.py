@@ -0,0 +1,57 @@
+import asyncio
+import logging
+from typing import Dict, List
+
+logger = logging.getLogger(__name__)
+
+
+class Prefetcher:
+    """
+    Speculatively loads the Sheets data a user's next step will need.
+
+    The next choices in the conversation are few: the three dates on the date
+    keyboard, then the KODs on the KOD keyboard. While the user is still
+    choosing, the matching worksheets are loaded into the helper's caches and
+    indexed, so the handler that follows finds them ready.
+
+    Prefetching is best-effort: failures are logged and ignored. Each user has
+    at most one prefetch running; it is cancelled when they navigate away.
+    """
+
+    def __init__(self, sheets_helper):
+        self.sheets_helper = sheets_helper
+        self.tasks: Dict[int, asyncio.Task] = {}
+
+    def prefetch_dates(self, user_id: int, dates: List[str]):
+        """Date keyboard shown: warm the Sheet2 worksheets of the dates and their Sheet1 months."""
+        self._schedule(user_id, self._warm_dates(dates))
+
+    def prefetch_kods(self, user_id: int, date_str: str, kods: List[str]):
+        """KOD keyboard shown: warm what MANZIL and existing-order lookups for these KODs read."""
+        if not kods:
+            return
+        self._schedule(user_id, self._warm_dates([date_str]))
+
+    def cancel(self, user_id: int):
+        """Drop the user's pending prefetch (e.g. on /start, /cancel or after saving)."""
+        task = self.tasks.pop(user_id, None)
+        if task is not None and not task.done():
+            task.cancel()
+
+    def _schedule(self, user_id: int, coroutine):
+        # A new screen replaces whatever was being prefetched for the old one
+        self.cancel(user_id)
+        task = asyncio.create_task(coroutine)
+        self.tasks[user_id] = task
+        task.add_done_callback(lambda done: self._forget(user_id, done))
+
+    def _forget(self, user_id: int, task: asyncio.Task):
+        if self.tasks.get(user_id) is task:
+            del self.tasks[user_id]
+
+    async def _warm_dates(self, dates: List[str]):
+        # All the dates' Sheet2 worksheets and Sheet1 months in one batchGet per spreadsheet
+        try:
+            await self.sheets_helper.warm_dates(dates)
+        except Exception as e:
+            logger.warning(f"Prefetch failed: {e}")
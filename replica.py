@@ -0,0 +1,100 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class SheetReplica:
+    """
+    Local SQLite copy of the worksheets the bot reads.
+
+    Each worksheet is stored row by row with the spreadsheet version it was
+    downloaded at. Storing a new download only writes the rows that changed,
+    so keeping a large monthly worksheet in sync is cheap. The helper loads
+    from here after a restart or a cache eviction, and falls back to it when
+    Google can't be reached.
+    """
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS worksheets ("
+            "spreadsheet_id TEXT NOT NULL, worksheet TEXT NOT NULL, version TEXT, "
+            "row_count INTEGER, synced_at REAL NOT NULL, "
+            "PRIMARY KEY (spreadsheet_id, worksheet))"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS rows ("
+            "spreadsheet_id TEXT NOT NULL, worksheet TEXT NOT NULL, row_index INTEGER NOT NULL, "
+            "data TEXT NOT NULL, PRIMARY KEY (spreadsheet_id, worksheet, row_index))"
+        )
+        self._db.commit()
+
+    def load(self, spreadsheet_id: str, worksheet: str) -> Optional[Tuple[Optional[List[List[str]]], Optional[str], float]]:
+        """
+        Get (rows, version, synced_at) of a stored worksheet, or None if it was never stored.
+        rows is None if the worksheet did not exist at the last sync.
+        """
+        with self._lock:
+            meta = self._db.execute(
+                "SELECT version, row_count, synced_at FROM worksheets WHERE spreadsheet_id = ? AND worksheet = ?",
+                (spreadsheet_id, worksheet)
+            ).fetchone()
+            if meta is None:
+                return None
+
+            version, row_count, synced_at = meta
+            if row_count is None:
+                return None, version, synced_at
+
+            stored = self._db.execute(
+                "SELECT data FROM rows WHERE spreadsheet_id = ? AND worksheet = ? ORDER BY row_index",
+                (spreadsheet_id, worksheet)
+            ).fetchall()
+        return [json.loads(data) for (data,) in stored], version, synced_at
+
+    def store(self, spreadsheet_id: str, worksheet: str, rows: Optional[List[List[str]]], version: Optional[str]):
+        """Store a fresh download of a worksheet, writing only the rows that changed."""
+        encoded = [json.dumps(row, ensure_ascii=False) for row in rows] if rows is not None else []
+
+        with self._lock:
+            existing = dict(self._db.execute(
+                "SELECT row_index, data FROM rows WHERE spreadsheet_id = ? AND worksheet = ?",
+                (spreadsheet_id, worksheet)
+            ).fetchall())
+
+            changed = [
+                (spreadsheet_id, worksheet, row_index, data)
+                for row_index, data in enumerate(encoded)
+                if existing.get(row_index) != data
+            ]
+
+            with self._db:  # One transaction
+                if changed:
+                    self._db.executemany(
+                        "INSERT OR REPLACE INTO rows (spreadsheet_id, worksheet, row_index, data) VALUES (?, ?, ?, ?)",
+                        changed
+                    )
+                if len(existing) > len(encoded):
+                    self._db.execute(
+                        "DELETE FROM rows WHERE spreadsheet_id = ? AND worksheet = ? AND row_index >= ?",
+                        (spreadsheet_id, worksheet, len(encoded))
+                    )
+                self._db.execute(
+                    "INSERT OR REPLACE INTO worksheets (spreadsheet_id, worksheet, version, row_count, synced_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (spreadsheet_id, worksheet, version, len(encoded) if rows is not None else None, time.time())
+                )
+
+        if changed:
+            logger.info(f"Replica of {worksheet}: {len(changed)} of {len(encoded)} rows changed")
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,124 @@
+"""
+Sheet1 order reports as .xlsx or .csv, streamed month by month.
+
+Used by the bot's /report command, and from the command line:
+
+    python report.py --from 2026-10-01 --to 2026-11-15 --viloyat Toshkent --format xlsx -o report.xlsx
+"""
+import argparse
+import csv
+import logging
+from datetime import date, datetime
+from typing import Iterator, List, Optional
+
+from google_sheets import GoogleSheetsHelper, SHEET1_HEADERS
+
+logger = logging.getLogger(__name__)
+
+# Rows read per Sheets request
+REPORT_CHUNK_SIZE = 5000
+
+
+def report_months(helper: GoogleSheetsHelper, start: date, end: date) -> List[str]:
+    """Names of the Sheet1 monthly worksheets covering start..end."""
+    months = []
+    current = start.replace(day=1)
+    while current <= end:
+        months.append(helper.get_uzbek_month_worksheet(current.strftime("%Y-%m-%d")))
+        current = current.replace(year=current.year + 1, month=1) if current.month == 12 else current.replace(month=current.month + 1)
+    return months
+
+
+def iter_report_rows(helper: GoogleSheetsHelper, start: date, end: date, viloyat: Optional[str] = None,
+                     chunk_size: int = REPORT_CHUNK_SIZE) -> Iterator[List[str]]:
+    """
+    Yield the Sheet1 order rows dated start..end (and of one Viloyat, if given).
+
+    Worksheets are read chunk by chunk, so memory use doesn't grow with the
+    size of the month.
+    """
+    for worksheet_name in report_months(helper, start, end):
+        columns = None
+        for chunk in helper.iter_worksheet_rows(helper.sheet1, worksheet_name, chunk_size=chunk_size):
+            for row in chunk:
+                if columns is None:
+                    # First row of the worksheet: the header
+                    columns = {header: i for i, header in enumerate(row)}
+                    sana_column = columns.get("Sana", 1)
+                    viloyat_column = columns.get("Viloyat", 4)
+                    continue
+
+                try:
+                    sana = datetime.strptime(row[sana_column].strip(), "%d.%m.%Y").date()
+                except (IndexError, ValueError):
+                    continue  # Empty or malformed row
+                if not start <= sana <= end:
+                    continue
+                if viloyat and (len(row) <= viloyat_column or row[viloyat_column].strip().lower() != viloyat.lower()):
+                    continue
+
+                yield row + [""] * (len(SHEET1_HEADERS) - len(row))
+
+
+def write_report(rows: Iterator[List[str]], path: str, file_format: str = "xlsx") -> int:
+    """Write the header and rows to an .xlsx (openpyxl write-only mode) or .csv file. Returns the row count."""
+    count = 0
+    if file_format == "csv":
+        with open(path, "w", newline="", encoding="utf-8-sig") as output:
+            writer = csv.writer(output)
+            writer.writerow(SHEET1_HEADERS)
+            for row in rows:
+                writer.writerow(row)
+                count += 1
+        return count
+
+    from openpyxl import Workbook
+
+    # Write-only: rows are written out as they are appended, not kept in memory
+    workbook = Workbook(write_only=True)
+    worksheet = workbook.create_sheet("Hisobot")
+    worksheet.append(SHEET1_HEADERS)
+    for row in rows:
+        worksheet.append(row)
+        count += 1
+    workbook.save(path)
+    return count
+
+
+def export_report(helper: GoogleSheetsHelper, start: date, end: date, path: str, file_format: str = "xlsx",
+                  viloyat: Optional[str] = None) -> int:
+    """Stream the matching Sheet1 rows into a report file. Returns the number of orders written."""
+    count = write_report(iter_report_rows(helper, start, end, viloyat), path, file_format)
+    logger.info(f"Report {start}..{end} (viloyat={viloyat}) written to {path}: {count} orders")
+    return count
+
+
+def main():
+    from dotenv import load_dotenv
+    from log_setup import setup_logging
+
+    load_dotenv()
+    setup_logging()
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--from", dest="start", required=True, help="first date, YYYY-MM-DD")
+    parser.add_argument("--to", dest="end", required=True, help="last date, YYYY-MM-DD")
+    parser.add_argument("--viloyat", help="only orders of this Viloyat")
+    parser.add_argument("--format", choices=["xlsx", "csv"], default="xlsx")
+    parser.add_argument("-o", "--output", help="output file (default: hisobot_FROM_TO.FORMAT)")
+    args = parser.parse_args()
+
+    start = datetime.strptime(args.start, "%Y-%m-%d").date()
+    end = datetime.strptime(args.end, "%Y-%m-%d").date()
+    output = args.output or f"hisobot_{args.start}_{args.end}.{args.format}"
+
+    helper = GoogleSheetsHelper()
+    try:
+        count = export_report(helper, start, end, output, args.format, args.viloyat)
+    finally:
+        helper.close()
+    print(f"{count} orders written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict
+
+import gspread
+
+logger = logging.getLogger(__name__)
+
+# Priority lanes, most urgent first
+INTERACTIVE = 0   # A user is waiting on the result
+BACKGROUND = 1    # Prefetch, warm-up and refresh traffic
+
+LANE_NAMES = {INTERACTIVE: "interactive", BACKGROUND: "background"}
+
+# Statuses worth retrying: quota exceeded and server-side errors
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+
+class RequestScheduler:
+    """
+    Central gate for Google Sheets API requests.
+
+    - A token bucket sized to the per-minute quota paces requests, so bursts
+      queue here instead of failing with 429.
+    - Interactive requests take tokens before background ones (strict
+      priority: background traffic must be something that can wait, so
+      queued-write flushes run in the interactive lane).
+    - 429 and 5xx responses are retried with jittered exponential backoff.
+    - Queue depth and wait times per lane are kept for monitoring.
+    """
+
+    def __init__(self, requests_per_minute: float = 60, burst: int = 10, max_retries: int = 5,
+                 base_delay: float = 1.0, max_delay: float = 32.0):
+        self.rate = requests_per_minute / 60
+        self.burst = burst
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        self._tokens = float(burst)
+        self._refilled_at = time.monotonic()
+        self._cond = threading.Condition()
+        self._waiting = {lane: 0 for lane in LANE_NAMES}
+        self._local = threading.local()
+
+        # Metrics
+        self.requests = 0
+        self.retries = 0
+        self.failures = 0
+        self.wait_time_total = {lane: 0.0 for lane in LANE_NAMES}
+        self.wait_time_max = {lane: 0.0 for lane in LANE_NAMES}
+        self.acquired = {lane: 0 for lane in LANE_NAMES}
+
+    @contextmanager
+    def priority(self, lane: int):
+        """Run the calls made in this block (on this thread) in the given lane."""
+        previous = getattr(self._local, "lane", INTERACTIVE)
+        self._local.lane = lane
+        try:
+            yield
+        finally:
+            self._local.lane = previous
+
+    def call(self, name: str, func, *args, priority: int = None, **kwargs):
+        """Call func(*args, **kwargs) once a token is available, retrying on 429/5xx."""
+        lane = priority if priority is not None else getattr(self._local, "lane", INTERACTIVE)
+
+        attempt = 0
+        while True:
+            self._acquire(lane)
+            try:
+                return func(*args, **kwargs)
+            except gspread.exceptions.APIError as e:
+                status = getattr(e.response, "status_code", None)
+                if status not in RETRYABLE_STATUSES or attempt >= self.max_retries:
+                    with self._cond:
+                        self.failures += 1
+                    raise
+
+                # Full jitter: sleep a random time up to the exponential bound
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+                attempt += 1
+                with self._cond:
+                    self.retries += 1
+                    if status == 429:
+                        # The quota is spent: don't let other callers burst straight into it
+                        self._tokens = min(self._tokens, 0.0)
+                logger.warning(f"Sheets API {name} returned {status}, retry {attempt} in {delay:.1f}s")
+                time.sleep(delay)
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._refilled_at) * self.rate)
+        self._refilled_at = now
+
+    def _acquire(self, lane: int):
+        started = time.monotonic()
+        with self._cond:
+            self._waiting[lane] += 1
+            try:
+                while True:
+                    self._refill()
+                    more_urgent_waiting = any(self._waiting[other] for other in self._waiting if other < lane)
+                    if self._tokens >= 1 and not more_urgent_waiting:
+                        self._tokens -= 1
+                        break
+                    timeout = (1 - self._tokens) / self.rate if self._tokens < 1 else 0.05
+                    self._cond.wait(timeout=max(timeout, 0.01))
+            finally:
+                self._waiting[lane] -= 1
+                self._cond.notify_all()
+
+            waited = time.monotonic() - started
+            self.requests += 1
+            self.acquired[lane] += 1
+            self.wait_time_total[lane] += waited
+            self.wait_time_max[lane] = max(self.wait_time_max[lane], waited)
+
+    def stats(self) -> Dict:
+        """Queue depth, wait times and retry counters per lane."""
+        with self._cond:
+            return {
+                "tokens": round(self._tokens, 2),
+                "requests": self.requests,
+                "retries": self.retries,
+                "failures": self.failures,
+                "lanes": {
+                    LANE_NAMES[lane]: {
+                        "queue_depth": self._waiting[lane],
+                        "acquired": self.acquired[lane],
+                        "wait_time_avg": self.wait_time_total[lane] / self.acquired[lane] if self.acquired[lane] else 0.0,
+                        "wait_time_max": self.wait_time_max[lane],
+                    }
+                    for lane in LANE_NAMES
+                },
+            }
@@ -0,0 +1,141 @@
+import asyncio
+import os
+import subprocess
+import sys
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import bot
+from conftest import MONTH
+from google_sheets import AsyncGoogleSheetsHelper
+from metrics import metrics
+
+
+def test_bot_builds_without_persistence():
+    telegram_bot = bot.TelegramBot("123456:TEST")
+    assert telegram_bot.application.persistence is None
+
+
+def message_update(text: str):
+    message = SimpleNamespace(text=text, reply_text=AsyncMock())
+    return SimpleNamespace(message=message, callback_query=None)
+
+
+def test_enter_amount_parses_like_file_imports(monkeypatch):
+    telegram_bot = bot.TelegramBot("123456:TEST")
+    monkeypatch.setattr(telegram_bot, "show_summary", AsyncMock(return_value=bot.REVIEW_SUMMARY))
+    context = SimpleNamespace(user_data={})
+
+    state = asyncio.run(telegram_bot.enter_amount(message_update("1.500.000.50"), context))
+    assert state == bot.REVIEW_SUMMARY
+    assert context.user_data["summa"] == "1 500 000.50"
+    assert context.user_data["summa_raw"] == 1500000.5
+
+
+def test_enter_phone_rejects_short_numbers():
+    telegram_bot = bot.TelegramBot("123456:TEST")
+    context = SimpleNamespace(user_data={})
+
+    update = message_update("90 12")
+    assert asyncio.run(telegram_bot.enter_phone(update, context)) == bot.ENTERING_PHONE
+    update.message.reply_text.assert_awaited_once()
+
+    state = asyncio.run(telegram_bot.enter_phone(message_update("+998 90 008 44 06"), context))
+    assert state == bot.ENTERING_CARD
+    assert context.user_data["telefon_digits"] == "998900084406"
+
+
+def test_metadata_counters_are_exported(helper, monkeypatch):
+    monkeypatch.setattr(bot, "sheets_helper", AsyncGoogleSheetsHelper(helper))
+    monkeypatch.setattr(bot, "ADMIN_IDS", {1})
+    helper.get_worksheet(helper.sheet1, MONTH)
+    helper.get_worksheet(helper.sheet1, MONTH)  # From the handle cache
+
+    exported = metrics.render_prometheus()
+    assert f"sheets_metadata_calls {helper.metadata_calls}" in exported
+    assert f"sheets_metadata_calls_saved {helper.metadata_calls_saved}" in exported
+    assert helper.metadata_calls_saved >= 1
+
+    update = message_update("/stats")
+    update.effective_user = SimpleNamespace(id=1)
+    asyncio.run(bot.TelegramBot("123456:TEST").stats_command(update, SimpleNamespace()))
+    [reply], _ = update.message.reply_text.await_args
+    assert f"keshdan: {helper.metadata_calls_saved}" in reply
+
+
+def test_import_and_build_do_not_open_the_submissions_db(tmp_path, monkeypatch):
+    env = {key: value for key, value in os.environ.items() if key != "SUBMISSIONS_DB_PATH"}
+    env["PYTHONPATH"] = os.path.dirname(os.path.abspath(bot.__file__))
+    build = "import bot; bot.TelegramBot('123456:TEST')"
+    subprocess.run([sys.executable, "-c", build], cwd=tmp_path, env=env, check=True, capture_output=True)
+    assert not (tmp_path / "submissions.db").exists()
+
+    # post_init opens it
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv("SUBMISSIONS_DB_PATH")
+    telegram_bot = bot.TelegramBot("123456:TEST")
+    asyncio.run(telegram_bot.post_init(telegram_bot.application))
+    telegram_bot.submissions.close()
+    assert (tmp_path / "submissions.db").exists()
+
+
+def confirm_update(submission: str, user_id: int = 7):
+    query = SimpleNamespace(data=f"confirm_submit:{submission}", answer=AsyncMock(), edit_message_text=AsyncMock())
+    return SimpleNamespace(callback_query=query, effective_user=SimpleNamespace(id=user_id))
+
+
+def submitting_bot(monkeypatch):
+    """A bot with its submissions store open, whose submit_order just counts calls."""
+    telegram_bot = bot.TelegramBot("123456:TEST")
+    asyncio.run(telegram_bot.post_init(telegram_bot.application))
+
+    async def submit_order(user_data):
+        await asyncio.sleep(0.01)  # Long enough for a concurrent tap to arrive
+        return {"success": True, "text": f"✅ Saqlandi: {user_data['kod']}"}
+
+    monkeypatch.setattr(telegram_bot, "submit_order", AsyncMock(side_effect=submit_order))
+    return telegram_bot
+
+
+def test_repeated_confirm_saves_the_order_once(monkeypatch):
+    telegram_bot = submitting_bot(monkeypatch)
+
+    async def double_tap():
+        first, second = confirm_update("abc"), confirm_update("abc")
+        states = await asyncio.gather(
+            telegram_bot.save_order(first, SimpleNamespace(user_data={"kod": "K000001"})),
+            telegram_bot.save_order(second, SimpleNamespace(user_data={"kod": "K000001"})),
+        )
+        # After the save
+        third = confirm_update("abc")
+        states.append(await telegram_bot.save_order(third, SimpleNamespace(user_data={})))
+        return states, [first, second, third]
+
+    states, updates = asyncio.run(double_tap())
+    assert states == [bot.ConversationHandler.END] * 3
+    telegram_bot.submit_order.assert_awaited_once()
+    for update in updates:
+        update.callback_query.edit_message_text.assert_awaited_once_with(text="✅ Saqlandi: K000001")
+    assert telegram_bot.submissions.duplicates == 2
+    assert "bot_submissions_duplicates 2" in metrics.render_prometheus()
+
+    # Another user's submission with the same key is saved on its own
+    asyncio.run(telegram_bot.save_order(confirm_update("abc", user_id=8), SimpleNamespace(user_data={"kod": "K000002"})))
+    assert telegram_bot.submit_order.await_count == 2
+
+
+def test_repeat_submit_answers_from_the_stored_result(monkeypatch):
+    telegram_bot = submitting_bot(monkeypatch)
+    asyncio.run(telegram_bot.save_order(confirm_update("abc"), SimpleNamespace(user_data={"kod": "K000001"})))
+
+    # The conversation has ended; the tap reaches repeat_submit
+    update = confirm_update("abc")
+    asyncio.run(telegram_bot.repeat_submit(update, SimpleNamespace(user_data={})))
+    update.callback_query.edit_message_text.assert_awaited_once_with(text="✅ Saqlandi: K000001")
+    telegram_bot.submit_order.assert_awaited_once()
+
+    # Unknown (or expired) submission
+    update = confirm_update("old")
+    asyncio.run(telegram_bot.repeat_submit(update, SimpleNamespace(user_data={})))
+    update.callback_query.answer.assert_awaited_once_with("Bu so'rov eskirgan. Yangi buyurtma uchun /start ni bosing.")
+    update.callback_query.edit_message_text.assert_not_awaited()
@@ -0,0 +1,213 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import pytest
+
+from conftest import DATE, MONTH, new_order, sheet1_row
+from google_sheets import ColumnStore, GoogleSheetsHelper, SHEET1_HEADERS
+from scheduler import RequestScheduler
+
+
+def sheet1_rows(fake_client, month: str = MONTH):
+    return fake_client.spreadsheets["sheet1"]._worksheets[month].rows
+
+
+def test_parallel_saves_get_distinct_rows_and_ids(helper, fake_client):
+    kods = [f"KP{i:02d}" for i in range(20)]
+    with ThreadPoolExecutor(max_workers=20) as pool:
+        results = list(pool.map(lambda kod: helper.add_order_to_sheet1(new_order(kod)), kods))
+    assert all(results)
+
+    rows = sheet1_rows(fake_client)
+    assert [row[3] for row in rows[1:6]] == [f"K{i:06d}" for i in range(1, 6)]  # Untouched
+    saved = rows[6:]
+    assert sorted(row[3] for row in saved) == sorted(kods)
+    ids = [row[0] for row in rows[1:]]
+    assert len(ids) == len(set(ids)) == 25
+    assert sorted(int(order_id) for order_id in ids) == list(range(1, 26))
+
+
+def test_save_does_not_overwrite_rows_written_elsewhere(helper, fake_client):
+    assert helper.add_order_to_sheet1(new_order("KA"))
+
+    # Hand-entered (or another worker's) row right after ours
+    sheet1_rows(fake_client).append(sheet1_row(7, "KEXT"))
+
+    assert helper.add_order_to_sheet1(new_order("KB"))
+    kods = [row[3] for row in sheet1_rows(fake_client)]
+    assert kods[-3:] == ["KA", "KEXT", "KB"]
+    assert sheet1_rows(fake_client)[-1][0] == "8"
+
+
+def test_allocator_reseeded_from_downloaded_column_a(helper, fake_client):
+    assert helper.add_order_to_sheet1(new_order("KA"))
+    allocator = helper._row_allocators[MONTH]
+    assert allocator.next_row == 8
+
+    sheet1_rows(fake_client).append(sheet1_row(7, "KEXT"))
+    helper.get_sheet1_snapshot(MONTH, fresh=True)
+    assert (allocator.next_row, allocator.next_id) == (9, 8)
+
+
+def test_tail_refresh_reads_only_new_rows(helper, fake_client):
+    helper.get_sheet1_snapshot(MONTH)
+    sheet1_rows(fake_client).append(sheet1_row(6, "KEXT"))
+
+    fake_client.calls.clear()
+    snapshot = helper.get_sheet1_snapshot(MONTH, fresh=True)
+    assert dict(fake_client.calls) == {"batch_get": 1}
+    assert helper.find_sheet1_row(snapshot, "KEXT", "17.10.2026") == 6
+    assert helper.find_sheet1_row(snapshot, "K000005", "17.10.2026") == 5
+
+
+def test_update_after_key_columns_moved_writes_the_right_row(helper, fake_client):
+    helper.get_sheet1_snapshot(MONTH)
+
+    # Someone swaps the KODs of rows 2 and 4 by hand
+    rows = sheet1_rows(fake_client)
+    rows[1][3], rows[3][3] = rows[3][3], rows[1][3]
+
+    assert helper.update_order_in_sheet1("K000003", {**new_order("K000003"), "Manzil": "UPDATED"})
+    assert [row[2] for row in rows[1:6]] == [
+        "UPDATED", "Manzil K000002", "Manzil K000003", "Manzil K000004", "Manzil K000005"
+    ]
+
+
+def test_tail_refresh_is_stored_in_the_replica(fake_client, tmp_path, monkeypatch):
+    monkeypatch.setenv("SHEETS_REPLICA", "1")
+    monkeypatch.setenv("REPLICA_PATH", str(tmp_path / "replica.db"))
+    monkeypatch.setenv("REPLICA_SYNC_INTERVAL", "0")
+    helper = GoogleSheetsHelper(client=fake_client, sheet1_id="sheet1", sheet2_id="sheet2")
+    helper.connect()
+    try:
+        helper.get_sheet1_snapshot(MONTH)
+        sheet1_rows(fake_client).append(sheet1_row(6, "KEXT"))
+        helper.get_sheet1_snapshot(MONTH, fresh=True)
+
+        rows, _, _ = helper.replica.load("sheet1", MONTH)
+        assert len(rows) == 7
+        assert rows[6][3] == "KEXT"
+    finally:
+        helper.close()
+
+
+def test_first_order_of_a_new_month_is_visible_at_once(helper):
+    assert helper.get_existing_order("K000002", "2026-11-01") is None  # Caches the missing worksheet
+
+    assert helper.add_order_to_sheet1(new_order("K000002", "2026-11-01"))
+    order = helper.get_existing_order("K000002", "2026-11-01")
+    assert order is not None and order["ID"] == "1"
+
+
+def test_column_store_interns_only_low_cardinality_columns():
+    store = ColumnStore([list(SHEET1_HEADERS), sheet1_row(1, "K000001")])
+    assert store.interned == {1, 3, 4}  # Sana, KOD, Viloyat
+
+    extended = store.extended(2, [sheet1_row(2, "K000002")])
+    assert extended.interned == store.interned
+    assert extended[2][3] == "K000002"
+
+
+def write_behind_helper(fake_client) -> GoogleSheetsHelper:
+    helper = GoogleSheetsHelper(client=fake_client, sheet1_id="sheet1", sheet2_id="sheet2")
+    helper.connect()
+    assert helper.write_queue is not None
+    # Both allocators seeded before either save, like two busy workers
+    helper.get_row_allocator(helper.get_worksheet(helper.sheet1, MONTH))
+    return helper
+
+
+@pytest.mark.parametrize("shared_queue", [True, False])
+def test_workers_with_write_behind_get_distinct_rows(fake_client, tmp_path, monkeypatch, shared_queue):
+    monkeypatch.setenv("SHEETS_WRITE_BEHIND", "1")
+    monkeypatch.setenv("WRITE_QUEUE_PATH", str(tmp_path / "write_queue.db"))
+    first = write_behind_helper(fake_client)
+    if not shared_queue:
+        monkeypatch.setenv("WRITE_QUEUE_PATH", str(tmp_path / "other_write_queue.db"))
+    second = write_behind_helper(fake_client)
+    try:
+        assert first.add_order_to_sheet1(new_order("KA"))
+        assert second.add_order_to_sheet1(new_order("KB"))
+    finally:
+        first.close()
+        second.close()
+
+    rows = sheet1_rows(fake_client)
+    assert [(row[0], row[3]) for row in rows[6:]] == [("6", "KA"), ("7", "KB")]
+
+
+def test_rows_waiting_in_the_write_queue_are_not_allocated(fake_client, tmp_path, monkeypatch):
+    monkeypatch.setenv("SHEETS_WRITE_BEHIND", "1")
+    monkeypatch.setenv("WRITE_QUEUE_PATH", str(tmp_path / "write_queue.db"))
+    helper = write_behind_helper(fake_client)
+    try:
+        helper.write_queue.stop()  # Keep the queued row unflushed
+        # Another worker sharing the queue has row 7 waiting
+        helper.write_queue.enqueue("sheet1", MONTH, [(7, 1, [sheet1_row(6, "KQUEUED")])])
+        assert helper.add_order_to_sheet1(new_order("KA"))
+        assert helper.add_order_to_sheet1(new_order("KB"))
+
+        # Row 7 is left to the queued write; IDs continue after its ID
+        rows = sheet1_rows(fake_client)
+        assert [(row[0], row[3]) for row in rows[7:]] == [("7", "KA"), ("8", "KB")]
+    finally:
+        helper.close()
+
+
+def test_edit_of_an_earlier_row_reloads_when_the_drive_version_changed(helper, fake_client):
+    helper.change_detector = SimpleNamespace(version=lambda file_id: "1")
+    helper.get_sheet1_snapshot(MONTH)
+
+    # Someone fixes the amount of an earlier order by hand
+    sheet1_rows(fake_client)[2][8] = "999999"
+    helper.change_detector = SimpleNamespace(version=lambda file_id: "2")
+
+    snapshot = helper.get_sheet1_snapshot(MONTH, fresh=True)
+    assert snapshot.rows[2][8] == "999999"
+    assert snapshot.version == "2"
+
+
+def test_tail_read_failure_falls_back_to_the_replica(fake_client, tmp_path, monkeypatch):
+    monkeypatch.setenv("SHEETS_REPLICA", "1")
+    monkeypatch.setenv("REPLICA_PATH", str(tmp_path / "replica.db"))
+    monkeypatch.setenv("REPLICA_SYNC_INTERVAL", "0")
+    monkeypatch.setenv("SHEET1_CACHE_TTL", "0")
+    helper = GoogleSheetsHelper(client=fake_client, sheet1_id="sheet1", sheet2_id="sheet2")
+    helper.connect()
+    try:
+        assert helper.get_existing_order("K000003", DATE) is not None
+
+        def outage(name, cells=0):
+            raise ConnectionError("Google is down")
+
+        monkeypatch.setattr(fake_client, "request", outage)
+        order = helper.get_existing_order("K000003", DATE)
+        assert order is not None and order["ID"] == "3"
+    finally:
+        helper.close()
+
+
+def test_queued_writes_are_not_starved_by_interactive_load(helper):
+    # At the quota: every request waits for a token
+    helper.scheduler = RequestScheduler(requests_per_minute=1200, burst=1)
+    stop = threading.Event()
+
+    def user():
+        while not stop.is_set():
+            helper.api("get_all_values", lambda: None)
+
+    users = [threading.Thread(target=user) for _ in range(4)]
+    for thread in users:
+        thread.start()
+    try:
+        flush = threading.Thread(target=helper.send_queued_writes, args=(
+            "sheet2", "RAW", [{"worksheet": "17.10.2026", "row": 2, "col": 15, "values": [["01A"]]}]
+        ))
+        flush.start()
+        flush.join(timeout=1.0)
+        assert not flush.is_alive()
+    finally:
+        stop.set()
+        for thread in users:
+            thread.join()
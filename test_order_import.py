@@ -0,0 +1,36 @@
+import pytest
+
+from order_import import format_amount, parse_amount, parse_orders, phone_digits
+
+
+@pytest.mark.parametrize("text, amount", [
+    ("1 500 000", 1500000), ("1,500,000", 1500000), ("1500000", 1500000),
+    ("1.500.000", 1500000), ("1500000.50", 1500000.5), ("1.500.000.50", 1500000.5),
+])
+def test_parse_amount(text, amount):
+    assert parse_amount(text) == amount
+
+
+def test_parse_amount_rejects_text():
+    with pytest.raises(ValueError):
+        parse_amount("ming")
+
+
+def test_format_amount():
+    assert format_amount(1500000.0) == "1 500 000"
+    assert format_amount(1500000.5) == "1 500 000.50"
+
+
+def test_phone_digits():
+    assert phone_digits("+998 (90) 123-45-67") == "998901234567"
+    assert phone_digits("90 123 45") is None
+
+
+def test_parse_orders_uses_the_conversation_rules():
+    orders, errors = parse_orders([
+        ["Sana", "KOD", "Viloyat", "Transport", "Telefon", "Karta", "Summa"],
+        ["17.10.2026", "K1", "Toshkent", "01A111AA", "99 008 44 06", "8600", "1.500.000"],
+        ["17.10.2026", "K2", "Toshkent", "01A111AA", "123", "8600", "1 000"],
+    ])
+    assert [(line, order["To'lov_summasi"]) for line, order in orders] == [(2, "1 500 000")]
+    assert [line for line, _ in errors] == [3]
@@ -0,0 +1,24 @@
+import asyncio
+import time
+
+from persistence import SQLitePersistence
+
+
+def test_changes_made_during_a_write_are_written_without_another_update(tmp_path):
+    persistence = SQLitePersistence(str(tmp_path / "state.db"), write_delay=0.01)
+    write = persistence._write
+
+    def slow_write(*args):
+        time.sleep(0.1)
+        write(*args)
+
+    persistence._write = slow_write
+
+    async def scenario():
+        await persistence.update_user_data(1, {"kod": "K1"})
+        await asyncio.sleep(0.05)  # The first write is running now
+        await persistence.update_user_data(2, {"kod": "K2"})
+        await asyncio.sleep(0.5)  # ...and then the bot goes quiet
+
+    asyncio.run(scenario())
+    assert persistence._load_table("user_data", "user_id") == {1: {"kod": "K1"}, 2: {"kod": "K2"}}
@@ -0,0 +1,14 @@
+from datetime import date
+
+from conftest import MONTH, sheet1_row
+from report import iter_report_rows
+
+
+def test_report_reads_past_blank_rows_at_a_chunk_end(helper, fake_client):
+    rows = fake_client.spreadsheets["sheet1"]._worksheets[MONTH].rows
+    rows.extend(sheet1_row(i, f"K{i:06d}") for i in range(6, 29))  # 28 orders, rows 2-29
+    rows[9] = [""] * len(rows[9])  # Row 10, the last of the first chunk, cleared
+
+    exported = list(iter_report_rows(helper, date(2026, 10, 1), date(2026, 10, 31), chunk_size=10))
+    assert len(exported) == 27
+    assert exported[-1][3] == "K000028"
@@ -0,0 +1,55 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from bench_updates import run
+from update_processor import ChatOrderedUpdateProcessor
+
+HANDLER_SECONDS = 0.02
+
+
+def chat_update(chat_id: int):
+    return SimpleNamespace(effective_chat=SimpleNamespace(id=chat_id), effective_user=None)
+
+
+def test_updates_of_one_chat_run_one_at_a_time_in_order():
+    async def scenario():
+        processor = ChatOrderedUpdateProcessor(8)
+        handled = []
+
+        async def handler(sequence: int, delay: float):
+            handled.append(("start", sequence))
+            await asyncio.sleep(delay)
+            handled.append(("end", sequence))
+
+        # The first update is the slowest: the later ones must still wait for it
+        await asyncio.gather(*(
+            processor.process_update(chat_update(1), handler(sequence, delay))
+            for sequence, delay in enumerate([0.05, 0.01, 0.0])
+        ))
+        assert processor.stats() == {"running": 0, "waiting": 0, "chats": 0}
+        return handled
+
+    assert asyncio.run(scenario()) == [
+        ("start", 0), ("end", 0), ("start", 1), ("end", 1), ("start", 2), ("end", 2)
+    ]
+
+
+@pytest.mark.parametrize("dispatchers", [2, 8, 16])
+def test_throughput_scales_with_dispatchers(dispatchers):
+    updates = 3
+    sequential, _ = asyncio.run(run(dispatchers, updates, HANDLER_SECONDS, 1))
+    elapsed, ordered = asyncio.run(run(dispatchers, updates, HANDLER_SECONDS, 32))
+
+    assert ordered
+    # Chats run side by side: about as long as one chat's updates, not all of them
+    assert elapsed < updates * HANDLER_SECONDS * 2
+    assert sequential / elapsed > dispatchers / 2
+
+
+def test_concurrency_cap_is_respected():
+    elapsed, ordered = asyncio.run(run(8, 2, HANDLER_SECONDS, 2))
+    assert ordered
+    # 16 updates, 2 at a time
+    assert elapsed >= 8 * HANDLER_SECONDS * 0.9
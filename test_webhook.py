@@ -0,0 +1,76 @@
+import time
+
+import pytest
+
+import bot
+from fake_telegram import FakeBotApi
+from google_sheets import AsyncGoogleSheetsHelper
+from webhook import WebhookRunner, create_app
+
+SECRET = "webhook-secret"
+
+
+def start_update(update_id: int = 1, chat_id: int = 42) -> dict:
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id, "date": int(time.time()), "text": "/start",
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": chat_id, "is_bot": False, "first_name": "Dispatcher"},
+            "entities": [{"type": "bot_command", "offset": 0, "length": 6}],
+        },
+    }
+
+
+@pytest.fixture
+def bot_api():
+    api = FakeBotApi().start()
+    yield api
+    api.stop()
+
+
+@pytest.fixture
+def runner(bot_api, helper, monkeypatch):
+    monkeypatch.setenv("TELEGRAM_API_BASE_URL", bot_api.base_url)
+    monkeypatch.setattr(bot, "sheets_helper", AsyncGoogleSheetsHelper(helper))
+    runner = WebhookRunner(
+        bot.TelegramBot("123456:TEST").application,
+        webhook_url="https://bot.example.com/webhook",
+        secret_token=SECRET
+    )
+    runner.start()
+    yield runner
+    runner.stop()
+
+
+def test_start_registers_the_webhook(runner, bot_api):
+    [params] = bot_api.sent("setWebhook")
+    assert params["url"] == "https://bot.example.com/webhook"
+    assert params["secret_token"] == SECRET
+
+
+def test_posted_update_reaches_the_handlers(runner, bot_api):
+    client = create_app(runner).test_client()
+    response = client.post("/webhook", json=start_update(), headers={"X-Telegram-Bot-Api-Secret-Token": SECRET})
+    assert response.status_code == 200
+
+    # /start is answered through the Bot API
+    reply = bot_api.wait_for("sendMessage")
+    assert reply is not None
+    assert reply["chat_id"] == "42"
+    assert "Assalomu alaykum" in reply["text"]
+
+
+def test_webhook_rejects_a_wrong_secret(runner, bot_api):
+    client = create_app(runner).test_client()
+    response = client.post("/webhook", json=start_update(), headers={"X-Telegram-Bot-Api-Secret-Token": "wrong"})
+    assert response.status_code == 403
+    assert runner.application.update_queue.empty()
+    assert bot_api.wait_for("sendMessage", timeout=0.2) is None
+
+
+def test_readyz(runner):
+    client = create_app(runner).test_client()
+    response = client.get("/readyz")
+    assert response.status_code == 200
+    assert response.get_json()["application_running"] is True
@@ -0,0 +1,111 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from write_queue import WriteBehindQueue
+
+
+class StatusError(Exception):
+    """An API error with an HTTP status, like gspread's APIError."""
+
+    def __init__(self, status: int):
+        super().__init__(f"HTTP {status}")
+        self.response = SimpleNamespace(status_code=status)
+
+
+class Writer:
+    """Records the batches it is sent; fails them as told."""
+
+    def __init__(self):
+        self.batches = []
+        self.fail_with = []  # Errors to raise for the next calls
+        self.deleted_worksheets = set()
+
+    def __call__(self, spreadsheet_id, value_input_option, data):
+        if self.fail_with:
+            raise self.fail_with.pop(0)
+        if any(write["worksheet"] in self.deleted_worksheets for write in data):
+            raise StatusError(400)  # One bad range fails the whole (atomic) batchUpdate
+        self.batches.append([(write["worksheet"], write["row"], write["values"][0][0]) for write in data])
+
+
+@pytest.fixture
+def writer():
+    return Writer()
+
+
+@pytest.fixture
+def failures():
+    return []
+
+
+@pytest.fixture
+def queue(tmp_path, writer, failures):
+    queue = WriteBehindQueue(
+        str(tmp_path / "write_queue.db"), writer, flush_interval_ms=1, max_attempts=3,
+        on_failure=lambda spreadsheet_id, worksheet: failures.append((spreadsheet_id, worksheet))
+    )
+    yield queue
+    queue.stop()
+
+
+def flush_when_due(queue, timeout: float = 2.0) -> int:
+    """Flush until something is sent (the backoff has passed)."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        sent = queue.flush()
+        if sent:
+            return sent
+        time.sleep(0.005)
+    return 0
+
+
+def test_writes_are_coalesced_in_order(queue, writer):
+    queue.enqueue("s1", "A", [(2, 1, [["first"]])])
+    queue.enqueue("s1", "A", [(2, 1, [["second"]]), (3, 1, [["third"]])])
+
+    assert queue.flush() == 3
+    assert writer.batches == [[("A", 2, "first"), ("A", 2, "second"), ("A", 3, "third")]]
+    assert queue.pending("s1", "A") == []
+
+
+def test_failed_batch_is_retried_and_newer_writes_wait_for_it(queue, writer):
+    queue.enqueue("s1", "A", [(2, 1, [["old"]])])
+    writer.fail_with = [StatusError(503)]
+    assert queue.flush() == 0
+
+    # Newer write to the same cell: must not overtake the one backing off
+    queue.enqueue("s1", "A", [(2, 1, [["new"]])])
+    assert flush_when_due(queue) == 2
+    assert writer.batches == [[("A", 2, "old"), ("A", 2, "new")]]
+
+
+def test_writes_are_given_up_after_max_attempts(queue, writer, failures):
+    queue.enqueue("s1", "A", [(2, 1, [["value"]])])
+    writer.fail_with = [StatusError(503)] * 3
+
+    queue.flush()
+    for _ in range(2):
+        time.sleep(0.1)
+        queue.flush()
+
+    assert queue.pending("s1", "A") == []
+    assert writer.batches == []
+    assert failures == [("s1", "A")]
+
+
+def test_rejected_write_is_given_up_alone(queue, writer, failures):
+    writer.deleted_worksheets.add("Deleted")
+    queue.enqueue("s1", "A", [(2, 1, [["before"]])])
+    queue.enqueue("s1", "Deleted", [(2, 1, [["lost"]])])
+    queue.enqueue("s1", "A", [(3, 1, [["after"]])])
+
+    assert queue.flush() == 2
+    assert writer.batches == [[("A", 2, "before")], [("A", 3, "after")]]
+    assert failures == [("s1", "Deleted")]
+    assert queue.pending("s1", "Deleted") == []
+
+    # Nothing is left backing off: the next write goes out at once
+    queue.enqueue("s1", "A", [(4, 1, [["next"]])])
+    assert queue.flush() == 1
@@ -0,0 +1,83 @@
+import asyncio
+from contextlib import nullcontext
+from typing import Any, Awaitable, Dict, Hashable, List, Optional
+
+from telegram.ext import BaseUpdateProcessor
+
+
+class ChatOrderedUpdateProcessor(BaseUpdateProcessor):
+    """
+    Process updates of different chats concurrently, and the updates of one
+    chat (or, without a chat, one user) strictly one after another, in the
+    order they arrived.
+
+    A slow save for one dispatcher no longer holds up everyone else's
+    buttons, while each conversation still sees its updates in order, so
+    ConversationHandler states stay consistent.
+
+    At most `max_concurrent_updates` handlers run at once. An update waiting
+    for an earlier one of its chat doesn't take one of those slots (so one
+    user tapping repeatedly can't starve the others); up to
+    `max_waiting_updates` more updates may be admitted and waiting.
+    """
+
+    def __init__(self, max_concurrent_updates: int, max_waiting_updates: int = 1024):
+        super().__init__(max_concurrent_updates + max_waiting_updates)
+        self.running_limit = max_concurrent_updates
+        self._running = asyncio.Semaphore(max_concurrent_updates)
+        # Ordering key -> [lock, updates holding or waiting for it]
+        self._chains: Dict[Hashable, List] = {}
+        self.running = 0
+        self.waiting = 0
+
+    @staticmethod
+    def ordering_key(update: object) -> Optional[Hashable]:
+        """The chat (else user) an update belongs to; None for updates with neither."""
+        chat = getattr(update, "effective_chat", None)
+        if chat is not None:
+            return ("chat", chat.id)
+        user = getattr(update, "effective_user", None)
+        if user is not None:
+            return ("user", user.id)
+        return None
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        key = self.ordering_key(update)
+        chain = None
+        if key is not None:
+            chain = self._chains.get(key)
+            if chain is None:
+                chain = self._chains[key] = [asyncio.Lock(), 0]
+            chain[1] += 1
+
+        self.waiting += 1
+        started = False
+        try:
+            # asyncio.Lock wakes its waiters first come, first served; the
+            # running slot is only taken once it is this update's turn
+            async with chain[0] if chain is not None else nullcontext():
+                async with self._running:
+                    self.waiting -= 1
+                    started = True
+                    self.running += 1
+                    try:
+                        await coroutine
+                    finally:
+                        self.running -= 1
+        finally:
+            if not started:
+                self.waiting -= 1
+            if chain is not None:
+                chain[1] -= 1
+                if chain[1] == 0:
+                    del self._chains[key]
+
+    def stats(self) -> Dict[str, int]:
+        """Updates running and waiting their turn, and chats with updates in progress."""
+        return {"running": self.running, "waiting": self.waiting, "chats": len(self._chains)}
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
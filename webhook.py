@@ -0,0 +1,133 @@
+import asyncio
+import hmac
+import logging
+import os
+import threading
+
+from flask import Flask, Response, jsonify, request
+from telegram import Update
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class WebhookRunner:
+    """
+    Runs a python-telegram-bot Application on a background event loop so a
+    WSGI app (Flask under gunicorn) can hand it updates received by webhook.
+    """
+
+    def __init__(self, application, webhook_url: str = None, secret_token: str = None):
+        self.application = application
+        self.webhook_url = webhook_url
+        self.secret_token = secret_token
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name="telegram-loop", daemon=True)
+
+    def start(self):
+        """Start the event loop thread and the Application, and register the webhook."""
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self._start(), self.loop).result()
+
+    async def _start(self):
+        # run_polling()/run_webhook() normally call the post_init/post_shutdown hooks
+        await self.application.initialize()
+        if self.application.post_init:
+            await self.application.post_init(self.application)
+        await self.application.start()
+
+        if self.webhook_url:
+            await self.application.bot.set_webhook(
+                url=self.webhook_url,
+                secret_token=self.secret_token,
+                allowed_updates=Update.ALL_TYPES
+            )
+            logger.info(f"Webhook set to {self.webhook_url}")
+
+    def stop(self):
+        """Stop the Application and the event loop thread."""
+        asyncio.run_coroutine_threadsafe(self._stop(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+
+    async def _stop(self):
+        await self.application.stop()
+        if self.application.post_shutdown:
+            await self.application.post_shutdown(self.application)
+        await self.application.shutdown()
+
+    def is_valid_secret(self, token: str) -> bool:
+        if not self.secret_token:
+            return True
+        return hmac.compare_digest(token or "", self.secret_token)
+
+    def put_update(self, data: dict):
+        """Decode an update posted by Telegram and queue it for the Application."""
+        update = Update.de_json(data, self.application.bot)
+        asyncio.run_coroutine_threadsafe(self.application.update_queue.put(update), self.loop).result(timeout=10)
+
+    @property
+    def ready(self) -> bool:
+        return self.application.running
+
+
+def create_app(runner: WebhookRunner = None) -> Flask:
+    """
+    Build the Flask app serving the webhook and health routes.
+
+    Without a runner, the bot is created from the environment, which is what
+    gunicorn uses:  gunicorn "webhook:create_app()"
+    """
+    if runner is None:
+        from bot import TelegramBot, sheets_helper
+
+        token = os.getenv("BOT_TOKEN")
+        if not token:
+            raise ValueError("BOT_TOKEN environment variable not set")
+
+        runner = WebhookRunner(
+            TelegramBot(token).application,
+            webhook_url=os.getenv("WEBHOOK_URL"),
+            secret_token=os.getenv("WEBHOOK_SECRET")
+        )
+        runner.start()
+    else:
+        from bot import sheets_helper
+
+    app = Flask(__name__)
+
+    @app.post("/webhook")
+    def webhook():
+        if not runner.is_valid_secret(request.headers.get("X-Telegram-Bot-Api-Secret-Token")):
+            return jsonify({"ok": False}), 403
+
+        data = request.get_json(silent=True)
+        if not data:
+            return jsonify({"ok": False}), 400
+
+        runner.put_update(data)
+        return jsonify({"ok": True})
+
+    @app.get("/healthz")
+    def healthz():
+        """Liveness: the process is up."""
+        return jsonify({"ok": True})
+
+    @app.get("/metrics")
+    def prometheus_metrics():
+        """Handler, helper and Sheets API latencies in the Prometheus text format."""
+        return Response(metrics.render_prometheus(), mimetype="text/plain; version=0.0.4")
+
+    @app.get("/readyz")
+    def readyz():
+        """Readiness: the Application is processing updates and Google Sheets is connected."""
+        ready = runner.ready and sheets_helper.helper.connected
+        return jsonify({
+            "ok": ready,
+            "application_running": runner.ready,
+            "sheets_connected": sheets_helper.helper.connected,
+            "sheets_scheduler": sheets_helper.helper.scheduler.stats()
+        }), 200 if ready else 503
+
+    return app
@@ -0,0 +1,248 @@
+import json
+import logging
+import random
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def is_permanent(error: Exception) -> bool:
+    """Whether a failed write can never succeed as sent: a 4xx response other than 429 (e.g. a deleted worksheet)."""
+    status = getattr(getattr(error, "response", None), "status_code", None)
+    return status is not None and 400 <= status < 500 and status != 429
+
+
+class WriteBehindQueue:
+    """
+    Durable write-behind queue for Google Sheets cell writes, backed by SQLite.
+
+    Writes are stored locally and acknowledged at once. A background thread
+    flushes everything that is due every `flush_interval_ms`, coalesced into
+    one values.batchUpdate per spreadsheet (and value input option).
+    Failed flushes are retried with jittered exponential backoff; after
+    `max_attempts` the writes are marked failed and kept for inspection.
+    A batch rejected outright (a 4xx such as a range on a deleted worksheet)
+    is sent again one write at a time, so only the write that can never
+    succeed is given up on, at once, and the others still land.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        writer: Callable[[str, str, List[Dict]], None],
+        flush_interval_ms: int = 500,
+        max_attempts: int = 8,
+        on_failure: Optional[Callable[[str, str], None]] = None,
+    ):
+        """
+        Args:
+            path: SQLite database file.
+            writer: Called as writer(spreadsheet_id, value_input_option, data) where
+                    data is a list of {"worksheet", "row", "col", "values"} dicts.
+            flush_interval_ms: Batch window between flushes.
+            max_attempts: Attempts before a write is given up on.
+            on_failure: Called as on_failure(spreadsheet_id, worksheet) when writes are given up on.
+        """
+        self.writer = writer
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_attempts = max_attempts
+        self.on_failure = on_failure
+
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS pending_writes (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                spreadsheet_id TEXT NOT NULL,
+                worksheet TEXT NOT NULL,
+                row INTEGER NOT NULL,
+                col INTEGER NOT NULL,
+                cell_values TEXT NOT NULL,
+                value_input_option TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt REAL NOT NULL,
+                failed INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL
+            )
+            """
+        )
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS pending_writes_target "
+            "ON pending_writes (spreadsheet_id, worksheet, failed)"
+        )
+        self._db.commit()
+
+    def enqueue(self, spreadsheet_id: str, worksheet: str, writes: List[Tuple[int, int, List[List[str]]]],
+                value_input_option: str = "RAW"):
+        """
+        Store writes for a worksheet. Each write is (row, col, values) with a
+        1-based top-left cell and a 2D list of values.
+        """
+        now = time.time()
+        with self._lock:
+            self._db.executemany(
+                "INSERT INTO pending_writes "
+                "(spreadsheet_id, worksheet, row, col, cell_values, value_input_option, next_attempt, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (spreadsheet_id, worksheet, row, col, json.dumps(values), value_input_option, now, now)
+                    for row, col, values in writes
+                ],
+            )
+            self._db.commit()
+
+    def pending(self, spreadsheet_id: str, worksheet: str) -> List[Tuple[int, int, List[List[str]]]]:
+        """Get the unflushed writes for a worksheet, oldest first, as (row, col, values)."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT row, col, cell_values FROM pending_writes "
+                "WHERE spreadsheet_id = ? AND worksheet = ? AND failed = 0 ORDER BY id",
+                (spreadsheet_id, worksheet),
+            ).fetchall()
+        return [(row, col, json.loads(values)) for row, col, values in rows]
+
+    def flush(self) -> int:
+        """Send every due write now. Returns the number of writes sent."""
+        with self._flush_lock:
+            with self._lock:
+                # While a spreadsheet's batch is backing off, newer writes wait for it,
+                # so an older value is never retried over a newer one
+                rows = self._db.execute(
+                    "SELECT id, spreadsheet_id, worksheet, row, col, cell_values, value_input_option, attempts "
+                    "FROM pending_writes WHERE failed = 0 AND spreadsheet_id IN ("
+                    "    SELECT spreadsheet_id FROM pending_writes WHERE failed = 0 "
+                    "    GROUP BY spreadsheet_id HAVING MAX(next_attempt) <= ?"
+                    ") ORDER BY id",
+                    (time.time(),),
+                ).fetchall()
+
+            # One batch per spreadsheet and value input option, in insertion order
+            batches = {}
+            for write_id, spreadsheet_id, worksheet, row, col, values, option, attempts in rows:
+                batch = batches.setdefault((spreadsheet_id, option), {"ids": [], "data": [], "attempts": {}, "worksheets": {}})
+                batch["ids"].append(write_id)
+                batch["data"].append({"worksheet": worksheet, "row": row, "col": col, "values": json.loads(values)})
+                batch["attempts"][write_id] = attempts
+                batch["worksheets"][write_id] = worksheet
+
+            sent = 0
+            for (spreadsheet_id, option), batch in batches.items():
+                try:
+                    self.writer(spreadsheet_id, option, batch["data"])
+                except Exception as e:
+                    if is_permanent(e) and len(batch["ids"]) > 1:
+                        logger.warning(f"Queued write batch rejected, sending its writes one by one: {e}")
+                        sent += self._send_one_by_one(spreadsheet_id, option, batch)
+                    else:
+                        self._retry_later(spreadsheet_id, batch, e)
+                    continue
+
+                self._delete(batch["ids"])
+                sent += len(batch["ids"])
+
+            if sent:
+                logger.info(f"Flushed {sent} queued writes in {len(batches)} batch(es)")
+            return sent
+
+    def _send_one_by_one(self, spreadsheet_id: str, option: str, batch: Dict) -> int:
+        """
+        Send the writes of a rejected batch separately, in order. Returns the
+        number sent. A write rejected on its own is given up on; on any other
+        error it and the writes after it back off together, keeping their order.
+        """
+        sent = 0
+        for position, write_id in enumerate(batch["ids"]):
+            try:
+                self.writer(spreadsheet_id, option, [batch["data"][position]])
+            except Exception as e:
+                if is_permanent(e):
+                    self._retry_later(spreadsheet_id, self._sub_batch(batch, [write_id]), e)  # Gives it up
+                    continue
+                self._retry_later(spreadsheet_id, self._sub_batch(batch, batch["ids"][position:]), e)
+                break
+            self._delete([write_id])
+            sent += 1
+        return sent
+
+    @staticmethod
+    def _sub_batch(batch: Dict, ids: List[int]) -> Dict:
+        positions = {write_id: position for position, write_id in enumerate(batch["ids"])}
+        return {
+            "ids": list(ids),
+            "data": [batch["data"][positions[write_id]] for write_id in ids],
+            "attempts": {write_id: batch["attempts"][write_id] for write_id in ids},
+            "worksheets": {write_id: batch["worksheets"][write_id] for write_id in ids},
+        }
+
+    def _delete(self, ids: List[int]):
+        with self._lock:
+            self._db.executemany("DELETE FROM pending_writes WHERE id = ?", [(i,) for i in ids])
+            self._db.commit()
+
+    def _retry_later(self, spreadsheet_id: str, batch: Dict, error: Exception):
+        """
+        Back off the writes of a failed batch, giving up on those that reached
+        max_attempts (or on all of them if the error is permanent).
+        """
+        now = time.time()
+        retries = []
+        given_up = []
+        permanent = is_permanent(error)
+
+        for write_id in batch["ids"]:
+            attempts = batch["attempts"][write_id] + 1
+            if permanent or attempts >= self.max_attempts:
+                given_up.append((attempts, write_id))
+            else:
+                delay = min(60.0, self.flush_interval * 2 ** attempts) * random.uniform(0.5, 1.5)
+                retries.append((attempts, now + delay, write_id))
+
+        if retries:
+            logger.warning(f"Queued write batch failed, {len(retries)} write(s) will be retried: {error}")
+
+        with self._lock:
+            self._db.executemany("UPDATE pending_writes SET attempts = ?, next_attempt = ? WHERE id = ?", retries)
+            self._db.executemany("UPDATE pending_writes SET attempts = ?, failed = 1 WHERE id = ?", given_up)
+            self._db.commit()
+
+        if given_up:
+            reason = "rejected" if permanent else f"after {self.max_attempts} attempts"
+            logger.error(f"❌ Giving up on {len(given_up)} queued write(s) {reason}: {error}")
+            if self.on_failure:
+                for worksheet in {batch["worksheets"][write_id] for _, write_id in given_up}:
+                    self.on_failure(spreadsheet_id, worksheet)
+
+    def start(self):
+        """Start the background flusher thread."""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="sheets-write-behind", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Error flushing write queue: {e}")
+
+    def stop(self):
+        """Stop the flusher thread and make a last attempt to send what is due."""
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        try:
+            self.flush()
+        except Exception as e:
+            logger.error(f"Error flushing write queue on shutdown: {e}")